@@ -8,28 +8,102 @@
 - Вычисляемые поля с агрегацией данных
 - Цветовая индикация статусов
 - Оптимизированные запросы с prefetch_related и select_related
+
+Агрегаты в списках (количество товаров, сумма заказа и т.п.) вычисляются
+подзапросами в запросе списка, а не отдельным запросом на строку: число
+запросов страницы не зависит от числа строк. Подзапросы, в отличие от
+annotate(Count(...)) с JOIN, не добавляют GROUP BY, и COUNT(*) пагинатора
+их отбрасывает. Для больших таблиц COUNT(*) можно кэшировать (CachedCountPaginator).
 """
 
+import hashlib
+import logging
+
+from django.conf import settings
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from django.db import models
-from django.db.models import F, Sum
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db.models import Count, F, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils.functional import cached_property
 from django.utils.html import format_html
 
+import redis
+
 from backend.models import (
     Category,
     ConfirmEmailToken,
     Contact,
     Order,
     OrderItem,
+    OutboxMessage,
     Parameter,
     Product,
     ProductInfo,
     ProductParameter,
     Shop,
+    ShopOrder,
     User,
 )
 
+logger = logging.getLogger(__name__)
+
+
+def related_aggregate(model, field, expression):
+    """
+    Агрегат по строкам ``model``, ссылающимся на строку списка, подзапросом.
+
+    Args:
+        model: Модель связанных строк
+        field (str): Поле связи со строкой списка
+        expression: Агрегат, например ``Count("id")``
+
+    Returns:
+        Subquery: Выражение для annotate
+    """
+    rows = model.objects.filter(**{field: OuterRef("pk")}).order_by().values(field)
+    return Subquery(rows.annotate(value=expression).values("value"))
+
+
+def related_count(model, field):
+    """
+    Количество строк ``model``, ссылающихся на строку списка (0, если строк нет).
+    """
+    return Coalesce(related_aggregate(model, field, Count("pk")), 0)
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Пагинатор, который кэширует COUNT(*) списка на ``ADMIN_COUNT_CACHE_TTL`` секунд.
+
+    Для больших таблиц COUNT(*) - самый долгий запрос страницы списка.
+    Ключ кэша - SQL запроса с параметрами, так что фильтры и поиск кэшируются
+    отдельно. Число строк может отставать от реального на время жизни кэша.
+    ``ADMIN_COUNT_CACHE_TTL=0`` отключает кэширование.
+    """
+
+    @cached_property
+    def count(self):
+        ttl = settings.ADMIN_COUNT_CACHE_TTL
+        if not ttl or not hasattr(self.object_list, "query"):
+            return super().count
+        try:
+            sql, params = self.object_list.query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+        key = "admin-count:" + hashlib.sha1(f"{sql}{params}".encode()).hexdigest()
+        try:
+            value = cache.get(key)
+            if value is None:
+                value = super().count
+                cache.set(key, value, ttl)
+        except redis.RedisError as error:
+            logger.warning("Кэш числа строк админки недоступен: %s", error)
+            value = super().count
+        return value
+
 
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
@@ -92,20 +166,33 @@ class ShopAdmin(admin.ModelAdmin):
 
     list_display = ("name", "user", "state", "get_products_count", "get_orders_count")
     list_filter = ("state",)
+    list_select_related = ("user",)
     search_fields = ("name", "user__email")
     readonly_fields = ("get_products_count", "get_orders_count")
 
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(
+                products_count=related_count(ProductInfo, "shop"),
+                orders_count=related_count(ShopOrder, "shop"),
+            )
+        )
+
     def get_products_count(self, obj):
         """Количество товаров в магазине"""
-        return obj.product_infos.count()
+        return obj.products_count
 
     get_products_count.short_description = "Товаров"
+    get_products_count.admin_order_field = "products_count"
 
     def get_orders_count(self, obj):
         """Количество заказов магазина"""
-        return OrderItem.objects.filter(product_info__shop=obj).values("order").distinct().count()
+        return obj.orders_count
 
     get_orders_count.short_description = "Заказов"
+    get_orders_count.admin_order_field = "orders_count"
 
 
 @admin.register(Category)
@@ -118,17 +205,29 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ("name",)
     filter_horizontal = ("shops",)  # Удобный виджет для M2M
 
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(
+                shops_count=related_count(Category.shops.through, "category"),
+                products_count=related_count(Product, "category"),
+            )
+        )
+
     def get_shops_count(self, obj):
         """Количество магазинов в категории"""
-        return obj.shops.count()
+        return obj.shops_count
 
     get_shops_count.short_description = "Магазинов"
+    get_shops_count.admin_order_field = "shops_count"
 
     def get_products_count(self, obj):
         """Количество товаров в категории"""
-        return obj.products.count()
+        return obj.products_count
 
     get_products_count.short_description = "Товаров"
+    get_products_count.admin_order_field = "products_count"
 
 
 @admin.register(Product)
@@ -139,28 +238,43 @@ class ProductAdmin(admin.ModelAdmin):
 
     list_display = ("name", "category", "get_shops_count", "get_min_price", "get_total_quantity")
     list_filter = ("category",)
+    list_select_related = ("category",)
     search_fields = ("name",)
     inlines = [ProductInfoInline]
+    paginator = CachedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(
+                shops_count=related_count(ProductInfo, "product"),
+                min_price=related_aggregate(ProductInfo, "product", Min("price")),
+                total_quantity=related_aggregate(ProductInfo, "product", Sum("quantity")),
+            )
+        )
 
     def get_shops_count(self, obj):
         """В скольких магазинах есть товар"""
-        return obj.product_infos.count()
+        return obj.shops_count
 
     get_shops_count.short_description = "Магазинов"
+    get_shops_count.admin_order_field = "shops_count"
 
     def get_min_price(self, obj):
         """Минимальная цена"""
-        min_price = obj.product_infos.aggregate(min_price=models.Min("price"))["min_price"]
-        return f"{min_price} руб." if min_price else "-"
+        return f"{obj.min_price} руб." if obj.min_price else "-"
 
     get_min_price.short_description = "Мин. цена"
+    get_min_price.admin_order_field = "min_price"
 
     def get_total_quantity(self, obj):
         """Общее количество на складах"""
-        total = obj.product_infos.aggregate(total=models.Sum("quantity"))["total"]
-        return total or 0
+        return obj.total_quantity or 0
 
     get_total_quantity.short_description = "Всего на складах"
+    get_total_quantity.admin_order_field = "total_quantity"
 
 
 @admin.register(ProductInfo)
@@ -171,6 +285,9 @@ class ProductInfoAdmin(admin.ModelAdmin):
 
     list_display = ("product", "shop", "model", "quantity", "price", "price_rrc", "get_margin")
     list_filter = ("shop", "product__category")
+    list_select_related = ("product", "shop")
+    paginator = CachedCountPaginator
+    show_full_result_count = False
     search_fields = ("product__name", "model", "external_id")
     inlines = [ProductParameterInline]
     readonly_fields = ("get_margin",)
@@ -194,11 +311,15 @@ class ParameterAdmin(admin.ModelAdmin):
     list_display = ("name", "get_usage_count")
     search_fields = ("name",)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(usage_count=related_count(ProductParameter, "parameter"))
+
     def get_usage_count(self, obj):
         """Сколько раз используется параметр"""
-        return obj.product_parameters.count()
+        return obj.usage_count
 
     get_usage_count.short_description = "Использований"
+    get_usage_count.admin_order_field = "usage_count"
 
 
 class OrderItemInline(admin.TabularInline):
@@ -211,6 +332,9 @@ class OrderItemInline(admin.TabularInline):
     readonly_fields = ("get_product_name", "get_shop", "get_price", "get_sum")
     fields = ("product_info", "get_product_name", "get_shop", "quantity", "get_price", "get_sum")
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("product_info__product", "product_info__shop")
+
     def get_product_name(self, obj):
         return obj.product_info.product.name if obj.product_info else "-"
 
@@ -234,6 +358,18 @@ class OrderItemInline(admin.TabularInline):
     get_sum.short_description = "Сумма"
 
 
+class ShopOrderInline(admin.TabularInline):
+    """
+    Inline для частей заказа по магазинам
+    """
+
+    model = ShopOrder
+    extra = 0
+    can_delete = False
+    fields = ("shop", "state", "items_count", "total_sum")
+    readonly_fields = ("shop", "items_count", "total_sum")
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     """
@@ -242,9 +378,12 @@ class OrderAdmin(admin.ModelAdmin):
 
     list_display = ("id", "dt", "user", "state", "get_total_sum", "contact", "colored_state")
     list_filter = ("state", "dt")
+    list_select_related = ("user", "contact")
+    paginator = CachedCountPaginator
+    show_full_result_count = False
     search_fields = ("user__email", "user__first_name", "user__last_name")
     readonly_fields = ("dt", "get_total_sum", "get_order_details")
-    inlines = [OrderItemInline]
+    inlines = [ShopOrderInline, OrderItemInline]
     date_hierarchy = "dt"
     ordering = ("-dt",)
 
@@ -254,17 +393,26 @@ class OrderAdmin(admin.ModelAdmin):
     # Массовые действия для изменения статусов
     actions = ["make_confirmed", "make_assembled", "make_sent", "make_delivered", "make_canceled"]
 
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(
+                total_sum=related_aggregate(OrderItem, "order", Sum(F("quantity") * F("product_info__price"))),
+            )
+        )
+
     def get_total_sum(self, obj):
         """Общая сумма заказа"""
-        total = obj.ordered_items.aggregate(total=Sum(F("quantity") * F("product_info__price")))["total"]
-        return f"{total} руб." if total else "0 руб."
+        return f"{obj.total_sum} руб." if obj.total_sum else "0 руб."
 
     get_total_sum.short_description = "Сумма"
+    get_total_sum.admin_order_field = "total_sum"
 
     def get_order_details(self, obj):
         """Детали заказа в удобном формате"""
         items = []
-        for item in obj.ordered_items.all():
+        for item in obj.ordered_items.select_related("product_info__product", "product_info__shop"):
             items.append(
                 f"{item.product_info.product.name} "
                 f"({item.product_info.shop.name}) - "
@@ -291,38 +439,117 @@ class OrderAdmin(admin.ModelAdmin):
 
     colored_state.short_description = "Статус"
 
+    @staticmethod
+    def set_state(queryset, state):
+        """
+        Смена статуса заказов; отстающие части заказов по магазинам догоняют заказ,
+        части, которые магазины продвинули дальше, не меняются.
+
+        Returns:
+            int: Количество измененных заказов
+        """
+        order_ids = list(queryset.values_list("id", flat=True))
+        updated = Order.objects.filter(id__in=order_ids).update(state=state)
+        ShopOrder.advance(order_ids, state)
+        return updated
+
     # Действия для изменения статуса
     def make_confirmed(self, request, queryset):
-        updated = queryset.update(state="confirmed")
+        updated = self.set_state(queryset, "confirmed")
         self.message_user(request, f"{updated} заказов подтверждено.")
 
     make_confirmed.short_description = "Подтвердить выбранные заказы"
 
     def make_assembled(self, request, queryset):
-        updated = queryset.update(state="assembled")
+        updated = self.set_state(queryset, "assembled")
         self.message_user(request, f"{updated} заказов собрано.")
 
     make_assembled.short_description = "Отметить как собранные"
 
     def make_sent(self, request, queryset):
-        updated = queryset.update(state="sent")
+        updated = self.set_state(queryset, "sent")
         self.message_user(request, f"{updated} заказов отправлено.")
 
     make_sent.short_description = "Отметить как отправленные"
 
     def make_delivered(self, request, queryset):
-        updated = queryset.update(state="delivered")
+        updated = self.set_state(queryset, "delivered")
         self.message_user(request, f"{updated} заказов доставлено.")
 
     make_delivered.short_description = "Отметить как доставленные"
 
     def make_canceled(self, request, queryset):
-        updated = queryset.update(state="canceled")
+        updated = self.set_state(queryset, "canceled")
         self.message_user(request, f"{updated} заказов отменено.")
 
     make_canceled.short_description = "Отменить выбранные заказы"
 
 
+@admin.register(ShopOrder)
+class ShopOrderAdmin(admin.ModelAdmin):
+    """
+    Админка для частей заказов по магазинам.
+
+    Действия со статусами меняют только строки выбранных частей заказа,
+    не затрагивая части других магазинов; статус заказа пересчитывается по его частям.
+    """
+
+    list_display = ("id", "order", "shop", "state", "items_count", "total_sum", "dt")
+    list_filter = ("state", "shop")
+    list_select_related = ("order", "shop")
+    paginator = CachedCountPaginator
+    show_full_result_count = False
+    search_fields = ("order__id", "shop__name")
+    readonly_fields = ("order", "shop", "dt", "items_count", "total_sum")
+    date_hierarchy = "dt"
+
+    actions = ["make_confirmed", "make_assembled", "make_sent", "make_delivered", "make_canceled"]
+
+    @staticmethod
+    def set_state(queryset, state):
+        """
+        Смена статуса частей заказов и пересчет статусов их заказов.
+
+        Returns:
+            int: Количество измененных частей
+        """
+        rows = list(queryset.values_list("id", "order_id"))
+        updated = ShopOrder.objects.filter(id__in=[pk for pk, _ in rows]).update(state=state)
+        for order_id in {order_id for _, order_id in rows}:
+            ShopOrder.rollup(order_id)
+        return updated
+
+    def make_confirmed(self, request, queryset):
+        updated = self.set_state(queryset, "confirmed")
+        self.message_user(request, f"{updated} заказов магазинов подтверждено.")
+
+    make_confirmed.short_description = "Подтвердить выбранные заказы магазинов"
+
+    def make_assembled(self, request, queryset):
+        updated = self.set_state(queryset, "assembled")
+        self.message_user(request, f"{updated} заказов магазинов собрано.")
+
+    make_assembled.short_description = "Отметить как собранные"
+
+    def make_sent(self, request, queryset):
+        updated = self.set_state(queryset, "sent")
+        self.message_user(request, f"{updated} заказов магазинов отправлено.")
+
+    make_sent.short_description = "Отметить как отправленные"
+
+    def make_delivered(self, request, queryset):
+        updated = self.set_state(queryset, "delivered")
+        self.message_user(request, f"{updated} заказов магазинов доставлено.")
+
+    make_delivered.short_description = "Отметить как доставленные"
+
+    def make_canceled(self, request, queryset):
+        updated = self.set_state(queryset, "canceled")
+        self.message_user(request, f"{updated} заказов магазинов отменено.")
+
+    make_canceled.short_description = "Отменить выбранные заказы магазинов"
+
+
 @admin.register(Contact)
 class ContactAdmin(admin.ModelAdmin):
     """
@@ -331,6 +558,7 @@ class ContactAdmin(admin.ModelAdmin):
 
     list_display = ("user", "city", "street", "house", "phone", "get_full_address")
     list_filter = ("city",)
+    list_select_related = ("user",)
     search_fields = ("user__email", "city", "phone")
 
     def get_full_address(self, obj):
@@ -355,10 +583,26 @@ class ConfirmEmailTokenAdmin(admin.ModelAdmin):
 
     list_display = ("user", "key", "created_at")
     list_filter = ("created_at",)
+    list_select_related = ("user",)
     search_fields = ("user__email", "key")
     readonly_fields = ("key", "created_at")
 
 
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    """
+    Админка для очереди исходящих сообщений (только просмотр).
+    """
+
+    list_display = ("id", "task", "dedup_key", "created_at", "sent_at")
+    list_filter = ("task", ("sent_at", admin.EmptyFieldListFilter))
+    search_fields = ("dedup_key",)
+    readonly_fields = ("task", "kwargs", "dedup_key", "created_at", "claimed_at", "sent_at")
+
+    def has_add_permission(self, request):
+        return False
+
+
 # Настройка заголовков админки
 admin.site.site_header = "Администрирование магазина"
 admin.site.site_title = "Магазин"
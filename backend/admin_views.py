@@ -2,15 +2,21 @@
 Дополнительные views для админ-панели Django.
 
 Содержит кастомные представления для расширения функциональности админки,
-включая страницу импорта товаров из YAML файлов.
+включая страницу импорта товаров из YAML файлов и страницу профилирования
+запросов.
 """
 
+from pathlib import Path
+
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
 from django.core.exceptions import ValidationError
 from django.core.validators import URLValidator
+from django.http import FileResponse, Http404
 from django.shortcuts import redirect, render
 
+from backend import profiling
 from backend.models import Shop
 from backend.tasks import do_import
 
@@ -91,3 +97,74 @@ def import_products_view(request):
         "shops": shops,
     }
     return render(request, "admin/import_products.html", context)
+
+
+@staff_member_required
+def profiling_view(request):
+    """
+    View для профилирования запросов на работающем сервере.
+
+    Доступен только для staff пользователей.
+
+    GET:
+        Показывает текущую настройку профилирования и сохраненные профили.
+        С параметром ``download`` отдает файл профиля view.
+
+    POST:
+        Действие ``action``:
+        - enable: профилировать долю ``rate`` запросов к view ``view_name`` ``minutes`` минут
+        - disable: выключить профилирование
+        - token: выдать токен для заголовка X-Profile
+        - clear: удалить сохраненные профили
+
+    Args:
+        request (HttpRequest): HTTP запрос
+
+    Returns:
+        HttpResponse: Отрендеренная страница, файл профиля или редирект
+
+    Template:
+        admin/profiling.html
+    """
+    profiles_dir = Path(settings.PROFILING_DIR)
+
+    if request.method == "POST":
+        action = request.POST.get("action")
+        if action == "enable":
+            try:
+                rate = float(request.POST.get("rate", 1))
+                minutes = int(request.POST.get("minutes", 5))
+            except ValueError:
+                messages.error(request, "Неверная доля запросов или длительность")
+                return redirect("profiling")
+            view_name = request.POST.get("view_name", "").strip()
+            if not view_name or not 0 < rate <= 1 or not 0 < minutes <= 60:
+                messages.error(request, "Укажите view, долю запросов от 0 до 1 и длительность до 60 минут")
+                return redirect("profiling")
+            profiling.enable(view_name, rate, minutes)
+            messages.success(request, f"Профилирование {view_name} включено на {minutes} мин.")
+        elif action == "disable":
+            profiling.disable()
+            messages.success(request, "Профилирование выключено")
+        elif action == "token":
+            messages.success(request, f"X-Profile: {profiling.make_token()}")
+        elif action == "clear":
+            for path in profiles_dir.glob("*.folded"):
+                path.unlink()
+            messages.success(request, "Профили удалены")
+        return redirect("profiling")
+
+    download = request.GET.get("download")
+    if download:
+        path = profiles_dir / download
+        if path.suffix != ".folded" or path.name != download or not path.is_file():
+            raise Http404
+        return FileResponse(open(path, "rb"), as_attachment=True, filename=download)
+
+    profiles = sorted(profiles_dir.glob("*.folded")) if profiles_dir.is_dir() else []
+    context = {
+        "title": "Профилирование",
+        "toggle": profiling.get_toggle(),
+        "profiles": [{"name": path.name, "size": path.stat().st_size} for path in profiles],
+    }
+    return render(request, "admin/profiling.html", context)
@@ -22,4 +22,7 @@ class BackendConfig(AppConfig):
         Здесь импортируем сигналы, чтобы они были зарегистрированы.
         """
         # Импорт сигналов необходим для их регистрации
+        import backend.instrumentation  # noqa: F401
+        import backend.metrics  # noqa: F401
         import backend.signals  # noqa: F401
+        import backend.slow_queries  # noqa: F401
@@ -0,0 +1,186 @@
+"""
+Асинхронные версии views для чтения каталога, корзины и заказов.
+
+Работают под ASGI (netology_pd_diplom/asgi.py): запросы к БД и кэшу выполняются
+через асинхронный API Django (``async for``, ``acount``, ``cache.aget``), поэтому
+один процесс обслуживает много одновременных запросов, ожидающих ввода-вывода.
+
+Ответы совпадают с синхронными views из backend/views.py: используются те же
+запросы (backend/querysets.py), сериализаторы, пагинация, аутентификация
+по токену и ограничение частоты запросов.
+"""
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import JsonResponse
+from django.views import View
+
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from backend import querysets
+from backend.authentication import CachedTokenAuthentication
+from backend.db import replica_reads, use_replica
+from backend.serializers import CategorySerializer, OrderSerializer, ProductInfoSerializer, ShopSerializer
+
+
+class AsyncAPIView(View):
+    """
+    Базовый асинхронный view: аутентификация по токену и throttling как в APIView.
+    """
+
+    # Требуется авторизация
+    login_required = False
+    # GET запросы читают с реплик (backend/db.py)
+    read_replica = False
+    throttle_scope = None
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            auth = await CachedTokenAuthentication().aauthenticate(request)
+        except AuthenticationFailed as error:
+            return JsonResponse({"detail": str(error.detail)}, status=401)
+        request.user = auth[0] if auth else AnonymousUser()
+
+        if self.login_required and not request.user.is_authenticated:
+            return JsonResponse({"Status": False, "Error": "Log in required"}, status=403)
+
+        wait = await self.check_throttles(request)
+        if wait is not None:
+            response = JsonResponse({"detail": "Request was throttled."}, status=429)
+            response["Retry-After"] = str(int(wait))
+            return response
+
+        with replica_reads(self.read_replica and await sync_to_async(use_replica)(request)):
+            return await super().dispatch(request, *args, **kwargs)
+
+    async def check_throttles(self, request):
+        """
+        Проверка ограничений частоты запросов из DEFAULT_THROTTLE_CLASSES.
+
+        Returns:
+            float: Секунд до следующего разрешенного запроса или None
+        """
+        if not settings.THROTTLE_ENABLED:
+            return None
+        waits = []
+        for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES:
+            throttle = throttle_class()
+            allowed = await sync_to_async(throttle.allow_request, thread_sensitive=False)(request, self)
+            if not allowed:
+                waits.append(throttle.wait() or 0)
+        return max(waits) if waits else None
+
+
+async def serialize(serializer_class, objects):
+    """
+    Сериализация в потоке: промах кэша справочников (backend/dimensions.py)
+    выполняет синхронный запрос к БД.
+
+    Returns:
+        list: Данные сериализатора
+    """
+    return await sync_to_async(lambda: serializer_class(objects, many=True).data)()
+
+
+async def paginate(request, queryset, serializer_class):
+    """
+    Постраничный вывод в формате PageNumberPagination.
+
+    Args:
+        request: HttpRequest
+        queryset: QuerySet
+        serializer_class: Класс сериализатора
+
+    Returns:
+        JsonResponse: ``count``, ``next``, ``previous`` и ``results``
+    """
+    page_size = api_settings.PAGE_SIZE
+    count = await queryset.acount()
+    try:
+        page = int(request.GET.get("page", 1))
+    except ValueError:
+        page = 0
+    last_page = max(1, -(-count // page_size))
+    if not 1 <= page <= last_page:
+        return JsonResponse({"detail": "Invalid page."}, status=404)
+
+    offset = (page - 1) * page_size
+    results = [obj async for obj in queryset[offset : offset + page_size]]
+
+    url = request.build_absolute_uri()
+    previous = None
+    if page > 1:
+        previous = remove_query_param(url, "page") if page == 2 else replace_query_param(url, "page", page - 1)
+    return JsonResponse(
+        {
+            "count": count,
+            "next": replace_query_param(url, "page", page + 1) if page < last_page else None,
+            "previous": previous,
+            "results": serializer_class(results, many=True).data,
+        }
+    )
+
+
+class CategoryView(AsyncAPIView):
+    """
+    Класс для просмотра категорий
+    """
+
+    read_replica = True
+
+    async def get(self, request, *args, **kwargs):
+        return await paginate(request, querysets.categories(), CategorySerializer)
+
+
+class ShopView(AsyncAPIView):
+    """
+    Класс для просмотра списка магазинов
+    """
+
+    read_replica = True
+
+    async def get(self, request, *args, **kwargs):
+        return await paginate(request, querysets.shops(), ShopSerializer)
+
+
+class ProductInfoView(AsyncAPIView):
+    """
+    Класс для поиска товаров
+    """
+
+    read_replica = True
+
+    async def get(self, request, *args, **kwargs):
+        # активные магазины и имена справочников при промахе кэша читаются синхронно
+        queryset = await sync_to_async(querysets.product_infos)(
+            request.GET.get("shop_id"), request.GET.get("category_id")
+        )
+        products = [product async for product in queryset]
+        return JsonResponse(await serialize(ProductInfoSerializer, products), safe=False)
+
+
+class BasketView(AsyncAPIView):
+    """
+    Класс для просмотра корзины пользователя
+    """
+
+    login_required = True
+
+    async def get(self, request, *args, **kwargs):
+        basket = [order async for order in querysets.basket(request.user.id)]
+        return JsonResponse(await serialize(OrderSerializer, basket), safe=False)
+
+
+class OrderView(AsyncAPIView):
+    """
+    Класс для просмотра заказов пользователя
+    """
+
+    login_required = True
+
+    async def get(self, request, *args, **kwargs):
+        orders = [order async for order in querysets.orders(request.user.id)]
+        return JsonResponse(await serialize(OrderSerializer, orders), safe=False)
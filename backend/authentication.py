@@ -0,0 +1,214 @@
+"""
+Аутентификация по токену с кэшированием пользователя.
+
+Стандартный TokenAuthentication на каждый запрос выполняет запрос к БД
+(authtoken_token JOIN backend_user). Здесь снимок пользователя по ключу
+токена хранится в двух уровнях кэша:
+
+- в памяти процесса (LRU с коротким TTL ``AUTH_TOKEN_LOCAL_TTL``);
+- в кэше Django/Redis (TTL ``AUTH_TOKEN_CACHE_TTL``), общем для всех процессов.
+
+В установившемся режиме аутентификация не делает запросов к БД.
+Снимок сбрасывается при удалении токена (выход), сохранении пользователя
+(смена пароля, деактивация) и удалении пользователя.
+
+Пользователь из снимка содержит только поля SNAPSHOT_FIELDS: для изменения
+пользователя его нужно загрузить из БД заново.
+
+Если Redis недоступен, пользователь читается из БД как в TokenAuthentication.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+
+import redis
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+from rest_framework.authtoken.models import Token
+
+from backend.models import User
+
+logger = logging.getLogger(__name__)
+
+# Поля пользователя, которые попадают в снимок
+SNAPSHOT_FIELDS = (
+    "id",
+    "email",
+    "username",
+    "first_name",
+    "last_name",
+    "company",
+    "position",
+    "type",
+    "is_active",
+    "is_staff",
+    "is_superuser",
+)
+
+
+class LocalCache:
+    """
+    Ограниченный по размеру LRU кэш с временем жизни записей.
+
+    Потокобезопасен; при переполнении вытесняются давно не использованные записи.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_cache = LocalCache(settings.AUTH_TOKEN_LOCAL_MAXSIZE, settings.AUTH_TOKEN_LOCAL_TTL)
+
+
+def _cache_key(key):
+    return f"auth-token:{key}"
+
+
+def invalidate_tokens(keys):
+    """
+    Сброс снимков пользователя по ключам токенов.
+
+    Args:
+        keys (list): Ключи токенов
+    """
+    keys = list(keys)
+    for key in keys:
+        local_cache.delete(key)
+    try:
+        cache.delete_many([_cache_key(key) for key in keys])
+    except redis.RedisError as error:
+        logger.warning("Не удалось сбросить кэш аутентификации: %s", error)
+
+
+def invalidate_user(user_id):
+    """
+    Сброс снимков пользователя по всем его токенам.
+
+    Args:
+        user_id (int): ID пользователя
+    """
+    invalidate_tokens(Token.objects.filter(user_id=user_id).values_list("key", flat=True))
+
+
+def _snapshot(user):
+    return {field: getattr(user, field) for field in SNAPSHOT_FIELDS}
+
+
+def _user_from_snapshot(snapshot):
+    if not snapshot["is_active"]:
+        raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+
+    user = User(**snapshot)
+    user._state.adding = False
+    user._state.db = "default"
+    return user
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication со снимком пользователя в памяти процесса и в Redis.
+
+    ``aauthenticate`` - то же для асинхронных views (backend/async_views.py).
+    """
+
+    def authenticate_credentials(self, key):
+        snapshot = local_cache.get(key)
+        if snapshot is None:
+            try:
+                snapshot = cache.get(_cache_key(key))
+            except redis.RedisError as error:
+                logger.warning("Кэш аутентификации недоступен: %s", error)
+                return super().authenticate_credentials(key)
+            if snapshot is None:
+                try:
+                    token = Token.objects.select_related("user").get(key=key)
+                except Token.DoesNotExist:
+                    raise exceptions.AuthenticationFailed(_("Invalid token."))
+                snapshot = _snapshot(token.user)
+                try:
+                    cache.set(_cache_key(key), snapshot, settings.AUTH_TOKEN_CACHE_TTL)
+                except redis.RedisError as error:
+                    logger.warning("Кэш аутентификации недоступен: %s", error)
+            local_cache.set(key, snapshot)
+
+        user = _user_from_snapshot(snapshot)
+        return user, Token(key=key, user_id=user.id)
+
+    async def aauthenticate(self, request):
+        """
+        Асинхронная аутентификация по заголовку ``Authorization: Token <ключ>``.
+
+        Args:
+            request: HttpRequest
+
+        Returns:
+            tuple: (пользователь, токен) или None, если заголовка нет
+
+        Raises:
+            AuthenticationFailed: Если токен неверный или пользователь неактивен
+        """
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(_("Invalid token header."))
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(_("Invalid token header."))
+
+        snapshot = local_cache.get(key)
+        if snapshot is None:
+            try:
+                snapshot = await cache.aget(_cache_key(key))
+            except redis.RedisError as error:
+                logger.warning("Кэш аутентификации недоступен: %s", error)
+            if snapshot is None:
+                token = await Token.objects.select_related("user").filter(key=key).afirst()
+                if token is None:
+                    raise exceptions.AuthenticationFailed(_("Invalid token."))
+                snapshot = _snapshot(token.user)
+                try:
+                    await cache.aset(_cache_key(key), snapshot, settings.AUTH_TOKEN_CACHE_TTL)
+                except redis.RedisError as error:
+                    logger.warning("Кэш аутентификации недоступен: %s", error)
+            local_cache.set(key, snapshot)
+
+        user = _user_from_snapshot(snapshot)
+        return user, Token(key=key, user_id=user.id)
@@ -0,0 +1,159 @@
+"""
+Вспомогательные функции для соединений с базой данных.
+
+Чтение с реплик: реплики из ``DB_REPLICA_HOSTS`` подключаются как базы
+``replica_1``, ``replica_2``... Запись всегда идет в ``default``. Чтение
+уходит на случайную реплику только внутри ``replica_reads()``: views каталога
+и экспорта включают его через ReplicaReadMixin для GET запросов. Задачи Celery
+читают с основной базы: они работают с только что записанными данными (накладные,
+outbox) или пишут (импорт), и задержка реплики для них недопустима. Задача,
+которая только читает, может включить реплики декоратором ``@replica_reads()``.
+
+После изменяющего запроса (корзина, заказ) клиент на ``DB_REPLICA_PIN_SECONDS``
+закрепляется за основной базой (ReplicaPinMiddleware), чтобы видеть свои изменения
+несмотря на задержку репликации.
+"""
+
+import hashlib
+import logging
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.deprecation import MiddlewareMixin
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_replica_reads = ContextVar("replica_reads", default=False)
+
+
+def replica_aliases():
+    """
+    Псевдонимы баз данных реплик.
+    """
+    return [alias for alias in settings.DATABASES if alias.startswith("replica_")]
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """
+    Чтение с реплик внутри блока. Можно использовать как декоратор.
+
+    Args:
+        enabled (bool): Включить чтение с реплик
+    """
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Роутер: чтение внутри replica_reads() - на реплику, остальное - на основную базу.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get():
+            return None
+        replicas = replica_aliases()
+        # внутри транзакции читаем то, что в нее записано
+        if not replicas or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        # объекты, прочитанные с реплики, сохраняются в основную базу
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def _pin_key(request):
+    ident = (
+        request.META.get("HTTP_AUTHORIZATION")
+        or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        or request.META.get("REMOTE_ADDR", "")
+    )
+    return "replica-pin:" + hashlib.sha256(ident.encode()).hexdigest()
+
+
+def is_pinned(request):
+    """
+    Клиент недавно изменял данные и должен читать с основной базы.
+    """
+    try:
+        return bool(cache.get(_pin_key(request)))
+    except redis.RedisError as error:
+        logger.warning("Кэш закрепления за основной базой недоступен: %s", error)
+        return True
+
+
+def use_replica(request):
+    """
+    Можно ли выполнить чтение этого запроса на реплике.
+    """
+    return request.method in SAFE_METHODS and bool(replica_aliases()) and not is_pinned(request)
+
+
+class ReplicaReadMixin:
+    """
+    Mixin для views только для чтения: GET запросы читают с реплик.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with replica_reads(use_replica(request)):
+            return super().dispatch(request, *args, **kwargs)
+
+
+class ReplicaPinMiddleware(MiddlewareMixin):
+    """
+    Закрепляет клиента за основной базой после успешного изменяющего запроса.
+    """
+
+    def process_response(self, request, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400 and replica_aliases():
+            try:
+                cache.set(_pin_key(request), 1, settings.DB_REPLICA_PIN_SECONDS)
+            except redis.RedisError as error:
+                logger.warning("Кэш закрепления за основной базой недоступен: %s", error)
+        return response
+
+
+def pool_stats(alias=DEFAULT_DB_ALIAS):
+    """
+    Состояние соединений процесса с базой данных.
+
+    С пулом psycopg 3 (DB_POOL=True) возвращает статистику пула: размер
+    (``pool_size``), свободные соединения (``pool_available``), ожидающие
+    запросы (``requests_waiting``), суммарное ожидание (``requests_wait_ms``)
+    и ошибки получения соединения (``requests_errors``). Без пула - признак
+    открытого постоянного соединения.
+
+    Args:
+        alias (str): Псевдоним базы данных
+
+    Returns:
+        dict: Статистика соединений
+    """
+    connection = connections[alias]
+    pool = getattr(connection, "pool", None)
+    if pool is None:
+        return {
+            "pool": False,
+            "conn_max_age": connection.settings_dict["CONN_MAX_AGE"],
+            "connected": connection.connection is not None,
+        }
+    return {"pool": True, **pool.get_stats()}
@@ -0,0 +1,300 @@
+"""
+Кэш справочников в памяти процесса: категории, параметры, магазины.
+
+Справочники маленькие и меняются редко, а читаются при каждой сериализации
+товара и в каждом цикле импорта. Записи справочника (ID и поля ``fields``)
+хранятся в LRU кэше процесса (``DIMENSION_CACHE_MAXSIZE`` записей,
+``DIMENSION_CACHE_TTL`` секунд), поиск ID по имени и имени по ID в установившемся
+режиме не делает запросов к БД.
+
+Сброс по версиям через Redis:
+
+- при изменении или удалении записи (сигналы в backend/signals.py) процесс
+  сбрасывает свой кэш, а после фиксации транзакции увеличивает версию
+  справочника в Redis и публикует ее в канал ``CHANNEL``;
+- каждый процесс слушает канал в фоновом потоке и сбрасывает справочник,
+  версия которого изменилась; после (пере)подключения версии сверяются
+  с Redis, так что сообщения, пропущенные за время обрыва, не теряются.
+
+Создание записи кэш не сбрасывает (отсутствующие записи не кэшируются),
+кроме справочников с выборками по всем записям (``invalidate_on_create``).
+Если Redis недоступен, другие процессы увидят изменение через ``DIMENSION_CACHE_TTL``.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+import redis
+
+from backend.authentication import LocalCache
+from backend.models import Category, Parameter, Shop
+
+logger = logging.getLogger(__name__)
+
+# Канал Redis для публикации версий справочников
+CHANNEL = "dimensions"
+
+# Пауза перед повторным обращением к недоступному Redis, секунды
+REDIS_RETRY_AFTER = 5
+
+DIMENSIONS = {}
+
+_client = None
+_unavailable_until = 0.0
+_listener_pid = None
+_listener_lock = threading.Lock()
+
+
+class Dimension:
+    """
+    Справочник: ID <-> поля записи в LRU кэше процесса.
+
+    Первый промах после сброса загружает справочник целиком одним запросом,
+    следующие промахи (новые записи) - по одной записи.
+
+    Args:
+        model: Модель справочника
+        fields (tuple): Кэшируемые поля; первое - имя записи
+        invalidate_on_create (bool): Сбрасывать кэш при создании записи
+            (нужно для выборок ``ids``)
+    """
+
+    def __init__(self, model, fields=("name",), invalidate_on_create=False):
+        self.model = model
+        self.name = model._meta.model_name
+        self.fields = fields
+        self.invalidate_on_create = invalidate_on_create
+        self.version = 0
+        self._by_id = LocalCache(settings.DIMENSION_CACHE_MAXSIZE, settings.DIMENSION_CACHE_TTL)
+        self._by_name = LocalCache(settings.DIMENSION_CACHE_MAXSIZE, settings.DIMENSION_CACHE_TTL)
+        self._selections = LocalCache(64, settings.DIMENSION_CACHE_TTL)
+        self._warmed_at = None
+        DIMENSIONS[self.name] = self
+
+    def __deepcopy__(self, memo):
+        # один кэш на процесс: поля сериализаторов копируются вместе с аргументами
+        return self
+
+    def _store(self, row):
+        pk = row.pop("id")
+        self._by_id.set(pk, row)
+        self._by_name.set(row[self.fields[0]], pk)
+        return row
+
+    def _load(self, **filters):
+        return self.model.objects.filter(**filters).order_by().values("id", *self.fields)
+
+    def _warm(self):
+        """
+        Загрузка справочника целиком, если он не загружался в течение TTL.
+
+        Returns:
+            bool: Был ли выполнен запрос
+        """
+        warmed_at = self._warmed_at
+        if warmed_at is not None and time.monotonic() - warmed_at < settings.DIMENSION_CACHE_TTL:
+            return False
+        for row in self._load()[: settings.DIMENSION_CACHE_MAXSIZE]:
+            self._store(row)
+        self._warmed_at = time.monotonic()
+        return True
+
+    def get(self, pk):
+        """
+        Поля записи по ID.
+
+        Returns:
+            dict: Значения ``fields`` или None, если записи нет
+        """
+        start_listener()
+        row = self._by_id.get(pk)
+        if row is None and pk is not None:
+            if self._warm():
+                row = self._by_id.get(pk)
+            if row is None:
+                row = self._load(pk=pk).first()
+                row = None if row is None else self._store(row)
+        return row
+
+    def label(self, pk):
+        """
+        Имя записи по ID.
+        """
+        row = self.get(pk)
+        return None if row is None else row[self.fields[0]]
+
+    def id_for(self, name):
+        """
+        ID записи по имени.
+
+        Returns:
+            int: ID или None, если записи нет
+        """
+        start_listener()
+        pk = self._by_name.get(name)
+        if pk is None:
+            if self._warm():
+                pk = self._by_name.get(name)
+            if pk is None:
+                row = self._load(**{self.fields[0]: name}).first()
+                pk = None if row is None else row["id"]
+                if row is not None:
+                    self._store(row)
+        return pk
+
+    def get_or_create_id(self, name):
+        """
+        ID записи по имени; запись создается, если ее нет.
+        """
+        pk = self.id_for(name)
+        if pk is None:
+            instance, _ = self.model.objects.get_or_create(**{self.fields[0]: name})
+            pk = instance.pk
+            self._store({"id": pk, **{field: getattr(instance, field) for field in self.fields}})
+        return pk
+
+    def ids(self, **filters):
+        """
+        ID записей по условию, например ``shops.ids(state=True)``.
+
+        Returns:
+            list: ID записей
+        """
+        start_listener()
+        key = tuple(sorted(filters.items()))
+        ids = self._selections.get(key)
+        if ids is None:
+            ids = list(self.model.objects.filter(**filters).order_by("id").values_list("id", flat=True))
+            self._selections.set(key, ids)
+        return ids
+
+    def invalidate(self):
+        """
+        Сброс кэша справочника в этом процессе.
+        """
+        self._by_id.clear()
+        self._by_name.clear()
+        self._selections.clear()
+        self._warmed_at = None
+
+    def apply_version(self, version):
+        """
+        Сброс кэша, если версия справочника в Redis изменилась.
+        """
+        if version != self.version:
+            self.version = version
+            self.invalidate()
+
+
+categories = Dimension(Category)
+parameters = Dimension(Parameter)
+shops = Dimension(Shop, fields=("name", "state"), invalidate_on_create=True)
+
+
+def _version_key(name):
+    return f"dimension-version:{name}"
+
+
+def _get_client():
+    global _client
+
+    if _client is None:
+        _client = redis.Redis.from_url(
+            settings.DIMENSION_CACHE_REDIS_URL, socket_timeout=0.2, socket_connect_timeout=0.2
+        )
+    return _client
+
+
+def publish(name):
+    """
+    Увеличение версии справочника в Redis и рассылка ее всем процессам.
+
+    Args:
+        name (str): Имя справочника (имя модели)
+    """
+    global _unavailable_until
+
+    if not settings.DIMENSION_CACHE_REDIS_URL or time.monotonic() < _unavailable_until:
+        return
+    try:
+        client = _get_client()
+        version = client.incr(_version_key(name))
+        client.publish(CHANNEL, f"{name}:{version}")
+    except redis.RedisError as error:
+        _unavailable_until = time.monotonic() + REDIS_RETRY_AFTER
+        logger.warning("Не удалось опубликовать сброс справочника %s: %s", name, error)
+
+
+def changed(model, created=False):
+    """
+    Сброс справочника после изменения записи модели.
+
+    В этом процессе кэш сбрасывается сразу и еще раз после фиксации транзакции,
+    в остальных - по сообщению из Redis.
+
+    Args:
+        model: Модель измененной записи
+        created (bool): Запись создана
+    """
+    dimension = DIMENSIONS.get(model._meta.model_name)
+    if dimension is None or (created and not dimension.invalidate_on_create):
+        return
+    dimension.invalidate()
+
+    def committed():
+        dimension.invalidate()
+        publish(dimension.name)
+
+    transaction.on_commit(committed)
+
+
+def sync_versions(client):
+    """
+    Сверка версий всех справочников с Redis.
+    """
+    names = list(DIMENSIONS)
+    for name, version in zip(names, client.mget([_version_key(name) for name in names])):
+        DIMENSIONS[name].apply_version(int(version or 0))
+
+
+def _listen():
+    failed = False
+    while True:
+        try:
+            client = redis.Redis.from_url(
+                settings.DIMENSION_CACHE_REDIS_URL, socket_connect_timeout=1, health_check_interval=30
+            )
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(CHANNEL)
+            sync_versions(client)
+            failed = False
+            for message in pubsub.listen():
+                name, _, version = message["data"].decode().partition(":")
+                if name in DIMENSIONS:
+                    DIMENSIONS[name].apply_version(int(version))
+        except (redis.RedisError, ValueError) as error:
+            if not failed:
+                logger.warning("Подписка на сброс справочников недоступна: %s", error)
+            failed = True
+            time.sleep(REDIS_RETRY_AFTER)
+
+
+def start_listener():
+    """
+    Запуск фонового потока подписки (один на процесс, в том числе после fork).
+    """
+    global _listener_pid
+
+    pid = os.getpid()
+    if _listener_pid == pid or not settings.DIMENSION_CACHE_REDIS_URL:
+        return
+    with _listener_lock:
+        if _listener_pid == pid:
+            return
+        _listener_pid = pid
+        threading.Thread(target=_listen, name="dimension-cache", daemon=True).start()
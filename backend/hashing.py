@@ -0,0 +1,181 @@
+"""
+Хеширование и проверка паролей с ограничением параллельности.
+
+PBKDF2 с сотнями тысяч итераций занимает процессор на десятки миллисекунд,
+и всплеск входов занимает все worker'ы. Здесь число одновременно вычисляемых
+хешей ограничено; хеш считается в потоке запроса (hashlib и argon2/bcrypt
+отпускают GIL, поэтому потоки выполняются параллельно):
+
+- одновременно вычисляется не больше ``PASSWORD_HASH_WORKERS`` хешей;
+- в очереди ждут не больше ``PASSWORD_HASH_QUEUE_SIZE`` запросов и не дольше
+  ``PASSWORD_HASH_WAIT_TIMEOUT`` секунд, остальные сразу получают ``503``
+  (HashingBusy) вместо ожидания;
+- ``stats()`` возвращает глубину очереди и время ожидания/вычисления
+  (на ``/metrics`` - метрики ``password_hash_*``).
+
+``User.set_password`` и ``User.check_password`` (backend/models.py) вызывают
+функции этого модуля, поэтому вход через ``django.contrib.auth.authenticate``
+и смена пароля проходят через ограничение. HashingBusy в DRF views отдается
+как ``503``, в остальных views (вход в админку) - через HashingBusyMiddleware.
+Если хеш создан не основным хешером из ``PASSWORD_HASHERS`` (или с устаревшими
+параметрами), после успешной проверки пароль перехешируется.
+"""
+
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.http import HttpResponse
+from django.utils.deprecation import MiddlewareMixin
+
+from rest_framework.exceptions import APIException
+
+# Через сколько секунд клиенту стоит повторить запрос (заголовок Retry-After)
+RETRY_AFTER = 1
+
+
+class HashingBusy(APIException):
+    """
+    Очередь хеширования паролей заполнена.
+    """
+
+    status_code = 503
+    default_detail = "Сервер перегружен, повторите попытку позже"
+    default_code = "hashing_busy"
+    wait = RETRY_AFTER
+
+
+_running = None
+_slots = None
+_workers = 0
+_limiter_pid = None
+_lock = threading.Lock()
+_stats = {
+    "submitted": 0,
+    "rejected": 0,
+    "queued": 0,
+    "running": 0,
+    "wait_seconds": 0.0,
+    "hash_seconds": 0.0,
+}
+
+
+def _get_limiter():
+    """
+    Семафоры процесса: вычисляемые хеши и вычисляемые вместе с ожидающими.
+
+    После fork (gunicorn --preload) создаются заново.
+    """
+    global _running, _slots, _workers, _limiter_pid
+    if _slots is None or _limiter_pid != os.getpid():
+        with _lock:
+            if _slots is None or _limiter_pid != os.getpid():
+                _workers = settings.PASSWORD_HASH_WORKERS or os.cpu_count() or 1
+                _running = threading.BoundedSemaphore(_workers)
+                _slots = threading.BoundedSemaphore(_workers + settings.PASSWORD_HASH_QUEUE_SIZE)
+                _limiter_pid = os.getpid()
+
+
+def _reject():
+    with _lock:
+        _stats["rejected"] += 1
+    raise HashingBusy()
+
+
+def _run(func, *args):
+    """
+    Выполнение func в потоке запроса, когда освободится место.
+
+    Raises:
+        HashingBusy: Если очередь заполнена или место не освободилось за PASSWORD_HASH_WAIT_TIMEOUT
+    """
+    _get_limiter()
+    if not _slots.acquire(blocking=False):
+        _reject()
+    running = _running
+    try:
+        submitted = time.perf_counter()
+        with _lock:
+            _stats["submitted"] += 1
+            _stats["queued"] += 1
+        acquired = running.acquire(timeout=settings.PASSWORD_HASH_WAIT_TIMEOUT)
+        started = time.perf_counter()
+        with _lock:
+            _stats["queued"] -= 1
+            _stats["wait_seconds"] += started - submitted
+            if acquired:
+                _stats["running"] += 1
+        if not acquired:
+            _reject()
+        try:
+            return func(*args)
+        finally:
+            running.release()
+            with _lock:
+                _stats["running"] -= 1
+                _stats["hash_seconds"] += time.perf_counter() - started
+    finally:
+        _slots.release()
+
+
+def stats():
+    """
+    Состояние пула хеширования.
+
+    Returns:
+        dict: Допустимое число одновременных хешей, глубина очереди, счетчики и суммарное время ожидания/хеширования
+    """
+    with _lock:
+        result = dict(_stats)
+    result["workers"] = _workers
+    return result
+
+
+def hash_password(raw_password):
+    """
+    Хеш пароля основным хешером.
+
+    Args:
+        raw_password (str): Пароль
+
+    Returns:
+        str: Закодированный хеш для поля User.password
+    """
+    return _run(hashers.make_password, raw_password)
+
+
+def check_password(raw_password, encoded, setter=None):
+    """
+    Проверка пароля по хешу, как ``django.contrib.auth.hashers.check_password``.
+
+    Args:
+        raw_password (str): Пароль
+        encoded (str): Хеш из User.password
+        setter: Функция перехеширования пароля; вызывается в потоке запроса,
+            если хеш нужно обновить
+
+    Returns:
+        bool: Пароль верный
+    """
+    must_update = []
+    valid = _run(hashers.check_password, raw_password, encoded, must_update.append)
+    if must_update and setter:
+        setter(raw_password)
+    return valid
+
+
+class HashingBusyMiddleware(MiddlewareMixin):
+    """
+    Ответ ``503`` на HashingBusy вне DRF (вход в админку, формы Django).
+
+    DRF views обрабатывают HashingBusy сами как APIException.
+    """
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, HashingBusy):
+            return None
+        response = HttpResponse(HashingBusy.default_detail, status=503, content_type="text/plain; charset=utf-8")
+        response["Retry-After"] = str(RETRY_AFTER)
+        return response
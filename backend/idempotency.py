@@ -0,0 +1,135 @@
+"""
+Идемпотентность изменяющих API запросов.
+
+Клиент может передать заголовок ``Idempotency-Key`` при оформлении заказа
+и изменении корзины. Первый ответ на запрос с этим ключом сохраняется в кэше
+(Redis) на ``IDEMPOTENCY_TTL`` секунд; повторный запрос с тем же ключом
+получает сохраненный ответ одной операцией чтения из кэша, без повторного
+выполнения транзакции и отправки сигналов.
+
+Если кэш недоступен, запрос выполняется как обычно, без дедупликации.
+"""
+
+import hashlib
+import logging
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+from django.template.response import SimpleTemplateResponse
+
+import redis
+from ujson import dumps as dump_json
+
+IDEMPOTENCY_HEADER = "HTTP_IDEMPOTENCY_KEY"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+# Маркер запроса, который выполняется прямо сейчас
+IN_PROGRESS = "in-progress"
+
+# Ошибки недоступного кэша: RedisCache пробрасывает исключения redis-py
+CACHE_ERRORS = (redis.RedisError, OSError)
+
+logger = logging.getLogger(__name__)
+
+
+def _cache_key(request, key):
+    """
+    Ключ кэша для ответа: пользователь, метод, путь и ключ клиента.
+
+    Ключ хешируется, чтобы длина записи в кэше не зависела от клиента.
+    """
+    raw = f"{request.user.id}:{request.method}:{request.path}:{key}"
+    return "idempotency:" + hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _fingerprint(request):
+    """
+    Отпечаток тела запроса.
+
+    Позволяет отличить повтор запроса от другого запроса
+    с тем же ключом идемпотентности.
+    """
+    data = request.data
+    if hasattr(data, "lists"):
+        data = dict(data.lists())
+    return hashlib.sha256(dump_json(data, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _safe(operation, *args, **kwargs):
+    """
+    Запись в кэш, ошибка которой не прерывает ответ клиенту.
+    """
+    try:
+        operation(*args, **kwargs)
+    except CACHE_ERRORS as error:
+        logger.warning("Кэш идемпотентности недоступен: %s", error)
+
+
+def idempotent(method):
+    """
+    Декоратор метода APIView, делающий его идемпотентным по ключу клиента.
+
+    Запросы без заголовка ``Idempotency-Key``, анонимные запросы и запросы
+    при недоступном кэше выполняются как обычно. Сохраняются только ответы без ошибок сервера;
+    ``Response`` DRF перед сохранением рендерится.
+
+    Returns:
+        function: Обернутый метод view
+    """
+
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.META.get(IDEMPOTENCY_HEADER)
+        if not key or not request.user.is_authenticated:
+            return method(self, request, *args, **kwargs)
+
+        if len(key) > 255:
+            return JsonResponse({"Status": False, "Errors": "Слишком длинный ключ идемпотентности"}, status=400)
+
+        cache_key = _cache_key(request, key)
+        fingerprint = _fingerprint(request)
+
+        try:
+            stored = cache.get(cache_key)
+            acquired = stored is None and cache.add(cache_key, IN_PROGRESS, timeout=settings.IDEMPOTENCY_LOCK_TIMEOUT)
+            if stored is None and not acquired:
+                # ключ занял параллельный запрос между get и add: он мог уже завершиться
+                stored = cache.get(cache_key)
+        except CACHE_ERRORS as error:
+            logger.warning("Кэш идемпотентности недоступен, запрос выполняется без дедупликации: %s", error)
+            return method(self, request, *args, **kwargs)
+
+        if acquired:
+            try:
+                response = method(self, request, *args, **kwargs)
+                if isinstance(response, SimpleTemplateResponse):
+                    # Response DRF рендерится только в dispatch, а тело нужно сейчас
+                    response = self.finalize_response(request, response, *args, **kwargs)
+                    response.render()
+            except Exception:
+                _safe(cache.delete, cache_key)
+                raise
+
+            if response.status_code < 500 and not getattr(response, "streaming", False):
+                stored = (fingerprint, response.status_code, response["Content-Type"], response.content)
+                _safe(cache.set, cache_key, stored, timeout=settings.IDEMPOTENCY_TTL)
+            else:
+                _safe(cache.delete, cache_key)
+            return response
+
+        if stored is None or stored == IN_PROGRESS:
+            return JsonResponse({"Status": False, "Errors": "Запрос с этим ключом уже выполняется"}, status=409)
+
+        stored_fingerprint, status, content_type, content = stored
+        if stored_fingerprint != fingerprint:
+            return JsonResponse(
+                {"Status": False, "Errors": "Ключ идемпотентности использован с другими параметрами"}, status=422
+            )
+
+        response = HttpResponse(content, status=status, content_type=content_type)
+        response[REPLAYED_HEADER] = "true"
+        return response
+
+    return wrapper
@@ -0,0 +1,265 @@
+"""
+Измерение запросов к БД, кэшу, сериализации и отрисовки ответа для запросов и задач.
+
+Для выбранной доли запросов (``INSTRUMENTATION_SAMPLE_RATE``) и задач Celery
+(``INSTRUMENTATION_TASK_SAMPLE_RATE``) собирается:
+
+- число SQL запросов и их суммарное время;
+- попадания и промахи кэша (для кэша InstrumentedRedisCache);
+- время сериализации (``to_representation`` сериализаторов DRF
+  с SerializationStatsMixin);
+- время отрисовки ответа (JSON рендерер DRF, шаблоны);
+- общее время.
+
+Результат пишется одной строкой JSON в лог ``backend.instrumentation``,
+для запросов - также в заголовок ``Server-Timing``. Если запрос не попал
+в выборку, стоимость - одна проверка contextvar на каждый SQL запрос.
+"""
+
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache.backends.redis import RedisCache
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+import ujson
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from celery.signals import task_postrun, task_prerun
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar("instrumentation_stats", default=None)
+# Идет сериализация верхнего уровня: вложенные сериализаторы не считаются повторно
+_serializing = ContextVar("instrumentation_serializing", default=False)
+_task_tokens = {}
+
+
+class Stats:
+    """
+    Счетчики одного запроса или задачи.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.serialization_time = 0.0
+        self.render_time = 0.0
+
+    def as_dict(self):
+        return {
+            "duration_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "sql_count": self.sql_count,
+            "sql_ms": round(self.sql_time * 1000, 2),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "serialization_ms": round(self.serialization_time * 1000, 2),
+            "render_ms": round(self.render_time * 1000, 2),
+        }
+
+
+def current_stats():
+    """
+    Счетчики текущего запроса или задачи, None если они не измеряются.
+    """
+    return _current.get()
+
+
+def _sql_wrapper(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.sql_count += 1
+        stats.sql_time += time.perf_counter() - started
+
+
+@receiver(connection_created)
+def install_sql_wrapper(sender, connection, **kwargs):
+    """
+    Подключаем счетчик SQL запросов к каждому новому соединению.
+    """
+    if _sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_sql_wrapper)
+
+
+class CacheStatsMixin:
+    """
+    Подсчет попаданий и промахов get/get_many для бэкенда кэша Django.
+    """
+
+    _missing = object()
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, self._missing, version)
+        stats = _current.get()
+        if stats is not None:
+            if value is self._missing:
+                stats.cache_misses += 1
+            else:
+                stats.cache_hits += 1
+        return default if value is self._missing else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        stats = _current.get()
+        # BaseCache.get_many вызывает get для каждого ключа: не считаем их дважды
+        token = _current.set(None)
+        try:
+            values = super().get_many(keys, version)
+        finally:
+            _current.reset(token)
+        if stats is not None:
+            stats.cache_hits += len(values)
+            stats.cache_misses += len(keys) - len(values)
+        return values
+
+
+class InstrumentedRedisCache(CacheStatsMixin, RedisCache):
+    """
+    RedisCache с подсчетом попаданий и промахов.
+    """
+
+
+class SerializationStatsMixin:
+    """
+    Mixin сериализатора DRF: время сериализации в счетчиках запроса или задачи.
+
+    Измеряется ``to_representation`` сериализатора верхнего уровня (для many=True -
+    каждого элемента списка), вложенные сериализаторы входят в его время.
+    """
+
+    def to_representation(self, instance):
+        stats = _current.get()
+        if stats is None or _serializing.get():
+            return super().to_representation(instance)
+        token = _serializing.set(True)
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            stats.serialization_time += time.perf_counter() - started
+            _serializing.reset(token)
+
+
+def _sampled(rate):
+    return rate > 0 and (rate >= 1 or random.random() < rate)
+
+
+def server_timing(stats):
+    """
+    Значение заголовка Server-Timing.
+
+    Args:
+        stats (dict): Результат Stats.as_dict()
+    """
+    return (
+        f'sql;dur={stats["sql_ms"]};desc="{stats["sql_count"]} queries", '
+        f'cache;desc="{stats["cache_hits"]} hits {stats["cache_misses"]} misses", '
+        f'serialization;dur={stats["serialization_ms"]}, '
+        f'render;dur={stats["render_ms"]}, '
+        f'total;dur={stats["duration_ms"]}'
+    )
+
+
+class InstrumentationMiddleware:
+    """
+    Измеряет выбранные запросы: заголовок Server-Timing и запись в лог.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not _sampled(settings.INSTRUMENTATION_SAMPLE_RATE):
+            return self.get_response(request)
+
+        stats = Stats()
+        token = _current.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.report(request, response, stats)
+
+    async def __acall__(self, request):
+        if not _sampled(settings.INSTRUMENTATION_SAMPLE_RATE):
+            return await self.get_response(request)
+
+        stats = Stats()
+        token = _current.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.report(request, response, stats)
+
+    def process_template_response(self, request, response):
+        stats = _current.get()
+        if stats is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                stats.render_time += time.perf_counter() - started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def report(self, request, response, stats):
+        record = stats.as_dict()
+        if settings.INSTRUMENTATION_SERVER_TIMING:
+            response["Server-Timing"] = server_timing(record)
+        match = request.resolver_match
+        logger.info(
+            ujson.dumps(
+                {
+                    "event": "request",
+                    "method": request.method,
+                    "path": request.path,
+                    "view": match.view_name if match else None,
+                    "status": response.status_code,
+                    **record,
+                },
+                ensure_ascii=False,
+            )
+        )
+        return response
+
+
+@task_prerun.connect
+def task_started(task_id=None, task=None, **kwargs):
+    """
+    Начинаем измерение выбранной задачи Celery.
+    """
+    if _sampled(settings.INSTRUMENTATION_TASK_SAMPLE_RATE):
+        _task_tokens[task_id] = _current.set(Stats())
+
+
+@task_postrun.connect
+def task_finished(task_id=None, task=None, state=None, **kwargs):
+    """
+    Записываем в лог счетчики задачи Celery.
+    """
+    token = _task_tokens.pop(task_id, None)
+    if token is None:
+        return
+    stats = _current.get()
+    _current.reset(token)
+    logger.info(ujson.dumps({"event": "task", "task": task.name, "state": state, **stats.as_dict()}))
@@ -0,0 +1,114 @@
+"""
+Формирование накладных по заказам для администратора.
+
+Заказы загружаются одним запросом с prefetch позиций, товаров и магазинов,
+а шаблон накладной компилируется один раз на процесс. Это позволяет
+формировать накладные сразу для многих заказов в одной задаче Celery,
+в том числе сводкой (дайджестом) с накладными во вложениях.
+"""
+
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import Prefetch
+from django.template.loader import get_template
+
+from backend import mail, metrics
+from backend.models import Order, OrderItem
+
+INVOICE_TEMPLATE = "email/invoice.html"
+DIGEST_TEMPLATE = "email/invoice_digest.html"
+
+
+@lru_cache(maxsize=None)
+def _get_template(name):
+    """
+    Скомпилированный шаблон (кэшируется на время жизни процесса).
+    """
+    return get_template(name)
+
+
+def invoice_queryset():
+    """
+    Заказы со всеми данными, которые нужны для накладной.
+
+    Returns:
+        QuerySet: Заказы с пользователем, контактом и позициями
+    """
+    items = OrderItem.objects.select_related("product_info__product", "product_info__shop")
+    return Order.objects.select_related("user", "contact").prefetch_related(Prefetch("ordered_items", queryset=items))
+
+
+@metrics.INVOICE_RENDER.time()
+def render_invoice(order):
+    """
+    HTML накладной по заказу.
+
+    Заказ должен быть получен через invoice_queryset(), иначе шаблон
+    будет загружать позиции и товары отдельными запросами.
+
+    Args:
+        order (Order): Заказ
+
+    Returns:
+        str: HTML накладной
+    """
+    # Считаем суммы по позициям и общую сумму
+    order.total_sum = 0
+    for item in order.ordered_items.all():
+        item.sum = item.quantity * item.product_info.price
+        order.total_sum += item.sum
+
+    return _get_template(INVOICE_TEMPLATE).render({"order": order, "total_sum": order.total_sum})
+
+
+def build_invoice_messages(order_ids):
+    """
+    Письма с накладными для администратора.
+
+    Args:
+        order_ids (list): ID заказов
+
+    Returns:
+        dict: Письма по ID заказа (ненайденные заказы пропускаются)
+    """
+    return {
+        order.id: mail.build_message(
+            subject=f"Новый заказ №{order.id}",
+            message=f"Поступил новый заказ №{order.id}",  # Текстовая версия
+            recipient_list=[settings.ADMIN_EMAIL],
+            html_content=render_invoice(order),
+        )
+        for order in invoice_queryset().filter(id__in=order_ids)
+    }
+
+
+def build_digest_message(order_ids):
+    """
+    Сводное письмо администратору по нескольким заказам.
+
+    Тело письма содержит таблицу заказов с итогами, а накладная по каждому
+    заказу прикладывается HTML файлом.
+
+    Args:
+        order_ids (list): ID заказов
+
+    Returns:
+        EmailMultiAlternatives: Письмо или None, если заказы не найдены
+    """
+    orders = list(invoice_queryset().filter(id__in=order_ids).order_by("id"))
+    if not orders:
+        return None
+
+    attachments = [(f"invoice_{order.id}.html", render_invoice(order), "text/html") for order in orders]
+    total_sum = sum(order.total_sum for order in orders)
+
+    msg = mail.build_message(
+        subject=f"Новые заказы: {len(orders)} (№{orders[0].id}-{orders[-1].id})",
+        message=f"Поступило новых заказов: {len(orders)} на сумму {total_sum} руб.",  # Текстовая версия
+        recipient_list=[settings.ADMIN_EMAIL],
+        html_content=_get_template(DIGEST_TEMPLATE).render({"orders": orders, "total_sum": total_sum}),
+    )
+    for attachment in attachments:
+        msg.attach(*attachment)
+    return msg
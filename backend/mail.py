@@ -0,0 +1,155 @@
+"""
+Отправка email через пул SMTP соединений.
+
+Каждый процесс (worker Celery) держит одно открытое SMTP соединение
+и переиспользует его между письмами и задачами, вместо установки нового
+TLS соединения на каждое письмо. Соединение переоткрывается, если
+простаивало дольше ``EMAIL_POOL_MAX_IDLE`` секунд или было разорвано
+сервером. Скорость отправки ограничивается ``EMAIL_RATE_LIMIT`` писем
+в секунду на процесс.
+"""
+
+import smtplib
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+
+from celery.exceptions import SoftTimeLimitExceeded
+from celery.signals import worker_process_shutdown
+
+# Ошибки, после которых соединение нужно открыть заново, а отправку повторить
+RETRYABLE_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError)
+
+
+class SendError(Exception):
+    """
+    Ошибка отправки пачки писем.
+
+    Attributes:
+        unsent (list): Письма, которые не были отправлены
+        sent (int): Количество писем, отправленных до ошибки
+    """
+
+    def __init__(self, unsent, sent):
+        super().__init__(f"Не отправлено писем: {len(unsent)}")
+        self.unsent = unsent
+        self.sent = sent
+
+
+_lock = threading.Lock()
+_connection = None
+_last_used = 0.0
+_last_sent = 0.0
+
+
+def build_message(subject, message, recipient_list, html_content=None):
+    """
+    Создание письма с текстовой и (опционально) HTML версией.
+
+    Args:
+        subject (str): Тема письма
+        message (str): Текст письма
+        recipient_list (list): Список email адресов получателей
+        html_content (str): HTML версия письма (опционально)
+
+    Returns:
+        EmailMultiAlternatives: Письмо, готовое к отправке
+    """
+    msg = EmailMultiAlternatives(subject=subject, body=message, from_email=settings.EMAIL_HOST_USER, to=recipient_list)
+    if html_content:
+        msg.attach_alternative(html_content, "text/html")
+    return msg
+
+
+def _get_connection():
+    """
+    Открытое соединение процесса с почтовым сервером.
+
+    Соединение, простаивавшее дольше EMAIL_POOL_MAX_IDLE, закрывается
+    и открывается заново: почтовые серверы обрывают бездействующие сессии.
+    """
+    global _connection
+
+    if _connection is not None and time.monotonic() - _last_used > settings.EMAIL_POOL_MAX_IDLE:
+        close_connection()
+
+    if _connection is None:
+        _connection = get_connection(fail_silently=False)
+        _connection.open()
+    return _connection
+
+
+def close_connection(**kwargs):
+    """
+    Закрытие соединения процесса (также вызывается при остановке worker).
+    """
+    global _connection
+
+    if _connection is not None:
+        try:
+            _connection.close()
+        except Exception:
+            pass
+        _connection = None
+
+
+def _throttle():
+    """
+    Пауза перед отправкой, чтобы не превышать EMAIL_RATE_LIMIT писем в секунду.
+    """
+    global _last_sent
+
+    if settings.EMAIL_RATE_LIMIT:
+        delay = _last_sent + 1 / settings.EMAIL_RATE_LIMIT - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+    _last_sent = time.monotonic()
+
+
+def send_messages(messages):
+    """
+    Отправка писем через соединение процесса.
+
+    Письма отправляются по одному в рамках одной SMTP сессии. При разрыве
+    соединения оно открывается заново и отправка письма повторяется один раз;
+    если и это не удалось, исключение пробрасывается вызывающему коду вместе
+    со списком неотправленных писем.
+
+    Args:
+        messages (list): Список объектов EmailMessage
+
+    Returns:
+        int: Количество отправленных писем
+
+    Raises:
+        SendError: Если часть писем отправить не удалось
+        SoftTimeLimitExceeded: Если истекло время задачи Celery
+    """
+    global _last_used
+
+    sent = 0
+    with _lock:
+        for index, message in enumerate(messages):
+            for attempt in range(2):
+                try:
+                    _throttle()
+                    sent += _get_connection().send_messages([message]) or 0
+                    break
+                except RETRYABLE_ERRORS as error:
+                    close_connection()
+                    if attempt:
+                        raise SendError(messages[index:], sent) from error
+                except SoftTimeLimitExceeded:
+                    # время задачи вышло посреди SMTP сессии: соединение закрывается,
+                    # а исключение уходит в Celery, а не превращается в ошибку отправки
+                    close_connection()
+                    raise
+                except Exception as error:
+                    raise SendError(messages[index:], sent) from error
+            _last_used = time.monotonic()
+    return sent
+
+
+worker_process_shutdown.connect(close_connection)
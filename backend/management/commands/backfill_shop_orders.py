@@ -0,0 +1,104 @@
+"""
+Django management команда для заполнения данных разбиения заказов по магазинам.
+
+Нужна один раз после обновления существующей базы до версии с ``OrderItem.shop``
+и ``ShopOrder``:
+
+- у позиций без магазина ``shop_id`` заполняется из ``product_info.shop_id``;
+- для каждого оформленного заказа (кроме корзин) создаются части по магазинам
+  (``ShopOrder.sync_for_order``).
+
+Обе операции идут пачками по ``--batch-size`` в отдельных транзакциях и идемпотентны:
+прерванный запуск можно повторить.
+
+Usage:
+    python manage.py backfill_shop_orders [--batch-size 1000]
+
+Example:
+    python manage.py migrate
+    python manage.py backfill_shop_orders
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from backend.models import Order, OrderItem, ProductInfo, ShopOrder
+
+
+class Command(BaseCommand):
+    """
+    Команда для заполнения OrderItem.shop и частей заказов по магазинам.
+    """
+
+    help = "Заполнение магазина позиций заказов и частей заказов по магазинам для существующих заказов"
+
+    def add_arguments(self, parser):
+        """
+        Определение аргументов командной строки.
+
+        Args:
+            parser: Парсер аргументов
+        """
+        parser.add_argument("--batch-size", type=int, default=1000, help="Количество строк в одной транзакции")
+
+    def handle(self, *args, **options):
+        """
+        Основная логика команды.
+
+        Args:
+            *args: Позиционные аргументы
+            **options: Именованные аргументы из командной строки
+        """
+        batch_size = options["batch_size"]
+        items = self.backfill_items(batch_size)
+        self.stdout.write(f"Позиций с заполненным магазином: {items}")
+        orders = self.backfill_shop_orders(batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Заказов разбито по магазинам: {orders}"))
+
+    @staticmethod
+    def backfill_items(batch_size):
+        """
+        Заполнение OrderItem.shop из ProductInfo пачками.
+
+        Returns:
+            int: Количество обновленных позиций
+        """
+        shop_id = ProductInfo.objects.filter(id=OuterRef("product_info_id")).values("shop_id")[:1]
+        updated = 0
+        last_id = 0
+        while True:
+            ids = list(
+                OrderItem.objects.filter(shop__isnull=True, id__gt=last_id)
+                .order_by("id")
+                .values_list("id", flat=True)[:batch_size]
+            )
+            if not ids:
+                return updated
+            updated += OrderItem.objects.filter(id__in=ids).update(shop_id=Subquery(shop_id))
+            last_id = ids[-1]
+
+    @staticmethod
+    def backfill_shop_orders(batch_size):
+        """
+        Разбиение оформленных заказов на части по магазинам пачками.
+
+        Returns:
+            int: Количество обработанных заказов
+        """
+        processed = 0
+        last_id = 0
+        while True:
+            ids = list(
+                Order.objects.exclude(state="basket")
+                .filter(id__gt=last_id)
+                .order_by("id")
+                .values_list("id", flat=True)[:batch_size]
+            )
+            if not ids:
+                return processed
+            with transaction.atomic():
+                for order_id in ids:
+                    ShopOrder.sync_for_order(order_id)
+            processed += len(ids)
+            last_id = ids[-1]
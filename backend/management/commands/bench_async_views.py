@@ -0,0 +1,100 @@
+"""
+Django management команда для сравнения синхронных и асинхронных views.
+
+Отправляет одинаковое число одновременных запросов к синхронному endpoint
+(например ``/api/v1/products``) и его асинхронной версии (``/api/v1/async/products``)
+запущенного сервера и выводит число запросов в секунду и задержки.
+
+Usage:
+    python manage.py bench_async_views [--url http://localhost:8000/api/v1] [--endpoint products]
+        [--count 500] [--concurrency 50] [--token <токен>]
+
+Example:
+    uvicorn netology_pd_diplom.asgi:application --port 8000 &
+    python manage.py bench_async_views --endpoint products --concurrency 100
+"""
+
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+import requests
+
+
+class Command(BaseCommand):
+    """
+    Команда для замера пропускной способности синхронных и асинхронных views.
+    """
+
+    help = "Сравнение синхронных и асинхронных views под одновременной нагрузкой"
+
+    def add_arguments(self, parser):
+        """
+        Определение аргументов командной строки.
+
+        Args:
+            parser: Парсер аргументов
+        """
+        parser.add_argument("--url", type=str, default="http://localhost:8000/api/v1", help="Адрес API")
+        parser.add_argument(
+            "--endpoint",
+            type=str,
+            default="products",
+            choices=["categories", "shops", "products", "basket", "order"],
+            help="Endpoint для замера",
+        )
+        parser.add_argument("--count", type=int, default=500, help="Количество запросов в каждом замере")
+        parser.add_argument("--concurrency", type=int, default=50, help="Количество одновременных запросов")
+        parser.add_argument("--token", type=str, default=None, help="Токен для basket и order")
+
+    def handle(self, *args, **options):
+        """
+        Основная логика команды.
+
+        Args:
+            *args: Позиционные аргументы
+            **options: Именованные аргументы из командной строки
+        """
+        headers = {"Authorization": f"Token {options['token']}"} if options["token"] else {}
+        base_url = options["url"].rstrip("/")
+
+        for title, url in (
+            ("Синхронный ", f"{base_url}/{options['endpoint']}"),
+            ("Асинхронный", f"{base_url}/async/{options['endpoint']}"),
+        ):
+            elapsed, latencies, errors = self.run(url, headers, options["count"], options["concurrency"])
+            latencies.sort()
+            self.stdout.write(
+                f"{title}: {options['count'] / elapsed:.1f} запросов/с, "
+                f"p50 {statistics.median(latencies) * 1000:.0f} мс, "
+                f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.0f} мс, ошибок: {errors}"
+            )
+
+    def run(self, url, headers, count, concurrency):
+        """
+        Отправка count запросов с concurrency одновременными клиентами.
+
+        Returns:
+            tuple: (общее время, список задержек, число ошибок)
+        """
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        def fetch(_):
+            started = time.perf_counter()
+            try:
+                ok = session.get(url, headers=headers, timeout=30).status_code == 200
+            except requests.RequestException:
+                ok = False
+            return time.perf_counter() - started, ok
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(fetch, range(count)))
+        elapsed = time.perf_counter() - started
+
+        return elapsed, [latency for latency, _ in results], sum(1 for _, ok in results if not ok)
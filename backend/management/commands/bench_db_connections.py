@@ -0,0 +1,78 @@
+"""
+Django management команда для замера затрат на соединение с БД.
+
+Сравнивает запрос с новым соединением (как при CONN_MAX_AGE=0 без пула)
+и запрос в цикле «запрос - конец запроса» с текущими настройками
+(постоянное соединение или пул). Выводит задержки и статистику пула.
+
+Usage:
+    python manage.py bench_db_connections [--count 200]
+
+Example:
+    DB_POOL=True python manage.py bench_db_connections --count 500
+"""
+
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from backend.db import pool_stats
+
+
+class Command(BaseCommand):
+    """
+    Команда для замера задержки получения соединения с БД.
+    """
+
+    help = "Замер затрат на соединение с БД: новое соединение против постоянного/пула"
+
+    def add_arguments(self, parser):
+        """
+        Определение аргументов командной строки.
+
+        Args:
+            parser: Парсер аргументов
+        """
+        parser.add_argument("--count", type=int, default=200, help="Количество запросов в каждом замере")
+
+    def handle(self, *args, **options):
+        """
+        Основная логика команды.
+
+        Args:
+            *args: Позиционные аргументы
+            **options: Именованные аргументы из командной строки
+        """
+        count = options["count"]
+        params = connection.get_connection_params()
+
+        fresh = []
+        for _ in range(count):
+            started = time.perf_counter()
+            raw_connection = connection.Database.connect(**params)
+            raw_connection.cursor().execute("SELECT 1")
+            raw_connection.close()
+            fresh.append(time.perf_counter() - started)
+
+        current = []
+        for _ in range(count):
+            started = time.perf_counter()
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            # то же, что Django делает по сигналу request_finished
+            close_old_connections()
+            current.append(time.perf_counter() - started)
+
+        self.stdout.write(f"Новое соединение:   {self.format(fresh)}")
+        self.stdout.write(f"Текущие настройки:  {self.format(current)}")
+        self.stdout.write(f"Соединения: {pool_stats()}")
+
+    @staticmethod
+    def format(latencies):
+        latencies = sorted(latencies)
+        return (
+            f"среднее {statistics.mean(latencies) * 1000:.2f} мс, "
+            f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.2f} мс"
+        )
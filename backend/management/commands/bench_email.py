@@ -0,0 +1,81 @@
+"""
+Django management команда для замера скорости отправки email.
+
+Сравнивает отправку писем с новым SMTP соединением на каждое письмо
+(как EmailMultiAlternatives.send()) и отправку через соединение процесса
+из backend.mail. Запускается против локального SMTP сервера-заглушки.
+
+Usage:
+    python manage.py bench_email [--host localhost] [--port 1025] [--count 200]
+
+Example:
+    python -m aiosmtpd -n -l localhost:1025 &
+    python manage.py bench_email --count 500
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from backend import mail
+
+
+class Command(BaseCommand):
+    """
+    Команда для замера пропускной способности отправки писем.
+    """
+
+    help = "Замер скорости отправки email: соединение на письмо против пула"
+
+    def add_arguments(self, parser):
+        """
+        Определение аргументов командной строки.
+
+        Args:
+            parser: Парсер аргументов
+        """
+        parser.add_argument("--host", type=str, default="localhost", help="SMTP сервер")
+        parser.add_argument("--port", type=int, default=1025, help="Порт SMTP сервера")
+        parser.add_argument("--tls", action="store_true", help="Использовать STARTTLS")
+        parser.add_argument("--count", type=int, default=200, help="Количество писем в каждом замере")
+
+    def handle(self, *args, **options):
+        """
+        Основная логика команды.
+
+        Args:
+            *args: Позиционные аргументы
+            **options: Именованные аргументы из командной строки
+        """
+        smtp_settings = {
+            "EMAIL_BACKEND": "django.core.mail.backends.smtp.EmailBackend",
+            "EMAIL_HOST": options["host"],
+            "EMAIL_PORT": options["port"],
+            "EMAIL_USE_TLS": options["tls"],
+            "EMAIL_HOST_USER": "bench@example.com",
+            "EMAIL_HOST_PASSWORD": "",
+            "EMAIL_RATE_LIMIT": 0,
+        }
+        count = options["count"]
+
+        with override_settings(**smtp_settings):
+            messages = [
+                mail.build_message(f"Тест {i}", "Текст письма", ["bench@example.com"], "<p>Текст письма</p>")
+                for i in range(count)
+            ]
+
+            started = time.perf_counter()
+            for message in messages:
+                message.send()
+            per_message = time.perf_counter() - started
+
+            mail.close_connection()
+            started = time.perf_counter()
+            mail.send_messages(messages)
+            pooled = time.perf_counter() - started
+            mail.close_connection()
+
+        self.stdout.write(f"Соединение на письмо: {count / per_message:.1f} писем/с ({per_message:.2f} с)")
+        self.stdout.write(f"Пул соединений:       {count / pooled:.1f} писем/с ({pooled:.2f} с)")
+        self.stdout.write(self.style.SUCCESS(f"Ускорение: x{per_message / pooled:.1f}"))
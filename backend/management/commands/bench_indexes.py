@@ -0,0 +1,132 @@
+"""
+Django management команда для замера поиска по индексам каталога.
+
+Замеряет поиск, который выполняется в горячих путях:
+
+- product - ``Product`` по (name, category) при каждом импорте прайса;
+- parameter - ``Parameter`` по name при импорте;
+- basket - ``Order`` по (user, state) в каждом запросе корзины;
+- shop_products - ``ProductInfo`` по (shop, external_id).
+
+Ключи выбираются случайно из ``--count`` строк таблицы. Для каждого поиска
+выводятся среднее время, p95 и строка плана с чтением таблицы. С ``--compare``
+(только PostgreSQL) замер повторяется без индексов: они удаляются в транзакции,
+которая затем откатывается. Удаление индекса блокирует таблицу до конца замера -
+не запускать на production базе.
+
+Usage:
+    python manage.py bench_indexes [--count 1000] [--lookup product] [--compare]
+
+Example:
+    python manage.py generate_synthetic_data --shops 20 --products 100000 --users 10000 --orders 100000
+    python manage.py bench_indexes --compare
+"""
+
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from backend.models import Order, Parameter, Product, ProductInfo
+
+# Имя поиска -> (модель, индекс или ограничение, поля ключа)
+LOOKUPS = {
+    "product": (Product, "unique_product_name_category", ("name", "category_id")),
+    "parameter": (Parameter, "unique_parameter_name", ("name",)),
+    "basket": (Order, "order_user_state_idx", ("user_id", "state")),
+    "shop_products": (ProductInfo, "product_info_shop_external_idx", ("shop_id", "external_id")),
+}
+
+
+def lookup_queryset(model, key):
+    """
+    Запрос поиска, как в ``get()``: без сортировки по умолчанию.
+    """
+    return model.objects.filter(**key).order_by()[:21]
+
+
+class Command(BaseCommand):
+    """
+    Команда для замера поиска по индексам каталога.
+    """
+
+    help = "Замер поиска товаров, параметров, корзин и позиций магазинов по индексам"
+
+    def add_arguments(self, parser):
+        """
+        Определение аргументов командной строки.
+
+        Args:
+            parser: Парсер аргументов
+        """
+        parser.add_argument("--count", type=int, default=1000, help="Количество поисков в каждом замере")
+        parser.add_argument("--lookup", action="append", choices=sorted(LOOKUPS), help="Замерить только этот поиск")
+        parser.add_argument("--compare", action="store_true", help="Повторить замер без индексов (PostgreSQL)")
+        parser.add_argument("--seed", type=int, default=1, help="Начальное значение генератора ключей")
+
+    def handle(self, *args, **options):
+        """
+        Основная логика команды.
+
+        Args:
+            *args: Позиционные аргументы
+            **options: Именованные аргументы из командной строки
+        """
+        if options["compare"] and connection.vendor != "postgresql":
+            raise CommandError("--compare поддерживается только PostgreSQL")
+
+        rnd = random.Random(options["seed"])
+        names = options["lookup"] or sorted(LOOKUPS)
+        keys = {}
+        for name in names:
+            model, _, fields = LOOKUPS[name]
+            rows = list(model.objects.order_by().values(*fields)[: options["count"]])
+            if not rows:
+                self.stdout.write(self.style.WARNING(f"{name}: нет данных, пропущен"))
+                continue
+            keys[name] = [rnd.choice(rows) for _ in range(options["count"])]
+
+        self.stdout.write(self.style.MIGRATE_HEADING("С индексами"))
+        self.measure(keys)
+
+        if options["compare"]:
+            self.stdout.write(self.style.MIGRATE_HEADING("Без индексов"))
+            with transaction.atomic(), connection.schema_editor(atomic=False) as editor:
+                for name in keys:
+                    model, index_name, _ = LOOKUPS[name]
+                    for index in model._meta.indexes:
+                        if index.name == index_name:
+                            editor.remove_index(model, index)
+                    for constraint in model._meta.constraints:
+                        if constraint.name == index_name:
+                            editor.remove_constraint(model, constraint)
+                self.measure(keys)
+                transaction.set_rollback(True)
+
+    def measure(self, keys):
+        """
+        Замер поисков и вывод результатов.
+
+        Args:
+            keys (dict): Имя поиска -> список ключей
+        """
+        for name, values in keys.items():
+            model = LOOKUPS[name][0]
+            lines = lookup_queryset(model, values[0]).explain().splitlines()
+            plan = next((line for line in lines if "Scan" in line or "SCAN" in line or "SEARCH" in line), lines[0])
+            latencies = []
+            for key in values:
+                started = time.perf_counter()
+                list(lookup_queryset(model, key))
+                latencies.append(time.perf_counter() - started)
+            self.stdout.write(f"{name:<14} {self.format(latencies)}, план: {plan.strip()}")
+
+    @staticmethod
+    def format(latencies):
+        latencies = sorted(latencies)
+        return (
+            f"среднее {statistics.mean(latencies) * 1000:.3f} мс, "
+            f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.3f} мс"
+        )
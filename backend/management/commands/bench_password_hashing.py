@@ -0,0 +1,75 @@
+"""
+Django management команда для замера скорости проверки паролей.
+
+Сравнивает последовательную проверку паролей (как django.contrib.auth.authenticate
+в одном потоке) и проверку через backend.hashing при нескольких одновременных клиентах.
+Выводит число проверок в секунду всего и на одно ядро.
+
+Usage:
+    python manage.py bench_password_hashing [--count 200] [--clients 8]
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.management.base import BaseCommand
+
+from backend import hashing
+
+
+class Command(BaseCommand):
+    """
+    Команда для замера пропускной способности проверки паролей.
+    """
+
+    help = "Замер скорости проверки паролей: последовательно против backend.hashing с несколькими клиентами"
+
+    def add_arguments(self, parser):
+        """
+        Определение аргументов командной строки.
+
+        Args:
+            parser: Парсер аргументов
+        """
+        parser.add_argument("--count", type=int, default=200, help="Количество проверок в каждом замере")
+        parser.add_argument(
+            "--clients", type=int, default=os.cpu_count() or 1, help="Количество одновременных клиентов"
+        )
+
+    def handle(self, *args, **options):
+        """
+        Основная логика команды.
+
+        Args:
+            *args: Позиционные аргументы
+            **options: Именованные аргументы из командной строки
+        """
+        count = options["count"]
+        clients = options["clients"]
+        cores = os.cpu_count() or 1
+        encoded = make_password("TestPassword123")
+
+        started = time.perf_counter()
+        for _ in range(count):
+            check_password("TestPassword123", encoded)
+        inline = time.perf_counter() - started
+
+        with ThreadPoolExecutor(max_workers=clients) as client_pool:
+            started = time.perf_counter()
+            results = list(client_pool.map(lambda _: hashing.check_password("TestPassword123", encoded), range(count)))
+            pooled = time.perf_counter() - started
+
+        if not all(results):
+            self.stderr.write(self.style.ERROR("Проверка пароля не прошла"))
+            return
+
+        stats = hashing.stats()
+        self.stdout.write(f"Ядер: {cores}, одновременных хешей: {stats['workers']}, клиентов: {clients}")
+        self.stdout.write(f"Последовательно:  {count / inline:.1f} проверок/с ({count / inline / cores:.1f} на ядро)")
+        self.stdout.write(f"backend.hashing:  {count / pooled:.1f} проверок/с ({count / pooled / cores:.1f} на ядро)")
+        self.stdout.write(
+            f"Среднее ожидание в очереди: {stats['wait_seconds'] / stats['submitted'] * 1000:.1f} мс, "
+            f"отклонено: {stats['rejected']}"
+        )
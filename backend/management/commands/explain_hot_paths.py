@@ -0,0 +1,105 @@
+"""
+Django management команда для проверки планов запросов горячих путей.
+
+Для каждого запроса, зарегистрированного в backend/querysets.py декоратором
+``hot_path``, подбирает аргументы по данным БД, выполняет запрос вместе
+с prefetch запросами и выводит их планы ``EXPLAIN (ANALYZE, BUFFERS)``.
+Последовательное чтение таблицы с оценкой больше ``--min-rows`` строк
+отмечается как возможный пропущенный индекс.
+
+Запускать на наборе данных, близком к production (generate_synthetic_data).
+
+Usage:
+    python manage.py explain_hot_paths [--path basket] [--no-analyze] [--min-rows 1000] [--fail-on-seq-scan]
+
+Example:
+    python manage.py generate_synthetic_data --shops 20 --products 100000
+    python manage.py explain_hot_paths --fail-on-seq-scan
+"""
+
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+from backend.querysets import HOT_PATHS
+from backend.slow_queries import explain_prefix
+
+# PostgreSQL: "Seq Scan on backend_order  (cost=0.00..1.00 rows=100 width=8)"
+PG_SEQ_SCAN = re.compile(r"Seq Scan on (\w+).*?rows=(\d+)")
+# SQLite: "SCAN backend_order" без "USING INDEX"
+SQLITE_SCAN = re.compile(r"\bSCAN (\w+)(?!.*USING (?:COVERING )?INDEX)")
+
+
+def seq_scans(plan, min_rows):
+    """
+    Таблицы, которые читаются целиком.
+
+    Args:
+        plan (str): Текст плана
+        min_rows (int): Минимальная оценка числа строк (только PostgreSQL)
+
+    Returns:
+        list: Имена таблиц
+    """
+    tables = [table for table, rows in PG_SEQ_SCAN.findall(plan) if int(rows) >= min_rows]
+    tables += SQLITE_SCAN.findall(plan)
+    return tables
+
+
+class Command(BaseCommand):
+    """
+    Команда для вывода планов запросов горячих путей.
+    """
+
+    help = "EXPLAIN для зарегистрированных запросов горячих путей"
+
+    def add_arguments(self, parser):
+        """
+        Определение аргументов командной строки.
+
+        Args:
+            parser: Парсер аргументов
+        """
+        parser.add_argument("--path", action="append", choices=sorted(HOT_PATHS), help="Проверить только этот путь")
+        parser.add_argument("--database", default="default", help="Алиас БД")
+        parser.add_argument("--no-analyze", action="store_true", help="Только оценка плана, без выполнения")
+        parser.add_argument("--min-rows", type=int, default=1000, help="Порог строк для Seq Scan (PostgreSQL)")
+        parser.add_argument("--fail-on-seq-scan", action="store_true", help="Ошибка, если найден Seq Scan")
+
+    def handle(self, *args, **options):
+        """
+        Основная логика команды.
+
+        Args:
+            *args: Позиционные аргументы
+            **options: Именованные аргументы из командной строки
+        """
+        connection = connections[options["database"]]
+        prefix = connection.ops.explain_query_prefix() if options["no_analyze"] else explain_prefix(connection)
+        problems = []
+
+        for name in options["path"] or sorted(HOT_PATHS):
+            func, sample = HOT_PATHS[name]
+            kwargs = sample()
+            if kwargs is None:
+                self.stdout.write(self.style.WARNING(f"{name}: нет данных для запроса, пропущен"))
+                continue
+
+            with CaptureQueriesContext(connection) as context:
+                list(func(**kwargs).using(options["database"]))
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{name}({kwargs}): {len(context)} запросов"))
+
+            for number, query in enumerate(context.captured_queries, 1):
+                with connection.cursor() as cursor:
+                    cursor.execute(f"{prefix} {query['sql']}")
+                    plan = "\n".join(" ".join(str(value) for value in row) for row in cursor.fetchall())
+                self.stdout.write(f"-- {number}. {query['time']} с\n{query['sql']}\n{plan}\n")
+                for table in seq_scans(plan, options["min_rows"]):
+                    problems.append(f"{name}: {table}")
+                    self.stdout.write(self.style.WARNING(f"Последовательное чтение {table}"))
+
+        if problems and options["fail_on_seq_scan"]:
+            raise CommandError("Последовательное чтение таблиц: " + ", ".join(problems))
+        self.stdout.write(self.style.SUCCESS("Готово"))
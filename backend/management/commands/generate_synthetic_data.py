@@ -0,0 +1,482 @@
+"""
+Django management команда для генерации синтетического каталога и заказов.
+
+Генерирует воспроизводимый (по ``--seed``) набор данных: магазины, категории,
+товары с предложениями магазинов и параметрами, покупателей, корзины
+и историю заказов. Данные загружаются в БД напрямую: большие таблицы через
+COPY (PostgreSQL), остальные через bulk_create. С ``--yaml-dir`` для каждого
+магазина также пишется прайс в формате импорта (для замеров импорта).
+
+Распределения: цены - логнормальные, популярность параметров и товаров
+в заказах - по закону Ципфа, число позиций в заказе - геометрическое.
+
+Usage:
+    python manage.py generate_synthetic_data [--seed 1] [--shops 20] [--products 100000]
+        [--coverage 0.5] [--users 10000] [--orders 100000] [--yaml-dir DIR] [--no-db]
+
+Example:
+    # около 1 млн предложений и 5 млн значений параметров
+    python manage.py generate_synthetic_data --shops 20 --products 100000 --coverage 0.5
+"""
+
+import random
+import time
+from array import array
+from datetime import timedelta
+from itertools import accumulate
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+import ujson
+
+from backend.models import (
+    Category,
+    Contact,
+    Order,
+    OrderItem,
+    Parameter,
+    Product,
+    ProductInfo,
+    ProductParameter,
+    Shop,
+    ShopOrder,
+)
+
+User = get_user_model()
+
+CATEGORY_NAMES = [
+    "Смартфоны",
+    "Аксессуары",
+    "Flash-накопители",
+    "Телевизоры",
+    "Ноутбуки",
+    "Планшеты",
+    "Наушники",
+    "Умные часы",
+    "Мониторы",
+    "Фотоаппараты",
+]
+BRANDS = ["Apple", "Samsung", "Xiaomi", "Huawei", "Sony", "LG", "Lenovo", "Asus", "Acer", "Philips"]
+COLORS = ["черный", "белый", "серый", "золотистый", "красный", "синий", "зеленый"]
+
+# Значения известных параметров, остальные параметры - числа
+PARAMETER_VALUES = {
+    "Диагональ (дюйм)": lambda rnd: round(rnd.uniform(4.7, 65), 1),
+    "Разрешение (пикс)": lambda rnd: rnd.choice(["1920x1080", "2688x1242", "2436x1125", "3840x2160", "1334x750"]),
+    "Встроенная память (Гб)": lambda rnd: rnd.choice([16, 32, 64, 128, 256, 512]),
+    "Цвет": lambda rnd: rnd.choice(COLORS),
+    "Вес (г)": lambda rnd: rnd.randint(20, 5000),
+    "Гарантия (мес)": lambda rnd: rnd.choice([6, 12, 24, 36]),
+}
+
+# Доли статусов оформленных заказов
+ORDER_STATE_WEIGHTS = {"new": 5, "confirmed": 5, "assembled": 5, "sent": 10, "delivered": 65, "canceled": 10}
+
+
+def next_id(model):
+    return (model.objects.aggregate(max_id=Max("id"))["max_id"] or 0) + 1
+
+
+def zipf_weights(count):
+    return [1 / rank for rank in range(1, count + 1)]
+
+
+def load(model, fields, rows, batch_size):
+    """
+    Загрузка строк в таблицу модели.
+
+    В PostgreSQL строки передаются потоком через COPY, в остальных БД -
+    пакетами INSERT по ``batch_size`` строк.
+
+    Args:
+        model: Модель Django
+        fields (list): Имена полей в порядке значений строки
+        rows: Итератор кортежей значений
+        batch_size (int): Размер пакета INSERT
+
+    Returns:
+        int: Число загруженных строк
+    """
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    model_fields = [model._meta.get_field(name) for name in fields]
+    columns = ", ".join(quote(field.column) for field in model_fields)
+    count = 0
+
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql" and hasattr(cursor.cursor, "copy"):
+            with cursor.cursor.copy(f"COPY {table} ({columns}) FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row(row)
+                    count += 1
+            return count
+
+        sql = f"INSERT INTO {table} ({columns}) VALUES ({', '.join(['%s'] * len(fields))})"
+        batch = []
+        for row in rows:
+            batch.append([field.get_db_prep_value(value, connection) for field, value in zip(model_fields, row)])
+            if len(batch) >= batch_size:
+                cursor.executemany(sql, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, batch)
+            count += len(batch)
+    return count
+
+
+class Command(BaseCommand):
+    """
+    Команда для генерации синтетических данных для нагрузочного тестирования.
+    """
+
+    help = "Генерация воспроизводимого синтетического каталога, покупателей и заказов"
+
+    def add_arguments(self, parser):
+        """
+        Определение аргументов командной строки.
+
+        Args:
+            parser: Парсер аргументов
+        """
+        parser.add_argument("--seed", type=int, default=1, help="Seed генератора")
+        parser.add_argument("--shops", type=int, default=20, help="Количество магазинов")
+        parser.add_argument("--categories", type=int, default=50, help="Количество категорий")
+        parser.add_argument("--parameters", type=int, default=100, help="Количество видов параметров")
+        parser.add_argument("--products", type=int, default=100000, help="Количество товаров")
+        parser.add_argument("--coverage", type=float, default=0.5, help="Доля товаров в ассортименте магазина")
+        parser.add_argument("--users", type=int, default=10000, help="Количество покупателей")
+        parser.add_argument("--orders", type=int, default=100000, help="Количество оформленных заказов")
+        parser.add_argument("--baskets", type=float, default=0.3, help="Доля покупателей с непустой корзиной")
+        parser.add_argument("--yaml-dir", type=str, help="Каталог для прайсов магазинов в формате YAML")
+        parser.add_argument("--no-db", action="store_true", help="Только YAML, без загрузки в БД")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Размер пакета INSERT (не PostgreSQL)")
+
+    def handle(self, *args, **options):
+        """
+        Основная логика команды.
+
+        Args:
+            *args: Позиционные аргументы
+            **options: Именованные аргументы из командной строки
+        """
+        if options["no_db"] and not options["yaml_dir"]:
+            raise CommandError("С --no-db нужно указать --yaml-dir")
+
+        self.options = options
+        self.seed = options["seed"]
+        self.rnd = random.Random(self.seed)
+        self.to_db = not options["no_db"]
+        self.batch_size = options["batch_size"]
+        self.started = time.perf_counter()
+
+        if self.to_db and User.objects.filter(email=self.email("shop", 0)).exists():
+            raise CommandError(f"Данные с seed {self.seed} уже загружены")
+
+        if self.to_db:
+            with transaction.atomic():
+                self.generate()
+            self.reset_sequences()
+        else:
+            self.generate()
+
+        self.stdout.write(self.style.SUCCESS(f"Готово за {time.perf_counter() - self.started:.1f} с"))
+
+    def email(self, kind, number):
+        return f"synthetic-{kind}{number}-s{self.seed}@example.com"
+
+    def report(self, name, count):
+        self.stdout.write(f"{name}: {count} ({time.perf_counter() - self.started:.1f} с)")
+
+    def reset_sequences(self):
+        models = [User, Shop, Category, Parameter, Product, ProductInfo, ProductParameter]
+        models += [Contact, Order, OrderItem, ShopOrder]
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                cursor.execute(sql)
+
+    def generate(self):
+        self.generate_dimensions()
+        self.generate_products()
+        self.generate_offers()
+        self.generate_parameters()
+        if self.to_db:
+            self.generate_orders()
+
+    def generate_dimensions(self):
+        """
+        Магазины с пользователями, категории и виды параметров.
+        """
+        options = self.options
+        rnd = self.rnd
+
+        self.category_ids = []
+        self.category_names = []
+        for number in range(options["categories"]):
+            base = CATEGORY_NAMES[number % len(CATEGORY_NAMES)]
+            self.category_names.append(base if number < len(CATEGORY_NAMES) else f"{base} {number}")
+
+        names = list(PARAMETER_VALUES)
+        names += [f"Характеристика {number}" for number in range(len(names), options["parameters"])]
+        self.parameter_names = names[: options["parameters"]]
+
+        # у категории свои 3-8 параметров, популярные параметры встречаются чаще
+        weights = zipf_weights(len(self.parameter_names))
+        self.category_parameters = []
+        for _ in self.category_names:
+            chosen = set()
+            for _ in range(rnd.randint(3, 8)):
+                chosen.add(rnd.choices(range(len(self.parameter_names)), weights)[0])
+            self.category_parameters.append(sorted(chosen))
+
+        self.shop_names = [f"Синтетический магазин {number} (seed {self.seed})" for number in range(options["shops"])]
+
+        if not self.to_db:
+            self.category_ids = list(range(1, len(self.category_names) + 1))
+            self.parameter_ids = list(range(1, len(self.parameter_names) + 1))
+            self.shop_ids = list(range(1, len(self.shop_names) + 1))
+            return
+
+        password = make_password("Pass12345!")
+        shop_users = User.objects.bulk_create(
+            User(email=self.email("shop", number), password=password, type="shop", is_active=True)
+            for number in range(options["shops"])
+        )
+        shops = Shop.objects.bulk_create(Shop(name=name, user=user) for name, user in zip(self.shop_names, shop_users))
+        self.shop_ids = [shop.id for shop in shops]
+
+        existing = dict(Category.objects.filter(name__in=self.category_names).values_list("name", "id"))
+        Category.objects.bulk_create(Category(name=name) for name in self.category_names if name not in existing)
+        existing = dict(Category.objects.filter(name__in=self.category_names).values_list("name", "id"))
+        self.category_ids = [existing[name] for name in self.category_names]
+        Category.shops.through.objects.bulk_create(
+            Category.shops.through(category_id=category_id, shop_id=shop_id)
+            for category_id in self.category_ids
+            for shop_id in self.shop_ids
+        )
+
+        existing = dict(Parameter.objects.filter(name__in=self.parameter_names).values_list("name", "id"))
+        Parameter.objects.bulk_create(Parameter(name=name) for name in self.parameter_names if name not in existing)
+        existing = dict(Parameter.objects.filter(name__in=self.parameter_names).values_list("name", "id"))
+        self.parameter_ids = [existing[name] for name in self.parameter_names]
+        self.report("Магазины, категории, параметры", len(shops))
+
+    def generate_products(self):
+        """
+        Товары: название, модель и категория.
+        """
+        rnd = self.rnd
+        count = self.options["products"]
+        self.product_first_id = next_id(Product) if self.to_db else 1
+        self.product_category = array("l")
+        self.product_names = []
+        self.product_models = []
+        for number in range(count):
+            category = rnd.randrange(len(self.category_names))
+            brand = rnd.choice(BRANDS)
+            model = f"{brand.lower()}/{rnd.randrange(1000, 10000)}-{number}"
+            color = rnd.choice(COLORS)
+            self.product_category.append(category)
+            self.product_names.append(f"{self.category_names[category]} {brand} {number} ({color})"[:80])
+            self.product_models.append(model)
+
+        if self.to_db:
+            rows = (
+                (self.product_first_id + number, self.product_names[number], self.category_ids[category])
+                for number, category in enumerate(self.product_category)
+            )
+            self.report("Товары", load(Product, ["id", "name", "category"], rows, self.batch_size))
+
+    def generate_offers(self):
+        """
+        Предложения магазинов: каждый магазин продает долю ``--coverage`` товаров.
+        """
+        rnd = self.rnd
+        coverage = self.options["coverage"]
+        first_id = next_id(ProductInfo) if self.to_db else 1
+        self.offer_ids = array("l")
+        self.offer_product = array("l")
+        self.offer_shop = array("l")
+        self.offer_price = array("l")
+        self.offer_external = array("l")
+        self.offer_quantity = array("l")
+        for shop in range(len(self.shop_names)):
+            for product in range(len(self.product_names)):
+                if rnd.random() >= coverage:
+                    continue
+                price = max(50, int(rnd.lognormvariate(9, 1)))
+                self.offer_ids.append(first_id + len(self.offer_ids))
+                self.offer_product.append(product)
+                self.offer_shop.append(shop)
+                self.offer_price.append(price)
+                self.offer_external.append(1000000 + product)
+                # у части предложений товар закончился
+                self.offer_quantity.append(0 if rnd.random() < 0.1 else rnd.randint(1, 100))
+
+        if self.to_db:
+            rows = (
+                (
+                    self.offer_ids[index],
+                    self.product_models[self.offer_product[index]],
+                    self.offer_external[index],
+                    self.product_first_id + self.offer_product[index],
+                    self.shop_ids[self.offer_shop[index]],
+                    self.offer_quantity[index],
+                    self.offer_price[index],
+                    int(self.offer_price[index] * 1.1),
+                )
+                for index in range(len(self.offer_ids))
+            )
+            fields = ["id", "model", "external_id", "product", "shop", "quantity", "price", "price_rrc"]
+            self.report("Предложения магазинов", load(ProductInfo, fields, rows, self.batch_size))
+
+    def offer_parameters(self):
+        """
+        Параметры предложений, с записью прайсов YAML по ходу генерации.
+
+        Yields:
+            tuple: Строка ProductParameter (id, product_info, parameter, value)
+        """
+        rnd = self.rnd
+        yaml_dir = Path(self.options["yaml_dir"]) if self.options["yaml_dir"] else None
+        if yaml_dir:
+            yaml_dir.mkdir(parents=True, exist_ok=True)
+        parameter_id = next_id(ProductParameter) if self.to_db else 1
+        feed = None
+        current_shop = None
+
+        for index in range(len(self.offer_ids)):
+            shop = self.offer_shop[index]
+            if yaml_dir and shop != current_shop:
+                if feed:
+                    feed.close()
+                feed = open(yaml_dir / f"shop_{self.seed}_{shop}.yaml", "w", encoding="utf-8")
+                self.write_feed_header(feed, shop)
+                current_shop = shop
+
+            product = self.offer_product[index]
+            category = self.product_category[product]
+            values = []
+            for parameter in self.category_parameters[category]:
+                name = self.parameter_names[parameter]
+                generate = PARAMETER_VALUES.get(name)
+                value = generate(rnd) if generate else rnd.randint(1, 100)
+                values.append((name, value))
+                yield parameter_id, self.offer_ids[index], self.parameter_ids[parameter], str(value)
+                parameter_id += 1
+
+            if feed:
+                self.write_feed_item(feed, index, values)
+
+        if feed:
+            feed.close()
+
+    def write_feed_header(self, feed, shop):
+        feed.write(f"shop: {ujson.dumps(self.shop_names[shop], ensure_ascii=False)}\ncategories:\n")
+        for category_id, name in zip(self.category_ids, self.category_names):
+            feed.write(f"  - id: {category_id}\n    name: {ujson.dumps(name, ensure_ascii=False)}\n")
+        feed.write("\ngoods:\n")
+
+    def write_feed_item(self, feed, index, values):
+        # строки JSON - корректные строки YAML в двойных кавычках
+        def quote(value):
+            return ujson.dumps(value, ensure_ascii=False, escape_forward_slashes=False)
+
+        product = self.offer_product[index]
+        lines = [
+            f"  - id: {self.offer_external[index]}",
+            f"    category: {self.category_ids[self.product_category[product]]}",
+            f"    model: {quote(self.product_models[product])}",
+            f"    name: {quote(self.product_names[product])}",
+            f"    price: {self.offer_price[index]}",
+            f"    price_rrc: {int(self.offer_price[index] * 1.1)}",
+            f"    quantity: {self.offer_quantity[index]}",
+            "    parameters:",
+        ]
+        lines += [f"      {quote(name)}: {quote(value)}" for name, value in values]
+        feed.write("\n".join(lines) + "\n")
+
+    def generate_parameters(self):
+        rows = self.offer_parameters()
+        if self.to_db:
+            fields = ["id", "product_info", "parameter", "value"]
+            self.report("Значения параметров", load(ProductParameter, fields, rows, self.batch_size))
+        else:
+            count = sum(1 for _ in rows)
+            self.report("Значения параметров (YAML)", count)
+
+    def generate_orders(self):
+        """
+        Покупатели с контактами, корзины и история заказов за год.
+        """
+        rnd = self.rnd
+        options = self.options
+        password = make_password("Pass12345!")
+        buyers = User.objects.bulk_create(
+            User(email=self.email("buyer", number), password=password, type="buyer", is_active=True)
+            for number in range(options["users"])
+        )
+        contacts = Contact.objects.bulk_create(
+            Contact(user=user, city="Москва", street=f"Улица {number % 500}", house=str(number % 100), phone="+7999")
+            for number, user in enumerate(buyers)
+        )
+        self.report("Покупатели", len(buyers))
+        if not buyers or not self.offer_ids:
+            return
+
+        # популярные предложения покупают чаще; выборка по предвычисленным накопленным весам
+        offer_weights = list(zipf_weights(len(self.offer_ids)))
+        rnd.shuffle(offer_weights)
+        cumulative = list(accumulate(offer_weights))
+
+        states = list(ORDER_STATE_WEIGHTS)
+        state_weights = list(ORDER_STATE_WEIGHTS.values())
+        now = timezone.now()
+        order_first_id = next_id(Order)
+        item_id = next_id(OrderItem)
+        orders = []
+        items = []
+        shop_orders = {}
+
+        baskets = [index for index in range(len(buyers)) if rnd.random() < options["baskets"]]
+        plan = [(index, "basket") for index in baskets]
+        plan += [(rnd.randrange(len(buyers)), rnd.choices(states, state_weights)[0]) for _ in range(options["orders"])]
+
+        for number, (buyer, state) in enumerate(plan):
+            order_id = order_first_id + number
+            dt = now - timedelta(seconds=rnd.randrange(365 * 24 * 3600)) if state != "basket" else now
+            contact_id = None if state == "basket" else contacts[buyer].id
+            orders.append((order_id, buyers[buyer].id, dt, state, contact_id))
+
+            # число позиций - геометрическое распределение, в среднем около двух
+            size = 1
+            while size < 10 and rnd.random() < 0.5:
+                size += 1
+            chosen = set(rnd.choices(range(len(self.offer_ids)), cum_weights=cumulative, k=size))
+            for offer in chosen:
+                quantity = rnd.randint(1, 3)
+                shop_id = self.shop_ids[self.offer_shop[offer]]
+                items.append((item_id, order_id, self.offer_ids[offer], shop_id, quantity))
+                item_id += 1
+                if state != "basket":
+                    totals = shop_orders.setdefault((order_id, shop_id), [state, dt, 0, 0])
+                    totals[2] += quantity * self.offer_price[offer]
+                    totals[3] += 1
+
+        self.report("Заказы", load(Order, ["id", "user", "dt", "state", "contact"], iter(orders), self.batch_size))
+        fields = ["id", "order", "product_info", "shop", "quantity"]
+        self.report("Позиции заказов", load(OrderItem, fields, iter(items), self.batch_size))
+        first_id = next_id(ShopOrder)
+        rows = (
+            (first_id + number, order_id, shop_id, state, dt, total_sum, items_count)
+            for number, ((order_id, shop_id), (state, dt, total_sum, items_count)) in enumerate(shop_orders.items())
+        )
+        fields = ["id", "order", "shop", "state", "dt", "total_sum", "items_count"]
+        self.report("Заказы магазинов", load(ShopOrder, fields, rows, self.batch_size))
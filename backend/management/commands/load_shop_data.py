@@ -17,7 +17,8 @@ from django.core.management.base import BaseCommand
 from yaml import Loader
 from yaml import load as load_yaml
 
-from backend.models import Category, Parameter, Product, ProductInfo, ProductParameter, Shop
+from backend import dimensions
+from backend.models import Category, Product, ProductInfo, ProductParameter, Shop
 
 User = get_user_model()
 
@@ -103,9 +104,10 @@ class Command(BaseCommand):
 
             # Загружаем параметры товара
             for name, value in item["parameters"].items():
-                parameter_object, _ = Parameter.objects.get_or_create(name=name)
                 ProductParameter.objects.create(
-                    product_info_id=product_info.id, parameter_id=parameter_object.id, value=value
+                    product_info_id=product_info.id,
+                    parameter_id=dimensions.parameters.get_or_create_id(name),
+                    value=value,
                 )
 
         self.stdout.write(self.style.SUCCESS(f'Загружено {len(data["goods"])} товаров'))
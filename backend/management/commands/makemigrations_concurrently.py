@@ -0,0 +1,301 @@
+"""
+Django management команда для создания миграций с индексами без блокировки записи.
+
+Обычная миграция создает индекс через ``CREATE INDEX``, который на время построения
+блокирует запись в таблицу. Команда работает как ``makemigrations backend``,
+но индексы и уникальные ограничения на уже существующих таблицах выносит
+в отдельную следующую миграцию с ``atomic = False``:
+
+- индекс - ``AddIndexConcurrently`` (``CREATE INDEX CONCURRENTLY``);
+- уникальное ограничение - ``CREATE UNIQUE INDEX CONCURRENTLY`` и
+  ``ADD CONSTRAINT ... USING INDEX`` (короткая блокировка, без повторной
+  проверки таблицы).
+
+Новые таблицы, поля и индексы создаваемых таблиц остаются в первой миграции,
+поэтому обычный ``migrate`` сначала создает таблицы, а затем строит индексы.
+Перед уникальным ограничением команда проверяет, что в таблице нет дубликатов:
+иначе ``CREATE UNIQUE INDEX CONCURRENTLY`` упадет посреди выката и оставит
+невалидный индекс. Только PostgreSQL.
+
+Usage:
+    python manage.py makemigrations_concurrently [--name NAME] [--dry-run]
+
+Example:
+    python manage.py makemigrations_concurrently
+    python manage.py migrate
+"""
+
+import ast
+import os
+
+from django.apps import apps
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, migrations
+from django.db.migrations.autodetector import MigrationAutodetector
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.questioner import NonInteractiveMigrationQuestioner
+from django.db.migrations.state import ProjectState
+from django.db.migrations.writer import MigrationWriter
+from django.db.models import Count, UniqueConstraint
+
+APP_LABEL = "backend"
+
+# Сколько примеров дубликатов выводить в ошибке
+DUPLICATES_SHOWN = 5
+
+
+def concurrent_operation(operation):
+    """
+    Операция, строящая индекс или ограничение без блокировки записи.
+
+    Args:
+        operation: Операция миграции
+
+    Returns:
+        Operation: Замена операции или None, если ее нельзя выполнить конкурентно
+    """
+    if isinstance(operation, migrations.AddIndex):
+        return AddIndexConcurrently(operation.model_name, operation.index)
+    constraint = getattr(operation, "constraint", None)
+    if not (
+        isinstance(operation, migrations.AddConstraint)
+        and isinstance(constraint, UniqueConstraint)
+        and constraint.fields
+        and not (constraint.condition or constraint.include or constraint.opclasses or constraint.deferrable)
+    ):
+        return None
+
+    model = apps.get_model(APP_LABEL, operation.model_name)
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    name = quote(constraint.name)
+    columns = ", ".join(quote(model._meta.get_field(field).column) for field in constraint.fields)
+    return migrations.SeparateDatabaseAndState(
+        state_operations=[operation],
+        database_operations=[
+            migrations.RunSQL(
+                sql=[
+                    f"CREATE UNIQUE INDEX CONCURRENTLY {name} ON {table} ({columns})",
+                    f"ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE USING INDEX {name}",
+                ],
+                reverse_sql=[f"ALTER TABLE {table} DROP CONSTRAINT {name}"],
+            )
+        ],
+    )
+
+
+def split_operations(operations):
+    """
+    Разделение операций на обычные и конкурентные.
+
+    Индексы и ограничения таблиц, которые создаются в этих же операциях,
+    остаются обычными: пустую таблицу индекс не блокирует.
+
+    Args:
+        operations (list): Операции миграций
+
+    Returns:
+        tuple: (обычные операции, конкурентные операции)
+    """
+    created = {operation.name_lower for operation in operations if isinstance(operation, migrations.CreateModel)}
+    regular, concurrent = [], []
+    for operation in operations:
+        replacement = None
+        if getattr(operation, "model_name_lower", None) not in created:
+            replacement = concurrent_operation(operation)
+        if replacement is None:
+            regular.append(operation)
+        else:
+            concurrent.append(replacement)
+    return regular, concurrent
+
+
+def find_duplicates(operation):
+    """
+    Значения, нарушающие уникальное ограничение конкурентной операции.
+
+    Поля, которых еще нет в таблице (добавляются этими же миграциями),
+    не проверяются: их значения пока пустые.
+
+    Args:
+        operation: Операция из split_operations
+
+    Returns:
+        tuple: (ограничение, список словарей со значениями полей и числом строк)
+            или (None, []), если операция не уникальное ограничение
+    """
+    if not isinstance(operation, migrations.SeparateDatabaseAndState):
+        return None, []
+    constraint = operation.state_operations[0].constraint
+    model = apps.get_model(APP_LABEL, operation.state_operations[0].model_name)
+    with connection.cursor() as cursor:
+        columns = {
+            column.name for column in connection.introspection.get_table_description(cursor, model._meta.db_table)
+        }
+    if any(model._meta.get_field(field).column not in columns for field in constraint.fields):
+        return constraint, []
+    duplicates = (
+        model._default_manager.values(*constraint.fields)
+        .annotate(rows=Count("pk"))
+        .filter(rows__gt=1)
+        .order_by("-rows")
+    )
+    return constraint, list(duplicates[:DUPLICATES_SHOWN])
+
+
+class NonAtomicMigrationWriter(MigrationWriter):
+    """
+    MigrationWriter, который сохраняет ``Migration.atomic``.
+
+    Стандартный MigrationWriter этот атрибут не сериализует, поэтому он
+    дописывается в тело класса, а результат проверяется разбором исходника.
+    """
+
+    def as_string(self):
+        source = super().as_string()
+        if self.migration.atomic:
+            return source
+        tree = ast.parse(source)
+        node = next(node for node in tree.body if isinstance(node, ast.ClassDef) and node.name == "Migration")
+        lines = source.splitlines(keepends=True)
+        lines.insert(node.body[0].lineno - 1, "    atomic = False\n\n")
+        source = "".join(lines)
+        if not self.is_non_atomic(source):
+            raise CommandError(f"Не удалось записать atomic = False в миграцию {self.migration.name}")
+        return source
+
+    @staticmethod
+    def is_non_atomic(source):
+        """
+        Есть ли в классе Migration исходника ``atomic = False``.
+        """
+        for node in ast.parse(source).body:
+            if isinstance(node, ast.ClassDef) and node.name == "Migration":
+                return any(
+                    isinstance(item, ast.Assign)
+                    and [target.id for target in item.targets if isinstance(target, ast.Name)] == ["atomic"]
+                    and isinstance(item.value, ast.Constant)
+                    and item.value.value is False
+                    for item in node.body
+                )
+        return False
+
+
+class Command(BaseCommand):
+    """
+    Команда для создания миграций с конкурентным построением индексов.
+    """
+
+    help = "makemigrations backend с построением индексов существующих таблиц без блокировки записи (PostgreSQL)"
+
+    def add_arguments(self, parser):
+        """
+        Определение аргументов командной строки.
+
+        Args:
+            parser: Парсер аргументов
+        """
+        parser.add_argument("--name", help="Имя миграции")
+        parser.add_argument("--dry-run", action="store_true", help="Только вывести миграции")
+
+    def handle(self, *args, **options):
+        """
+        Основная логика команды.
+
+        Args:
+            *args: Позиционные аргументы
+            **options: Именованные аргументы из командной строки
+        """
+        loader = MigrationLoader(None, ignore_no_migrations=True)
+        autodetector = MigrationAutodetector(
+            loader.project_state(),
+            ProjectState.from_apps(apps),
+            NonInteractiveMigrationQuestioner(specified_apps={APP_LABEL}, dry_run=options["dry_run"]),
+        )
+        changes = autodetector.changes(
+            graph=loader.graph,
+            trim_to_apps={APP_LABEL},
+            convert_apps={APP_LABEL},
+            migration_name=options["name"],
+        ).get(APP_LABEL)
+        if not changes:
+            self.stdout.write("Изменений нет")
+            return
+
+        operations = [operation for migration in changes for operation in migration.operations]
+        _, concurrent = split_operations(operations)
+        for migration in changes:
+            migration.operations = split_operations(migration.operations)[0]
+        changes = [migration for migration in changes if migration.operations]
+        if concurrent:
+            self.check_duplicates(concurrent)
+            changes.append(self.concurrent_migration(changes, loader, concurrent, options["name"]))
+
+        for migration in changes:
+            self.write(migration, options["dry_run"])
+
+    @staticmethod
+    def concurrent_migration(changes, loader, operations, name):
+        """
+        Миграция с конкурентными операциями после остальных изменений.
+
+        Returns:
+            Migration: Неатомарная миграция
+        """
+        if changes:
+            previous = changes[-1].name
+        else:
+            leaves = loader.graph.leaf_nodes(APP_LABEL)
+            previous = leaves[0][1] if leaves else None
+        number = int(previous.split("_")[0]) + 1 if previous else 1
+        migration = migrations.Migration(f"{number:04d}_{name + '_' if name else ''}concurrent_indexes", APP_LABEL)
+        migration.dependencies = [(APP_LABEL, previous)] if previous else []
+        migration.operations = operations
+        migration.atomic = False
+        return migration
+
+    @staticmethod
+    def check_duplicates(operations):
+        """
+        Проверка, что уникальные ограничения можно построить на текущих данных.
+
+        Raises:
+            CommandError: Если в таблице есть дубликаты
+        """
+        errors = []
+        for operation in operations:
+            constraint, duplicates = find_duplicates(operation)
+            if duplicates:
+                examples = "; ".join(
+                    ", ".join(f"{field}={row[field]!r}" for field in constraint.fields) + f" ({row['rows']} строк)"
+                    for row in duplicates
+                )
+                errors.append(f"{constraint.name}: {examples}")
+        if errors:
+            raise CommandError(
+                "В таблицах есть дубликаты, уникальные ограничения не построятся. "
+                "Удалите или объедините строки и повторите команду:\n" + "\n".join(errors)
+            )
+
+    def write(self, migration, dry_run):
+        """
+        Запись файла миграции (или вывод с --dry-run).
+        """
+        writer = NonAtomicMigrationWriter(migration)
+        source = writer.as_string()
+        self.stdout.write(self.style.MIGRATE_HEADING(writer.filename))
+        for operation in migration.operations:
+            if isinstance(operation, migrations.SeparateDatabaseAndState):
+                operation = operation.state_operations[0]
+            self.stdout.write(f"  - {operation.describe()}")
+        if dry_run:
+            self.stdout.write(source)
+            return
+        directory = os.path.dirname(writer.path)
+        os.makedirs(directory, exist_ok=True)
+        init_path = os.path.join(directory, "__init__.py")
+        if not os.path.isfile(init_path):
+            open(init_path, "w").close()
+        with open(writer.path, "w", encoding="utf-8") as fh:
+            fh.write(source)
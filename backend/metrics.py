@@ -0,0 +1,335 @@
+"""
+Метрики Prometheus для API, импорта, писем и задач Celery.
+
+Метрики регистрируются в реестре prometheus_client процесса. Если задана
+переменная окружения ``PROMETHEUS_MULTIPROC_DIR``, значения пишутся в файлы
+этого каталога и суммируются по всем процессам (worker'ы gunicorn, процессы Celery):
+
+- web отдает метрики на ``/metrics`` (view ``metrics_view``);
+- Celery worker отдает метрики своих процессов на порту ``CELERY_METRICS_PORT``.
+
+Каталог должен быть отдельным для web и для Celery и очищаться при запуске.
+Глубина очередей брокера, число неотправленных сообщений outbox, состояние
+пула соединений с БД и очереди хеширования паролей считываются в момент запроса
+метрик; пул соединений и хеширование - у процесса, который отдает метрики (метка ``pid``).
+"""
+
+import hmac
+import ipaddress
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.http import HttpResponse
+
+import redis
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from celery.signals import task_postrun, task_prerun, worker_init, worker_process_shutdown, worker_ready
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from backend import hashing
+from backend.db import pool_stats
+from backend.models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+REQUESTS = Counter("http_requests_total", "Запросы к API", ["method", "view", "status"])
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Время обработки запроса",
+    ["method", "view"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+IMPORT_PRODUCTS = Counter("import_products_total", "Импортировано товаров из YAML")
+IMPORT_FAILURES = Counter("import_failures_total", "Ошибки импорта товаров")
+IMPORT_DURATION = Histogram(
+    "import_duration_seconds", "Время импорта прайса", buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800)
+)
+
+EMAILS_SENT = Counter("email_sent_total", "Отправлено писем", ["kind"])
+EMAIL_FAILURES = Counter("email_failures_total", "Ошибки отправки писем", ["kind", "retrying"])
+INVOICE_RENDER = Histogram(
+    "invoice_render_seconds", "Время формирования накладной", buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+)
+
+TASKS = Counter("celery_tasks_total", "Выполнено задач Celery", ["task", "state"])
+TASK_DURATION = Histogram(
+    "celery_task_duration_seconds",
+    "Время выполнения задачи Celery",
+    ["task"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 1800),
+)
+
+_task_started = {}
+
+
+def _multiprocess():
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+class QueueDepthCollector:
+    """
+    Глубина очередей Celery в Redis и число неотправленных сообщений outbox.
+    """
+
+    def describe(self):
+        # без describe реестр вызывает collect при регистрации, то есть при импорте модуля
+        yield GaugeMetricFamily("celery_queue_length", "Задач в очереди брокера", labels=["queue"])
+        yield GaugeMetricFamily("outbox_pending", "Сообщений outbox, не переданных в брокер")
+
+    def collect(self):
+        queues = GaugeMetricFamily("celery_queue_length", "Задач в очереди брокера", labels=["queue"])
+        try:
+            client = redis.Redis.from_url(settings.CELERY_BROKER_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+            for queue in settings.CELERY_TASK_QUEUES:
+                queues.add_metric([queue.name], client.llen(queue.name))
+        except redis.RedisError as error:
+            logger.warning("Не удалось получить длину очередей: %s", error)
+        yield queues
+
+        pending = GaugeMetricFamily("outbox_pending", "Сообщений outbox, не переданных в брокер")
+        try:
+            pending.add_metric([], OutboxMessage.objects.filter(sent_at__isnull=True).count())
+        except DatabaseError as error:
+            logger.warning("Не удалось получить размер outbox: %s", error)
+        yield pending
+
+
+class ConnectionPoolCollector:
+    """
+    Состояние пула соединений psycopg 3 (DB_POOL=True) текущего процесса.
+
+    Без пула метрики пула не отдаются, только ``db_connected``.
+    """
+
+    # ключ pool_stats() -> (метрика, описание)
+    GAUGES = {
+        "pool_size": ("db_pool_size", "Соединений в пуле"),
+        "pool_available": ("db_pool_available", "Свободных соединений в пуле"),
+        "requests_waiting": ("db_pool_requests_waiting", "Запросов, ожидающих соединение"),
+    }
+    COUNTERS = {
+        "requests_num": ("db_pool_requests", "Запросов соединения из пула"),
+        "requests_wait_ms": ("db_pool_requests_wait_ms", "Суммарное ожидание соединения, мс"),
+        "requests_errors": ("db_pool_requests_errors", "Ошибки получения соединения из пула"),
+    }
+    LABELS = ["alias", "pid"]
+
+    def describe(self):
+        yield GaugeMetricFamily("db_connected", "Открыто постоянное соединение с БД", labels=self.LABELS)
+        for name, documentation in self.GAUGES.values():
+            yield GaugeMetricFamily(name, documentation, labels=self.LABELS)
+        for name, documentation in self.COUNTERS.values():
+            yield CounterMetricFamily(name, documentation, labels=self.LABELS)
+
+    def collect(self):
+        connected = GaugeMetricFamily("db_connected", "Открыто постоянное соединение с БД", labels=self.LABELS)
+        gauges = {key: GaugeMetricFamily(*metric, labels=self.LABELS) for key, metric in self.GAUGES.items()}
+        counters = {key: CounterMetricFamily(*metric, labels=self.LABELS) for key, metric in self.COUNTERS.items()}
+        pid = str(os.getpid())
+        for alias in settings.DATABASES:
+            try:
+                stats = pool_stats(alias)
+            except Exception as error:
+                logger.warning("Не удалось получить состояние пула %s: %s", alias, error)
+                continue
+            if not stats["pool"]:
+                connected.add_metric([alias, pid], int(stats["connected"]))
+                continue
+            for key, metric in gauges.items():
+                metric.add_metric([alias, pid], stats.get(key, 0))
+            for key, metric in counters.items():
+                metric.add_metric([alias, pid], stats.get(key, 0))
+        yield connected
+        yield from gauges.values()
+        yield from counters.values()
+
+
+class PasswordHashingCollector:
+    """
+    Очередь хеширования паролей текущего процесса (backend/hashing.py).
+    """
+
+    # ключ hashing.stats() -> (метрика, описание)
+    GAUGES = {
+        "workers": ("password_hash_workers", "Допустимо одновременных хешей"),
+        "queued": ("password_hash_queued", "Запросов в очереди хеширования"),
+        "running": ("password_hash_running", "Вычисляемых хешей"),
+    }
+    COUNTERS = {
+        "submitted": ("password_hash_submitted", "Принято запросов хеширования"),
+        "rejected": ("password_hash_rejected", "Отклонено запросов хеширования (503)"),
+        "wait_seconds": ("password_hash_wait_seconds", "Суммарное ожидание в очереди хеширования"),
+        "hash_seconds": ("password_hash_seconds", "Суммарное время хеширования"),
+    }
+
+    def describe(self):
+        for name, documentation in self.GAUGES.values():
+            yield GaugeMetricFamily(name, documentation, labels=["pid"])
+        for name, documentation in self.COUNTERS.values():
+            yield CounterMetricFamily(name, documentation, labels=["pid"])
+
+    def collect(self):
+        stats = hashing.stats()
+        pid = str(os.getpid())
+        for key, (name, documentation) in self.GAUGES.items():
+            metric = GaugeMetricFamily(name, documentation, labels=["pid"])
+            metric.add_metric([pid], stats[key])
+            yield metric
+        for key, (name, documentation) in self.COUNTERS.items():
+            metric = CounterMetricFamily(name, documentation, labels=["pid"])
+            metric.add_metric([pid], stats[key])
+            yield metric
+
+
+def get_registry():
+    """
+    Реестр метрик: в multiprocess режиме - сумма по файлам всех процессов.
+    """
+    if not _multiprocess():
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+if not _multiprocess():
+    REGISTRY.register(QueueDepthCollector())
+    REGISTRY.register(ConnectionPoolCollector())
+    REGISTRY.register(PasswordHashingCollector())
+
+
+def metrics_allowed(request):
+    """
+    Доступ к метрикам: по токену ``METRICS_TOKEN`` или с адресов ``METRICS_ALLOWED_NETWORKS``.
+
+    Returns:
+        bool: Разрешен ли запрос
+    """
+    if settings.METRICS_TOKEN and hmac.compare_digest(
+        request.headers.get("Authorization", ""), f"Bearer {settings.METRICS_TOKEN}"
+    ):
+        return True
+    try:
+        address = ipaddress.ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network) for network in settings.METRICS_ALLOWED_NETWORKS)
+
+
+def metrics_view(request):
+    """
+    Метрики в текстовом формате Prometheus.
+
+    Доступны с заголовком ``Authorization: Bearer <METRICS_TOKEN>`` или с адресов
+    из ``METRICS_ALLOWED_NETWORKS`` (по умолчанию только localhost).
+    """
+    if not metrics_allowed(request):
+        return HttpResponse(status=403)
+    registry = get_registry()
+    output = generate_latest(registry)
+    if _multiprocess():
+        # глубину очередей, пул соединений и хеширование считает только процесс, который отдает метрики
+        output += generate_latest(_live_registry())
+    return HttpResponse(output, content_type=CONTENT_TYPE_LATEST)
+
+
+def _live_registry():
+    registry = CollectorRegistry()
+    registry.register(QueueDepthCollector())
+    registry.register(ConnectionPoolCollector())
+    registry.register(PasswordHashingCollector())
+    return registry
+
+
+class MetricsMiddleware:
+    """
+    Число и время обработки запросов по view, методу и статусу.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.observe(request, response, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.observe(request, response, time.perf_counter() - started)
+        return response
+
+    @staticmethod
+    def observe(request, response, duration):
+        # имя view, а не путь: число рядов метрики не растет с числом URL
+        match = request.resolver_match
+        view = match.view_name if match else "unmatched"
+        REQUESTS.labels(request.method, view, response.status_code).inc()
+        REQUEST_LATENCY.labels(request.method, view).observe(duration)
+
+
+@task_prerun.connect
+def task_started(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def task_finished(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    TASKS.labels(task.name, state or "UNKNOWN").inc()
+    if started is not None:
+        TASK_DURATION.labels(task.name).observe(time.perf_counter() - started)
+
+
+@worker_init.connect
+def clear_worker_metrics(**kwargs):
+    """
+    Очищаем каталог метрик от файлов прошлого запуска worker'а.
+    """
+    metrics_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if metrics_dir:
+        os.makedirs(metrics_dir, exist_ok=True)
+        for name in os.listdir(metrics_dir):
+            os.remove(os.path.join(metrics_dir, name))
+
+
+@worker_ready.connect
+def start_worker_metrics_server(**kwargs):
+    """
+    HTTP сервер метрик в главном процессе Celery worker.
+    """
+    if settings.CELERY_METRICS_PORT:
+        start_http_server(settings.CELERY_METRICS_PORT, registry=get_registry())
+
+
+@worker_process_shutdown.connect
+def mark_worker_process_dead(pid=None, **kwargs):
+    if _multiprocess():
+        multiprocess.mark_process_dead(pid or os.getpid())
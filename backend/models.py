@@ -1,11 +1,14 @@
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.validators import UnicodeUsernameValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, Q, Sum
 from django.utils.translation import gettext_lazy as _
 
 from django_rest_passwordreset.tokens import get_token_generator
 
+from backend import hashing
+
 # Выборы для статусов заказа
 STATE_CHOICES = (
     ("basket", "Статус корзины"),
@@ -17,6 +20,35 @@ STATE_CHOICES = (
     ("canceled", "Отменен"),
 )
 
+# Статусы оформленного заказа (все, кроме корзины)
+ORDER_STATES = [state for state, _ in STATE_CHOICES if state != "basket"]
+
+# Статусы, которые магазин может выставить своей части заказа
+SHOP_ORDER_STATES = ("confirmed", "assembled", "sent", "delivered", "canceled")
+
+# Конечные статусы: после них статус заказа не меняется
+FINAL_ORDER_STATES = ("delivered", "canceled")
+
+
+def is_allowed_transition(current, new):
+    """
+    Допустимость смены статуса оформленного заказа.
+
+    Статус меняется только вперед по порядку ORDER_STATES; отменить можно
+    любой незавершенный заказ.
+
+    Args:
+        current (str): Текущий статус
+        new (str): Новый статус
+
+    Returns:
+        bool: Разрешен ли переход
+    """
+    if current in FINAL_ORDER_STATES or current not in ORDER_STATES or new not in ORDER_STATES:
+        return False
+    return new == "canceled" or ORDER_STATES.index(new) > ORDER_STATES.index(current)
+
+
 # Типы пользователей в системе
 USER_TYPE_CHOICES = (
     ("shop", "Магазин"),
@@ -147,6 +179,35 @@ class User(AbstractUser):
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
+    def set_password(self, raw_password):
+        """
+        Установка пароля с вычислением хеша в пуле потоков (backend/hashing.py).
+
+        Args:
+            raw_password (str): Пароль
+        """
+        self.password = hashing.hash_password(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        """
+        Проверка пароля в пуле потоков; хеш устаревшего хешера обновляется.
+
+        Args:
+            raw_password (str): Пароль
+
+        Returns:
+            bool: Пароль верный
+        """
+
+        def setter(raw_password):
+            self.set_password(raw_password)
+            # перехеширование не считается сменой пароля
+            self._password = None
+            self.save(update_fields=["password"])
+
+        return hashing.check_password(raw_password, self.password, setter)
+
     class Meta:
         verbose_name = "Пользователь"
         verbose_name_plural = "Список пользователей"
@@ -218,6 +279,10 @@ class Product(models.Model):
         verbose_name = "Продукт"
         verbose_name_plural = "Список продуктов"
         ordering = ("-name",)
+        constraints = [
+            # поиск товара при импорте: get_or_create(name=..., category_id=...)
+            models.UniqueConstraint(fields=["name", "category"], name="unique_product_name_category"),
+        ]
 
     def __str__(self):
         return self.name
@@ -252,6 +317,9 @@ class ProductInfo(models.Model):
         constraints = [
             models.UniqueConstraint(fields=["product", "shop", "external_id"], name="unique_product_info"),
         ]
+        indexes = [
+            models.Index(fields=["shop", "external_id"], name="product_info_shop_external_idx"),
+        ]
 
     def __str__(self):
         return f"{self.product.name} - {self.shop.name} ({self.price} руб.)"
@@ -271,6 +339,9 @@ class Parameter(models.Model):
         verbose_name = "Имя параметра"
         verbose_name_plural = "Список имен параметров"
         ordering = ("-name",)
+        constraints = [
+            models.UniqueConstraint(fields=["name"], name="unique_parameter_name"),
+        ]
 
     def __str__(self):
         return self.name
@@ -355,10 +426,21 @@ class Order(models.Model):
         verbose_name = "Заказ"
         verbose_name_plural = "Список заказ"
         ordering = ("-dt",)
+        indexes = [
+            # корзина и заказы пользователя: filter(user_id=..., state=...)
+            models.Index(fields=["user", "state"], name="order_user_state_idx"),
+        ]
 
     def __str__(self):
         return str(self.dt)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # статус на момент загрузки: post_save переносит в части заказа только изменение статуса
+        instance._loaded_state = instance.state
+        return instance
+
 
 class OrderItem(models.Model):
     """
@@ -380,6 +462,16 @@ class OrderItem(models.Model):
         blank=True,
         on_delete=models.CASCADE,
     )
+    # Денормализованная ссылка на магазин: заполняется при добавлении в корзину,
+    # чтобы выборки по магазину не требовали соединения с ProductInfo
+    shop = models.ForeignKey(
+        Shop,
+        verbose_name="Магазин",
+        related_name="ordered_items",
+        blank=True,
+        null=True,
+        on_delete=models.CASCADE,
+    )
     quantity = models.PositiveIntegerField(verbose_name="Количество")
 
     class Meta:
@@ -388,10 +480,193 @@ class OrderItem(models.Model):
         constraints = [
             models.UniqueConstraint(fields=["order_id", "product_info"], name="unique_order_item"),
         ]
+        indexes = [
+            models.Index(fields=["shop", "order"], name="order_item_shop_order_idx"),
+        ]
 
     def __str__(self):
         return f"{self.product_info} - {self.quantity} шт."
 
+    def save(self, *args, **kwargs):
+        """
+        Переопределение метода save для заполнения магазина позиции.
+
+        Магазин берется из ProductInfo; при создании через сериализатор
+        объект ProductInfo уже загружен, поэтому лишнего запроса нет.
+        """
+        if self.shop_id is None and self.product_info_id is not None:
+            self.shop_id = self.product_info.shop_id
+        return super().save(*args, **kwargs)
+
+
+class ShopOrder(models.Model):
+    """
+    Часть заказа, относящаяся к одному магазину.
+
+    Создается при оформлении заказа для каждого магазина, товары которого
+    есть в заказе. Имеет собственный статус и итоги, поэтому магазин
+    обрабатывает свою часть заказа, не затрагивая строки других магазинов.
+    Список заказов магазина строится по одному индексу (shop, state, dt).
+    """
+
+    objects = models.manager.Manager()
+    order = models.ForeignKey(
+        Order, verbose_name="Заказ", related_name="shop_orders", blank=True, on_delete=models.CASCADE
+    )
+    shop = models.ForeignKey(
+        Shop, verbose_name="Магазин", related_name="shop_orders", blank=True, on_delete=models.CASCADE
+    )
+    state = models.CharField(verbose_name="Статус", choices=STATE_CHOICES, max_length=15)
+    dt = models.DateTimeField(verbose_name="Дата заказа")
+    total_sum = models.PositiveIntegerField(verbose_name="Сумма", default=0)
+    items_count = models.PositiveIntegerField(verbose_name="Позиций", default=0)
+
+    class Meta:
+        verbose_name = "Заказ магазина"
+        verbose_name_plural = "Список заказов магазинов"
+        ordering = ("-dt",)
+        constraints = [
+            models.UniqueConstraint(fields=["order", "shop"], name="unique_shop_order"),
+        ]
+        indexes = [
+            models.Index(fields=["shop", "state", "dt"], name="shop_order_shop_state_dt_idx"),
+        ]
+
+    def __str__(self):
+        return f"Заказ №{self.order_id} ({self.shop_id})"
+
+    @classmethod
+    def sync_for_order(cls, order_id):
+        """
+        Разбиение заказа на части по магазинам.
+
+        Группирует позиции заказа по денормализованному полю OrderItem.shop,
+        создает части заказа со статусом и датой заказа и пересчитывает
+        итоги существующих частей (их статус не меняется). Части магазинов,
+        позиций которых в заказе больше нет, удаляются.
+
+        Args:
+            order_id (int): ID заказа
+
+        Returns:
+            list: Список ID магазинов, участвующих в заказе
+        """
+        order = Order.objects.only("state", "dt").get(id=order_id)
+        totals = (
+            OrderItem.objects.filter(order_id=order_id)
+            .values("shop_id")
+            .annotate(total_sum=Sum(F("quantity") * F("product_info__price")), items_count=Count("id"))
+        )
+        shop_orders = [
+            cls(
+                order_id=order_id,
+                shop_id=row["shop_id"],
+                state=order.state,
+                dt=order.dt,
+                total_sum=row["total_sum"] or 0,
+                items_count=row["items_count"],
+            )
+            for row in totals
+        ]
+        cls.objects.bulk_create(
+            shop_orders,
+            update_conflicts=True,
+            unique_fields=["order", "shop"],
+            update_fields=["dt", "total_sum", "items_count"],
+        )
+        shop_ids = [shop_order.shop_id for shop_order in shop_orders]
+        cls.objects.filter(order_id=order_id).exclude(shop_id__in=shop_ids).delete()
+        return shop_ids
+
+    @classmethod
+    def advance(cls, order_ids, state):
+        """
+        Перевод частей заказов в статус заказа.
+
+        Меняются только части, отстающие от статуса: часть, которую магазин
+        уже продвинул дальше, сохраняет свой статус. Отмена не трогает
+        доставленные части.
+
+        Args:
+            order_ids (list): ID заказов
+            state (str): Новый статус заказов
+
+        Returns:
+            int: Количество измененных частей
+        """
+        if state == "canceled":
+            behind = [current for current in ORDER_STATES if current not in FINAL_ORDER_STATES]
+        elif state in ORDER_STATES:
+            behind = ORDER_STATES[: ORDER_STATES.index(state)]
+        else:
+            return 0
+        return cls.objects.filter(order_id__in=order_ids, state__in=behind).update(state=state)
+
+    @classmethod
+    def rollup(cls, order_id):
+        """
+        Статус заказа по статусам его частей.
+
+        Заказ находится в статусе наименее продвинутой неотмененной части;
+        если отменены все части, заказ отменен. Строка заказа блокируется,
+        чтобы параллельные изменения частей не записали устаревший итог.
+
+        Args:
+            order_id (int): ID заказа
+
+        Returns:
+            str: Статус заказа или None, если заказа (или его частей) нет
+        """
+        with transaction.atomic():
+            order = Order.objects.select_for_update().only("state").filter(id=order_id).first()
+            states = set(cls.objects.filter(order_id=order_id).values_list("state", flat=True))
+            if order is None or order.state == "basket" or not states:
+                return None
+            active = [current for current in states if current != "canceled"]
+            state = min(active, key=ORDER_STATES.index) if active else "canceled"
+            if state != order.state:
+                Order.objects.filter(id=order_id).update(state=state)
+            return state
+
+
+class OutboxMessage(models.Model):
+    """
+    Исходящее сообщение для Celery (transactional outbox).
+
+    Записывается в той же транзакции, что и изменение данных, и отправляется
+    в брокер периодической задачей relay_outbox. Если транзакция откатилась,
+    сообщение не отправляется; ключ dedup_key исключает повторную постановку
+    одного и того же уведомления.
+
+    Attributes:
+        task (CharField): Имя задачи Celery
+        kwargs (JSONField): Именованные аргументы задачи
+        dedup_key (CharField): Ключ дедупликации (необязательный)
+        created_at (DateTimeField): Время записи
+        claimed_at (DateTimeField): Время, когда сообщение взято в обработку
+            (отправка сводки накладных)
+        sent_at (DateTimeField): Время передачи в брокер
+    """
+
+    objects = models.manager.Manager()
+    task = models.CharField(verbose_name="Задача", max_length=100)
+    kwargs = models.JSONField(verbose_name="Аргументы", default=dict)
+    dedup_key = models.CharField(verbose_name="Ключ дедупликации", max_length=200, unique=True, null=True, blank=True)
+    created_at = models.DateTimeField(verbose_name="Создано", auto_now_add=True)
+    claimed_at = models.DateTimeField(verbose_name="Взято в обработку", null=True, blank=True)
+    sent_at = models.DateTimeField(verbose_name="Отправлено", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Исходящее сообщение"
+        verbose_name_plural = "Очередь исходящих сообщений"
+        ordering = ("id",)
+        indexes = [
+            models.Index(fields=["id"], condition=Q(sent_at__isnull=True), name="outbox_pending_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.task} ({self.dedup_key or self.id})"
+
 
 class ConfirmEmailToken(models.Model):
     """
@@ -0,0 +1,27 @@
+"""
+Transactional outbox для задач Celery.
+
+Вместо вызова ``.delay()`` внутри запроса задача записывается в таблицу
+OutboxMessage в текущей транзакции. Периодическая задача
+``backend.tasks.relay_outbox`` пачками передает записи в брокер, поэтому
+время ответа API не включает обращения к Redis, а уведомления не теряются
+при откате транзакции и не дублируются благодаря ключу дедупликации.
+"""
+
+from backend.models import OutboxMessage
+
+
+def enqueue(task, dedup_key=None, **kwargs):
+    """
+    Запись задачи Celery в outbox.
+
+    Args:
+        task: Задача Celery (объект с атрибутом name) или ее имя
+        dedup_key (str): Ключ дедупликации; повторная запись с тем же
+            ключом игнорируется
+        **kwargs: Именованные аргументы задачи (должны сериализоваться в JSON)
+    """
+    OutboxMessage.objects.bulk_create(
+        [OutboxMessage(task=getattr(task, "name", task), kwargs=kwargs, dedup_key=dedup_key)],
+        ignore_conflicts=True,
+    )
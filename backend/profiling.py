@@ -0,0 +1,227 @@
+"""
+Профилирование выбранных запросов на работающем сервере.
+
+Профилируется запрос, если:
+
+- в нем есть заголовок ``X-Profile`` с подписанным токеном (выдается
+  staff пользователю на странице админки «Профилирование», действует
+  ``PROFILING_TOKEN_MAX_AGE`` секунд);
+- или в админке включено профилирование view на время: профилируется
+  доля ``rate`` запросов к нему.
+
+Профилировщик - семплирующий: отдельный поток раз в ``PROFILING_INTERVAL_MS``
+снимает стек потока, обрабатывающего запрос, и не замедляет сам код view.
+Нагрузка ограничена: одновременно профилируется не больше
+``PROFILING_MAX_CONCURRENT`` запросов, не больше ``PROFILING_MAX_PER_MINUTE``
+в минуту на процесс, один запрос - не дольше ``PROFILING_MAX_SECONDS``.
+
+Стеки сохраняются в ``PROFILING_DIR/<view>.folded`` в свернутом формате
+(``a;b;c <число>``), который принимают flamegraph.pl и speedscope.
+Профилируются только синхронные views.
+"""
+
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+TOKEN_SALT = "backend.profiling"
+TOGGLE_KEY = "profiling:toggle"
+# Как часто перечитывать из кэша настройку профилирования из админки, секунды
+TOGGLE_REFRESH = 5
+
+_toggle = (None, 0.0)
+_lock = threading.Lock()
+_active = 0
+_recent = deque()
+
+
+def make_token():
+    """
+    Подписанный токен для заголовка X-Profile.
+    """
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign("profile")
+
+
+def _valid_token(value):
+    try:
+        signing.TimestampSigner(salt=TOKEN_SALT).unsign(value, max_age=settings.PROFILING_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def enable(view_name, rate, minutes):
+    """
+    Включение профилирования доли запросов к view на время.
+
+    Args:
+        view_name (str): Имя view, например ``backend:basket``
+        rate (float): Доля профилируемых запросов от 0 до 1
+        minutes (int): Длительность, минуты
+    """
+    cache.set(TOGGLE_KEY, {"view": view_name, "rate": rate, "until": time.time() + minutes * 60}, minutes * 60)
+
+
+def disable():
+    """
+    Выключение профилирования из админки.
+    """
+    cache.delete(TOGGLE_KEY)
+
+
+def get_toggle():
+    """
+    Текущая настройка профилирования из админки или None.
+    """
+    global _toggle
+    value, fetched = _toggle
+    now = time.monotonic()
+    if now - fetched > TOGGLE_REFRESH:
+        try:
+            value = cache.get(TOGGLE_KEY)
+        except Exception:
+            value = None
+        _toggle = (value, now)
+    if value and value["until"] < time.time():
+        return None
+    return value
+
+
+def _acquire():
+    """
+    Место для профилирования с учетом ограничений нагрузки.
+    """
+    global _active
+    now = time.monotonic()
+    with _lock:
+        while _recent and now - _recent[0] > 60:
+            _recent.popleft()
+        if _active >= settings.PROFILING_MAX_CONCURRENT or len(_recent) >= settings.PROFILING_MAX_PER_MINUTE:
+            return False
+        _active += 1
+        _recent.append(now)
+        return True
+
+
+def _release():
+    global _active
+    with _lock:
+        _active -= 1
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def collapse(frame):
+    """
+    Стек в свернутом формате: от корня к текущей функции через ``;``.
+    """
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Sampler(threading.Thread):
+    """
+    Поток, который снимает стеки профилируемого потока.
+    """
+
+    def __init__(self, thread_id):
+        super().__init__(name="profiling-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        interval = settings.PROFILING_INTERVAL_MS / 1000
+        deadline = time.monotonic() + settings.PROFILING_MAX_SECONDS
+        while not self._stop_event.wait(interval) and time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            self.stacks[collapse(frame)] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        return self.stacks
+
+
+def profile_path(view_name):
+    """
+    Файл свернутых стеков для view.
+    """
+    return Path(settings.PROFILING_DIR) / (re.sub(r"[^\w.-]", "_", view_name) + ".folded")
+
+
+def save(view_name, stacks):
+    """
+    Дописывание стеков запроса в файл view.
+    """
+    path = profile_path(view_name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as output:
+        output.writelines(f"{stack} {count}\n" for stack, count in stacks.items())
+
+
+class ProfilingMiddleware:
+    """
+    Запускает семплирующий профилировщик для выбранных запросов.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.get_response(request)
+        response = self.get_response(request)
+        sampler = getattr(request, "_profiling_sampler", None)
+        if sampler is not None:
+            try:
+                stacks = sampler.stop()
+                save(request.resolver_match.view_name, stacks)
+                response["X-Profile-Samples"] = str(sum(stacks.values()))
+            finally:
+                _release()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if self.async_mode or not self.should_profile(request):
+            return None
+        if not _acquire():
+            return None
+        sampler = Sampler(threading.get_ident())
+        request._profiling_sampler = sampler
+        sampler.start()
+        return None
+
+    @staticmethod
+    def should_profile(request):
+        token = request.META.get("HTTP_X_PROFILE")
+        if token:
+            return _valid_token(token)
+        toggle = get_toggle()
+        if not toggle or toggle["view"] != request.resolver_match.view_name:
+            return False
+        return toggle["rate"] >= 1 or random.random() < toggle["rate"]
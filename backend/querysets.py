@@ -0,0 +1,135 @@
+"""
+Запросы для чтения каталога и заказов.
+
+Общие для синхронных (backend/views.py) и асинхронных (backend/async_views.py)
+views, чтобы оба варианта выполняли одинаковые запросы.
+
+Запросы горячих путей регистрируются декоратором ``hot_path`` вместе
+с функцией, которая подбирает по данным БД аргументы типичного вызова;
+команда ``explain_hot_paths`` выполняет для них EXPLAIN.
+
+Имена категорий и параметров сериализаторы берут из кэша справочников
+(backend/dimensions.py), поэтому они не загружаются JOIN и prefetch запросами.
+"""
+
+from django.db.models import F, Prefetch, Q, Sum
+
+from backend import dimensions
+from backend.models import ORDER_STATES, Category, Order, OrderItem, ProductInfo, Shop, ShopOrder
+
+HOT_PATHS = {}
+
+
+def hot_path(sample):
+    """
+    Регистрация запроса горячего пути.
+
+    Args:
+        sample: Функция без аргументов, возвращающая kwargs типичного вызова
+            или None, если подходящих данных нет
+    """
+
+    def decorator(func):
+        HOT_PATHS[func.__name__] = (func, sample)
+        return func
+
+    return decorator
+
+
+def _first(queryset, field):
+    value = queryset.values_list(field, flat=True).first()
+    return None if value is None else {field: value}
+
+
+def categories():
+    """
+    Список категорий.
+    """
+    return Category.objects.all()
+
+
+def shops():
+    """
+    Магазины, принимающие заказы.
+    """
+    return Shop.objects.filter(state=True)
+
+
+@hot_path(lambda: {"category_id": Category.objects.values_list("id", flat=True).first()})
+def product_infos(shop_id=None, category_id=None):
+    """
+    Поиск товаров в активных магазинах.
+
+    Args:
+        shop_id: ID магазина (необязательно)
+        category_id: ID категории (необязательно)
+
+    Returns:
+        QuerySet: Товары с магазином, категорией и параметрами
+    """
+    # активные магазины из кэша справочника вместо JOIN с backend_shop
+    query = Q(shop_id__in=dimensions.shops.ids(state=True))
+
+    if shop_id:
+        query = query & Q(shop_id=shop_id)
+
+    if category_id:
+        query = query & Q(product__category_id=category_id)
+
+    # фильтруем и отбрасываем дуликаты
+    return ProductInfo.objects.filter(query).select_related("product").prefetch_related("product_parameters").distinct()
+
+
+def _orders_with_items(user_id):
+    return (
+        Order.objects.filter(user_id=user_id)
+        .prefetch_related(
+            "ordered_items__product_info__product",
+            "ordered_items__product_info__product_parameters",
+        )
+        .select_related("contact")
+        .annotate(total_sum=Sum(F("ordered_items__quantity") * F("ordered_items__product_info__price")))
+        .distinct()
+    )
+
+
+@hot_path(lambda: _first(Order.objects.filter(state="basket"), "user_id"))
+def basket(user_id):
+    """
+    Корзина пользователя с позициями и суммой.
+
+    Args:
+        user_id: ID пользователя
+    """
+    return _orders_with_items(user_id).filter(state="basket")
+
+
+@hot_path(lambda: _first(Order.objects.exclude(state="basket"), "user_id"))
+def orders(user_id):
+    """
+    Оформленные заказы пользователя с позициями и суммой.
+
+    Args:
+        user_id: ID пользователя
+    """
+    return _orders_with_items(user_id).exclude(state="basket")
+
+
+@hot_path(lambda: _first(ShopOrder.objects.all(), "shop_id"))
+def shop_orders(shop_id):
+    """
+    Части заказов магазина с позициями только этого магазина.
+
+    Args:
+        shop_id: ID магазина
+    """
+    shop_items = (
+        OrderItem.objects.filter(shop_id=shop_id)
+        .select_related("product_info__product")
+        .prefetch_related("product_info__product_parameters")
+    )
+    return (
+        ShopOrder.objects.filter(shop_id=shop_id, state__in=ORDER_STATES)
+        .select_related("order__contact")
+        .prefetch_related(Prefetch("order__ordered_items", queryset=shop_items, to_attr="shop_items"))
+    )
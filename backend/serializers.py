@@ -8,10 +8,39 @@
 
 from rest_framework import serializers
 
-from backend.models import Category, Contact, Order, OrderItem, Product, ProductInfo, ProductParameter, Shop, User
+from backend import dimensions
+from backend.instrumentation import SerializationStatsMixin
+from backend.models import (
+    Category,
+    Contact,
+    Order,
+    OrderItem,
+    Product,
+    ProductInfo,
+    ProductParameter,
+    Shop,
+    ShopOrder,
+    User,
+)
 
 
-class ContactSerializer(serializers.ModelSerializer):
+class DimensionField(serializers.ReadOnlyField):
+    """
+    Имя записи справочника по ID связанного объекта из кэша процесса.
+
+    Заменяет StringRelatedField без JOIN и prefetch запросов, например
+    ``DimensionField(dimensions.categories, source="category_id")``.
+    """
+
+    def __init__(self, dimension, **kwargs):
+        self.dimension = dimension
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return self.dimension.label(value)
+
+
+class ContactSerializer(SerializationStatsMixin, serializers.ModelSerializer):
     """
     Сериализатор для контактов пользователя.
 
@@ -25,7 +54,7 @@ class ContactSerializer(serializers.ModelSerializer):
         extra_kwargs = {"user": {"write_only": True}}  # user не отображается в ответе API
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SerializationStatsMixin, serializers.ModelSerializer):
     """
     Сериализатор для модели пользователя.
 
@@ -40,7 +69,7 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ("id",)
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SerializationStatsMixin, serializers.ModelSerializer):
     """
     Сериализатор для категорий товаров.
 
@@ -56,7 +85,7 @@ class CategorySerializer(serializers.ModelSerializer):
         read_only_fields = ("id",)
 
 
-class ShopSerializer(serializers.ModelSerializer):
+class ShopSerializer(SerializationStatsMixin, serializers.ModelSerializer):
     """
     Сериализатор для магазинов.
 
@@ -73,15 +102,14 @@ class ShopSerializer(serializers.ModelSerializer):
         read_only_fields = ("id",)
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SerializationStatsMixin, serializers.ModelSerializer):
     """
     Сериализатор для товаров.
 
-    Использует StringRelatedField для отображения названия категории
-    вместо её ID.
+    Название категории берется из кэша справочника вместо её ID.
     """
 
-    category = serializers.StringRelatedField()
+    category = DimensionField(dimensions.categories, source="category_id")
 
     class Meta:
         model = Product
@@ -91,14 +119,14 @@ class ProductSerializer(serializers.ModelSerializer):
         )
 
 
-class ProductParameterSerializer(serializers.ModelSerializer):
+class ProductParameterSerializer(SerializationStatsMixin, serializers.ModelSerializer):
     """
     Сериализатор для параметров товара.
 
     Отображает название параметра и его значение для конкретного товара.
     """
 
-    parameter = serializers.StringRelatedField()
+    parameter = DimensionField(dimensions.parameters, source="parameter_id")
 
     class Meta:
         model = ProductParameter
@@ -108,7 +136,7 @@ class ProductParameterSerializer(serializers.ModelSerializer):
         )
 
 
-class ProductInfoSerializer(serializers.ModelSerializer):
+class ProductInfoSerializer(SerializationStatsMixin, serializers.ModelSerializer):
     """
     Сериализатор для информации о товаре в магазине.
 
@@ -134,7 +162,7 @@ class ProductInfoSerializer(serializers.ModelSerializer):
         read_only_fields = ("id",)
 
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(SerializationStatsMixin, serializers.ModelSerializer):
     """
     Базовый сериализатор для позиций заказа.
 
@@ -164,7 +192,7 @@ class OrderItemCreateSerializer(OrderItemSerializer):
     product_info = ProductInfoSerializer(read_only=True)
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SerializationStatsMixin, serializers.ModelSerializer):
     """
     Сериализатор для заказов.
 
@@ -191,3 +219,31 @@ class OrderSerializer(serializers.ModelSerializer):
             "contact",
         )
         read_only_fields = ("id",)
+
+
+class ShopOrderSerializer(SerializationStatsMixin, serializers.ModelSerializer):
+    """
+    Сериализатор для части заказа, относящейся к магазину.
+
+    Включает только позиции этого магазина (атрибут shop_items заказа,
+    заполняется через Prefetch во view), итоги части заказа
+    и контактную информацию покупателя. Поле id - номер заказа, как и до
+    разбиения заказов по магазинам.
+    """
+
+    id = serializers.IntegerField(source="order_id", read_only=True)
+    ordered_items = OrderItemCreateSerializer(source="order.shop_items", read_only=True, many=True)
+    contact = ContactSerializer(source="order.contact", read_only=True)
+
+    class Meta:
+        model = ShopOrder
+        fields = (
+            "id",
+            "ordered_items",
+            "state",
+            "dt",
+            "total_sum",
+            "items_count",
+            "contact",
+        )
+        read_only_fields = ("id",)
@@ -5,23 +5,32 @@
 - Отправки email при регистрации пользователя
 - Отправки email при сбросе пароля
 - Отправки email при создании нового заказа
+- Сброса кэша аутентификации при выходе, смене пароля и деактивации
+- Сброса кэша справочников при изменении категорий, параметров и магазинов
 
-Использует Celery для асинхронной отправки писем.
+Задачи Celery не вызываются напрямую: они записываются в outbox в той же
+транзакции и передаются в брокер задачей relay_outbox.
 """
 
 from typing import Type
 
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import Signal, receiver
 
 from django_rest_passwordreset.signals import reset_password_token_created
+from rest_framework.authtoken.models import Token
 
-from backend.models import ConfirmEmailToken, Order, User
+from backend import dimensions
+from backend.authentication import invalidate_tokens, invalidate_user
+from backend.models import Category, ConfirmEmailToken, Order, Parameter, Shop, ShopOrder, User
+from backend.outbox import enqueue
 from backend.tasks import send_email, send_invoice_to_admin
 
 # Кастомные сигналы
 new_user_registered = Signal()  # Срабатывает при регистрации нового пользователя
 new_order = Signal()  # Срабатывает при создании нового заказа
+shop_order_updated = Signal()  # Срабатывает при изменении магазином статуса своей части заказа
 
 
 @receiver(reset_password_token_created)
@@ -35,8 +44,10 @@ def password_reset_token_created(sender, instance, reset_password_token, **kwarg
     :param kwargs:
     :return:
     """
-    # Отправляем email асинхронно через Celery
-    send_email.delay(
+    # Ставим письмо в outbox
+    enqueue(
+        send_email,
+        dedup_key=f"password-reset:{reset_password_token.pk}",
         subject=f"Password Reset Token for {reset_password_token.user}",
         message=reset_password_token.key,
         recipient_list=[reset_password_token.user.email],
@@ -55,9 +66,13 @@ def new_user_registered_signal(sender: Type[User], instance: User, created: bool
         # Создаем или получаем токен подтверждения для пользователя
         token, _ = ConfirmEmailToken.objects.get_or_create(user_id=instance.pk)
 
-        # Отправляем email асинхронно через Celery
-        send_email.delay(
-            subject=f"Email Confirmation Token for {instance.email}", message=token.key, recipient_list=[instance.email]
+        # Ставим письмо в outbox
+        enqueue(
+            send_email,
+            dedup_key=f"confirm-email:{token.key}",
+            subject=f"Email Confirmation Token for {instance.email}",
+            message=token.key,
+            recipient_list=[instance.email],
         )
 
 
@@ -65,24 +80,107 @@ def new_user_registered_signal(sender: Type[User], instance: User, created: bool
 def new_order_signal(user_id, order_id=None, **kwargs):
     """
     Отправляем письмо при изменении статуса заказа.
-    Также отправляем накладную администратору.
+    Также отправляем накладную администратору и уведомления магазинам.
     """
 
     # Получаем пользователя
     user = User.objects.get(id=user_id)
 
     # Отправляем уведомление пользователю
-    send_email.delay(subject="Обновление статуса заказа", message="Заказ сформирован", recipient_list=[user.email])
+    enqueue(
+        send_email,
+        dedup_key=f"order-created:{order_id}" if order_id else None,
+        subject="Обновление статуса заказа",
+        message="Заказ сформирован",
+        recipient_list=[user.email],
+    )
 
     # Если передан ID заказа, отправляем накладную администратору
     if order_id:
-        send_invoice_to_admin.delay(order_id)
+        enqueue(send_invoice_to_admin, dedup_key=f"invoice:{order_id}", order_id=int(order_id))
+
+        # Уведомляем каждый магазин только о его части заказа
+        for shop_order in ShopOrder.objects.filter(order_id=order_id).select_related("shop__user"):
+            if shop_order.shop.user_id:
+                enqueue(
+                    send_email,
+                    dedup_key=f"shop-order-created:{shop_order.id}",
+                    subject=f"Новый заказ №{order_id}",
+                    message=f"Позиций: {shop_order.items_count}, сумма: {shop_order.total_sum} руб.",
+                    recipient_list=[shop_order.shop.user.email],
+                )
+
+
+@receiver(shop_order_updated)
+def shop_order_updated_signal(shop_order_id, **kwargs):
+    """
+    Отправляем покупателю письмо об изменении статуса части заказа магазином.
+    """
+    shop_order = ShopOrder.objects.select_related("shop", "order__user").get(id=shop_order_id)
+
+    enqueue(
+        send_email,
+        subject=f"Обновление статуса заказа №{shop_order.order_id}",
+        message=f"Магазин {shop_order.shop.name}: {shop_order.get_state_display()}",
+        recipient_list=[shop_order.order.user.email],
+    )
 
 
 @receiver(post_save, sender=Order)
-def order_status_changed(sender, instance, created, **kwargs):
+def order_status_changed(sender, instance, created, update_fields=None, **kwargs):
     """
-    Отправляем накладную при изменении заказа на статус 'new'
+    Отправляем накладную при изменении заказа на статус 'new'.
+    Также переносим изменившийся статус заказа в отстающие части заказа
+    по магазинам; сохранение без смены статуса (например, контакта) их статусы не трогает.
     """
+    state_saved = update_fields is None or "state" in update_fields
+    if not created and state_saved and instance.state != getattr(instance, "_loaded_state", None):
+        ShopOrder.advance([instance.id], instance.state)
+    instance._loaded_state = instance.state
+
+    # ключ дедупликации общий с new_order_signal: накладная уходит один раз
     if instance.state == "new" and not created:
-        send_invoice_to_admin.delay(instance.id)
+        enqueue(send_invoice_to_admin, dedup_key=f"invoice:{instance.id}", order_id=instance.id)
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, **kwargs):
+    """
+    Сбрасываем кэшированный снимок пользователя при его изменении
+    (смена пароля, деактивация, изменение данных).
+    """
+    if not created:
+        # сразу и еще раз после фиксации: параллельный запрос мог закэшировать
+        # пользователя из БД до фиксации транзакции
+        invalidate_user(instance.pk)
+        transaction.on_commit(lambda: invalidate_user(instance.pk))
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """
+    Сбрасываем кэш аутентификации при удалении токена (выход, удаление пользователя).
+    """
+    keys = [instance.key]
+    invalidate_tokens(keys)
+    transaction.on_commit(lambda: invalidate_tokens(keys))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Parameter)
+@receiver(post_save, sender=Shop)
+def dimension_saved(sender, instance, created, **kwargs):
+    """
+    Сбрасываем кэш справочника при изменении записи.
+    """
+    dimensions.changed(sender, created=created)
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Parameter)
+@receiver(post_delete, sender=Shop)
+def dimension_deleted(sender, instance, **kwargs):
+    """
+    Сбрасываем кэш справочника при удалении записи.
+    """
+    dimensions.changed(sender)
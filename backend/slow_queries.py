@@ -0,0 +1,198 @@
+"""
+Запись медленных SQL запросов с источником и планом выполнения.
+
+Запрос дольше ``SLOW_QUERY_MS`` миллисекунд пишется одной строкой JSON в лог
+``backend.slow_queries`` вместе с:
+
+- источником: имя view (SlowQueryMiddleware) или задачи Celery;
+- местом вызова: ближайший к запросу кадр стека из кода проекта;
+- для SELECT - планом ``EXPLAIN (ANALYZE, BUFFERS)`` (PostgreSQL), не чаще
+  ``SLOW_QUERY_EXPLAIN_PER_MINUTE`` раз в минуту на процесс: EXPLAIN ANALYZE
+  выполняет запрос повторно. Для ``SELECT ... FOR UPDATE/SHARE`` пишется план
+  обычного ``EXPLAIN``: повторное выполнение взяло бы блокировки строк еще раз.
+
+Параметры запроса в лог не пишутся.
+"""
+
+import logging
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+import ujson
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from celery.signals import task_postrun, task_prerun
+
+logger = logging.getLogger(__name__)
+
+# Источник текущих запросов: {"origin": ...}; словарь, чтобы process_view
+# мог изменить его и из потока sync_to_async
+_origin = ContextVar("slow_query_origin", default=None)
+_explaining = ContextVar("slow_query_explaining", default=False)
+_task_tokens = {}
+_explained = deque()
+_lock = threading.Lock()
+
+_PROJECT_DIR = str(Path(settings.BASE_DIR).resolve())
+# Модули с обертками SQL запросов - не место вызова
+_WRAPPER_MODULES = {__name__, "backend.instrumentation"}
+# SELECT с блокировкой строк (FOR UPDATE, FOR NO KEY UPDATE, FOR SHARE, FOR KEY SHARE)
+_LOCKING_RE = re.compile(r"\sFOR\s+(?:NO\s+KEY\s+UPDATE|UPDATE|KEY\s+SHARE|SHARE)\b", re.IGNORECASE)
+
+
+def call_site():
+    """
+    Ближайший кадр стека из кода проекта (не Django и не сторонние пакеты).
+
+    Returns:
+        str: ``путь:строка в функции`` или None
+    """
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (
+            filename.startswith(_PROJECT_DIR)
+            and "site-packages" not in filename
+            and frame.f_globals.get("__name__") not in _WRAPPER_MODULES
+        ):
+            return f"{Path(filename).relative_to(_PROJECT_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+def explain_prefix(connection, analyze=True):
+    """
+    Префикс EXPLAIN с выполнением запроса, если его поддерживает БД и analyze=True.
+    """
+    if not analyze:
+        return connection.ops.explain_query_prefix()
+    try:
+        return connection.ops.explain_query_prefix(analyze=True, buffers=True)
+    except ValueError:
+        return connection.ops.explain_query_prefix()
+
+
+def explain(connection, sql, params):
+    """
+    План выполнения запроса.
+
+    EXPLAIN выполняется в точке сохранения: ошибка не прерывает транзакцию запроса.
+    Запросы с блокировкой строк не выполняются повторно (EXPLAIN без ANALYZE).
+
+    Returns:
+        str: План или None, если получить его не удалось
+    """
+    token = _explaining.set(True)
+    try:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            prefix = explain_prefix(connection, analyze=not _LOCKING_RE.search(sql))
+            cursor.execute(f"{prefix} {sql}", params)
+            return "\n".join(" ".join(str(value) for value in row) for row in cursor.fetchall())
+    except DatabaseError as error:
+        logger.warning("Не удалось получить план запроса: %s", error)
+        return None
+    finally:
+        _explaining.reset(token)
+
+
+def _may_explain():
+    limit = settings.SLOW_QUERY_EXPLAIN_PER_MINUTE
+    now = time.monotonic()
+    with _lock:
+        while _explained and now - _explained[0] > 60:
+            _explained.popleft()
+        if len(_explained) >= limit:
+            return False
+        _explained.append(now)
+        return True
+
+
+def _slow_query_wrapper(execute, sql, params, many, context):
+    threshold = settings.SLOW_QUERY_MS
+    if not threshold or _explaining.get():
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration = (time.perf_counter() - started) * 1000
+    if duration < threshold:
+        return result
+
+    origin = _origin.get()
+    record = {
+        "event": "slow_query",
+        "duration_ms": round(duration, 2),
+        "origin": origin["origin"] if origin else None,
+        "call_site": call_site(),
+        "sql": sql,
+    }
+    if not many and sql.lstrip()[:6].upper() == "SELECT" and _may_explain():
+        record["plan"] = explain(context["connection"], sql, params)
+    logger.warning(ujson.dumps(record, ensure_ascii=False))
+    return result
+
+
+@receiver(connection_created)
+def install_slow_query_wrapper(sender, connection, **kwargs):
+    """
+    Подключаем запись медленных запросов к каждому новому соединению.
+    """
+    if _slow_query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_slow_query_wrapper)
+
+
+class SlowQueryMiddleware:
+    """
+    Запоминает view текущего запроса как источник медленных SQL запросов.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _origin.set({"origin": f"{request.method} {request.path}"})
+        try:
+            return self.get_response(request)
+        finally:
+            _origin.reset(token)
+
+    async def __acall__(self, request):
+        token = _origin.set({"origin": f"{request.method} {request.path}"})
+        try:
+            return await self.get_response(request)
+        finally:
+            _origin.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        origin = _origin.get()
+        if origin is not None:
+            origin["origin"] = f"view {request.resolver_match.view_name}"
+
+
+@task_prerun.connect
+def task_started(task_id=None, task=None, **kwargs):
+    _task_tokens[task_id] = _origin.set({"origin": f"task {task.name}"})
+
+
+@task_postrun.connect
+def task_finished(task_id=None, **kwargs):
+    token = _task_tokens.pop(task_id, None)
+    if token is not None:
+        _origin.reset(token)
@@ -4,31 +4,51 @@
 Модуль содержит задачи для:
 - Асинхронной отправки email уведомлений
 - Асинхронного импорта товаров из YAML файлов
+- Передачи в брокер сообщений из outbox
 
 Все задачи выполняются в фоновом режиме через Celery worker,
 что позволяет избежать блокировки основного потока выполнения.
 """
 
+import logging
+import time
+from datetime import timedelta
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
 
-from celery import shared_task
+from celery import current_app, shared_task
+from celery.exceptions import SoftTimeLimitExceeded
 from requests import get
 from yaml import Loader
 from yaml import load as load_yaml
 
-from backend.models import Category, Order, Parameter, Product, ProductInfo, ProductParameter, Shop
+from backend import dimensions, invoices, mail, metrics
+from backend.models import Category, OutboxMessage, Product, ProductInfo, ProductParameter, Shop
 
 User = get_user_model()
 
+logger = logging.getLogger(__name__)
 
-@shared_task
-def send_email(subject, message, recipient_list, html_content=None):
+
+def _retry_countdown(retries):
+    """
+    Задержка перед повторной отправкой писем (экспоненциальная).
+    """
+    return min(settings.EMAIL_RETRY_BACKOFF * 2**retries, settings.EMAIL_RETRY_BACKOFF_MAX)
+
+
+@shared_task(bind=True, max_retries=5)
+def send_email(self, subject, message, recipient_list, html_content=None):
     """
     Асинхронная отправка email через Celery.
 
+    Письмо отправляется через SMTP соединение процесса (backend.mail).
+    При разрыве соединения задача повторяется с экспоненциальной задержкой.
+
     Args:
         subject (str): Тема письма
         message (str): Текст письма
@@ -39,18 +59,48 @@ def send_email(subject, message, recipient_list, html_content=None):
         bool: True если письмо отправлено успешно, False при ошибке
     """
     try:
-        msg = EmailMultiAlternatives(
-            subject=subject, body=message, from_email=settings.EMAIL_HOST_USER, to=recipient_list
-        )
-        if html_content:
-            msg.attach_alternative(html_content, "text/html")
-        msg.send()
+        mail.send_messages([mail.build_message(subject, message, recipient_list, html_content)])
+        metrics.EMAILS_SENT.labels("email").inc()
         return True
-    except Exception as e:
-        print(f"Ошибка отправки email: {str(e)}")
+    except mail.SendError as e:
+        if isinstance(e.__cause__, mail.RETRYABLE_ERRORS) and self.request.retries < self.max_retries:
+            metrics.EMAIL_FAILURES.labels("email", "true").inc()
+            raise self.retry(exc=e, countdown=_retry_countdown(self.request.retries))
+        metrics.EMAIL_FAILURES.labels("email", "false").inc()
+        logger.error("Ошибка отправки email: %s", e.__cause__)
         return False
 
 
+@shared_task(bind=True, max_retries=5)
+def send_email_batch(self, messages):
+    """
+    Отправка пачки писем через одно SMTP соединение.
+
+    Пачки формирует relay_outbox из писем, накопившихся в outbox.
+    При разрыве соединения повторно отправляются только неотправленные письма.
+
+    Args:
+        messages (list): Список словарей с аргументами send_email
+            (subject, message, recipient_list, html_content)
+
+    Returns:
+        int: Количество отправленных писем
+    """
+    try:
+        sent = mail.send_messages([mail.build_message(**message) for message in messages])
+        metrics.EMAILS_SENT.labels("email").inc(sent)
+        return sent
+    except mail.SendError as e:
+        unsent = messages[len(messages) - len(e.unsent) :]
+        metrics.EMAILS_SENT.labels("email").inc(e.sent)
+        if isinstance(e.__cause__, mail.RETRYABLE_ERRORS) and self.request.retries < self.max_retries:
+            metrics.EMAIL_FAILURES.labels("email", "true").inc()
+            raise self.retry(exc=e, kwargs={"messages": unsent}, countdown=_retry_countdown(self.request.retries))
+        metrics.EMAIL_FAILURES.labels("email", "false").inc(len(unsent))
+        logger.error("Ошибка отправки email: %s, не отправлено писем: %s", e.__cause__, len(unsent))
+        return e.sent
+
+
 @shared_task
 def do_import(url, user_id):
     """
@@ -93,6 +143,7 @@ def do_import(url, user_id):
         ...     user_id=1
         ... )
     """
+    started = time.perf_counter()
     try:
         user = User.objects.get(id=user_id)
 
@@ -106,11 +157,14 @@ def do_import(url, user_id):
         # Создаем или обновляем магазин
         shop, _ = Shop.objects.get_or_create(name=data["shop"], user_id=user.id)
 
-        # Обрабатываем категории
+        # Обрабатываем категории: известные категории берутся из кэша справочника
         for category in data["categories"]:
-            category_object, _ = Category.objects.get_or_create(id=category["id"], name=category["name"])
-            category_object.shops.add(shop.id)
-            category_object.save()
+            if dimensions.categories.label(category["id"]) != category["name"]:
+                Category.objects.get_or_create(id=category["id"], name=category["name"])
+        Category.shops.through.objects.bulk_create(
+            [Category.shops.through(category_id=category["id"], shop_id=shop.id) for category in data["categories"]],
+            ignore_conflicts=True,
+        )
 
         # Удаляем старые товары
         ProductInfo.objects.filter(shop_id=shop.id).delete()
@@ -133,9 +187,10 @@ def do_import(url, user_id):
 
             # Создаем параметры товара
             for name, value in item["parameters"].items():
-                parameter_object, _ = Parameter.objects.get_or_create(name=name)
                 ProductParameter.objects.create(
-                    product_info_id=product_info.id, parameter_id=parameter_object.id, value=value
+                    product_info_id=product_info.id,
+                    parameter_id=dimensions.parameters.get_or_create_id(name),
+                    value=value,
                 )
 
         # Отправляем уведомление об успешном импорте
@@ -145,14 +200,59 @@ def do_import(url, user_id):
             recipient_list=[user.email],
         )
 
+        metrics.IMPORT_PRODUCTS.inc(products_created)
+        metrics.IMPORT_DURATION.observe(time.perf_counter() - started)
         return {"status": True, "message": f"Импортировано {products_created} товаров", "shop": shop.name}
 
     except Exception as e:
+        metrics.IMPORT_FAILURES.inc()
+        logger.exception("Ошибка импорта товаров из %s", url)
         return {"status": False, "error": str(e)}
 
 
-@shared_task
-def send_invoice_to_admin(order_id):
+def _send_invoices(task, order_ids, retry_kwargs):
+    """
+    Формирование и отправка накладных с повтором задачи при разрыве соединения.
+
+    Args:
+        task: Выполняемая задача (bind=True)
+        order_ids (list): ID заказов
+        retry_kwargs: Функция: ID неотправленных заказов -> аргументы повтора задачи
+
+    Returns:
+        int: Количество отправленных накладных
+    """
+    try:
+        messages = invoices.build_invoice_messages(order_ids)
+
+        for order_id in set(order_ids) - set(messages):
+            logger.warning("Заказ %s не найден", order_id)
+
+        sent = mail.send_messages(list(messages.values()))
+        metrics.EMAILS_SENT.labels("invoice").inc(sent)
+
+        logger.info("Накладные для заказов %s отправлены на %s", sorted(messages), settings.ADMIN_EMAIL)
+        return sent
+
+    except mail.SendError as e:
+        metrics.EMAILS_SENT.labels("invoice").inc(e.sent)
+        unsent = list(messages)[len(messages) - len(e.unsent) :]
+        if isinstance(e.__cause__, mail.RETRYABLE_ERRORS) and task.request.retries < task.max_retries:
+            metrics.EMAIL_FAILURES.labels("invoice", "true").inc()
+            raise task.retry(exc=e, kwargs=retry_kwargs(unsent), countdown=_retry_countdown(task.request.retries))
+        metrics.EMAIL_FAILURES.labels("invoice", "false").inc(len(unsent))
+        logger.error("Ошибка отправки накладных для заказов %s: %s", unsent, e.__cause__)
+        return e.sent
+    except SoftTimeLimitExceeded:
+        raise
+    except Exception:
+        metrics.EMAIL_FAILURES.labels("invoice", "false").inc()
+        logger.exception("Ошибка отправки накладной")
+        return 0
+
+
+@shared_task(bind=True, max_retries=5)
+def send_invoice_to_admin(self, order_id):
     """
     Отправка накладной администратору при новом заказе.
 
@@ -162,36 +262,162 @@ def send_invoice_to_admin(order_id):
     Returns:
         bool: True если отправлено успешно
     """
+    return _send_invoices(self, [order_id], lambda unsent: {"order_id": order_id}) == 1
 
-    try:
-        # Получаем заказ
-        order = Order.objects.get(id=order_id)
-
-        # Считаем общую сумму
-        total_sum = 0
-        for item in order.ordered_items.all():
-            item.total = item.quantity * item.product_info.price
-            total_sum += item.total
-
-        # Формируем HTML письмо
-        html_content = render_to_string("email/invoice.html", {"order": order, "total_sum": total_sum})
-
-        # Отправляем письмо администратору
-        msg = EmailMultiAlternatives(
-            subject=f"Новый заказ №{order.id}",
-            body=f"Поступил новый заказ №{order.id}",  # Текстовая версия
-            from_email=settings.EMAIL_HOST_USER,
-            to=[settings.ADMIN_EMAIL],
+
+@shared_task(bind=True, max_retries=5)
+def send_invoices_to_admin(self, order_ids):
+    """
+    Отправка накладных администратору сразу по нескольким заказам.
+
+    Заказы загружаются одним запросом с prefetch позиций, накладные
+    формируются по скомпилированному шаблону и отправляются через одно
+    SMTP соединение. При разрыве соединения задача повторяется только
+    для неотправленных накладных.
+
+    Args:
+        order_ids (list): ID заказов
+
+    Returns:
+        int: Количество отправленных накладных
+    """
+    return _send_invoices(self, order_ids, lambda unsent: {"order_ids": unsent})
+
+
+# Задачи, которые relay_outbox объединяет в пачки: имя задачи -> (пакетная задача, аргументы пачки)
+BATCHED_TASKS = {
+    send_email.name: (send_email_batch.name, lambda batch: {"messages": [message.kwargs for message in batch]}),
+    send_invoice_to_admin.name: (
+        send_invoices_to_admin.name,
+        lambda batch: {"order_ids": [message.kwargs["order_id"] for message in batch]},
+    ),
+}
+
+
+@shared_task
+def relay_outbox(batch_size=None):
+    """
+    Передача в брокер неотправленных сообщений из outbox.
+
+    Запускается периодически через Celery beat. Сообщения выбираются пачкой
+    с блокировкой строк (SKIP LOCKED), поэтому несколько экземпляров задачи
+    не отправят одно сообщение дважды. Все сообщения пачки публикуются
+    через одно соединение с брокером, а письма и накладные объединяются
+    в пакетные задачи (BATCHED_TASKS) по EMAIL_BATCH_SIZE штук.
+
+    Args:
+        batch_size (int): Размер пачки (по умолчанию OUTBOX_BATCH_SIZE)
+
+    Returns:
+        int: Количество переданных сообщений
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+
+    with transaction.atomic():
+        pending = OutboxMessage.objects.select_for_update(skip_locked=True).filter(sent_at__isnull=True)
+        if settings.ADMIN_INVOICE_DIGEST:
+            # накладные в режиме дайджеста отправляет send_invoice_digest
+            pending = pending.exclude(task=send_invoice_to_admin.name)
+        messages = list(pending.order_by("id")[:batch_size])
+        # письма и накладные объединяются в пачки для отправки через одно SMTP соединение
+        grouped = {}
+        for message in messages:
+            grouped.setdefault(message.task, []).append(message)
+
+        sent_ids = []
+        error = None
+        try:
+            with current_app.producer_or_acquire() as producer:
+                for task, task_messages in grouped.items():
+                    if task in BATCHED_TASKS:
+                        batch_task, batch_kwargs = BATCHED_TASKS[task]
+                        for i in range(0, len(task_messages), settings.EMAIL_BATCH_SIZE):
+                            batch = task_messages[i : i + settings.EMAIL_BATCH_SIZE]
+                            current_app.send_task(batch_task, kwargs=batch_kwargs(batch), producer=producer)
+                            sent_ids.extend(message.id for message in batch)
+                    else:
+                        for message in task_messages:
+                            current_app.send_task(task, kwargs=message.kwargs, producer=producer)
+                            sent_ids.append(message.id)
+        except Exception as e:
+            error = e
+
+        # отмечаем только опубликованные сообщения, остальные уйдут в следующий запуск
+        OutboxMessage.objects.filter(id__in=sent_ids).update(sent_at=timezone.now())
+
+    if error:
+        raise error
+    return len(sent_ids)
+
+
+@shared_task
+def send_invoice_digest():
+    """
+    Отправка администратору сводки по новым заказам (режим дайджеста).
+
+    Запускается через Celery beat раз в ADMIN_INVOICE_DIGEST_WINDOW секунд.
+    Забирает из outbox накопившиеся накладные и отправляет их одним письмом
+    (по ADMIN_INVOICE_DIGEST_MAX_ORDERS заказов) с накладными во вложениях.
+
+    Строки outbox не блокируются на время работы с SMTP: пачка отмечается
+    взятой в обработку (claimed_at) в короткой транзакции, после отправки
+    отмечается отправленной. Если отправка не удалась, отметка снимается
+    и накладные уходят при следующем запуске; отметка упавшего процесса
+    истекает через ADMIN_INVOICE_DIGEST_WINDOW секунд.
+
+    Returns:
+        int: Количество заказов, вошедших в сводку
+    """
+    if not settings.ADMIN_INVOICE_DIGEST:
+        return 0
+
+    sent = 0
+    while True:
+        messages = _claim_digest_messages()
+        if not messages:
+            return sent
+        ids = [message.id for message in messages]
+
+        try:
+            digest = invoices.build_digest_message([message.kwargs["order_id"] for message in messages])
+            if digest is not None:
+                mail.send_messages([digest])
+                metrics.EMAILS_SENT.labels("invoice_digest").inc()
+        except Exception:
+            OutboxMessage.objects.filter(id__in=ids).update(claimed_at=None)
+            raise
+        OutboxMessage.objects.filter(id__in=ids).update(sent_at=timezone.now())
+        sent += len(messages)
+
+
+def _claim_digest_messages():
+    """
+    Пачка неотправленных накладных, отмеченная взятой в обработку.
+
+    Returns:
+        list: Сообщения outbox
+    """
+    now = timezone.now()
+    expired = now - timedelta(seconds=settings.ADMIN_INVOICE_DIGEST_WINDOW)
+    with transaction.atomic():
+        messages = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(sent_at__isnull=True, task=send_invoice_to_admin.name)
+            .filter(Q(claimed_at__isnull=True) | Q(claimed_at__lt=expired))
+            .order_by("id")[: settings.ADMIN_INVOICE_DIGEST_MAX_ORDERS]
         )
-        msg.attach_alternative(html_content, "text/html")
-        msg.send()
+        OutboxMessage.objects.filter(id__in=[message.id for message in messages]).update(claimed_at=now)
+    return messages
 
-        print(f"Накладная для заказа {order_id} отправлена на {settings.ADMIN_EMAIL}")
-        return True
 
-    except Order.DoesNotExist:
-        print(f"Заказ {order_id} не найден")
-        return False
-    except Exception as e:
-        print(f"Ошибка отправки накладной: {str(e)}")
-        return False
+@shared_task
+def purge_outbox():
+    """
+    Удаление давно отправленных сообщений outbox.
+
+    Returns:
+        int: Количество удаленных сообщений
+    """
+    border = timezone.now() - timedelta(days=settings.OUTBOX_RETENTION_DAYS)
+    deleted, _ = OutboxMessage.objects.filter(sent_at__lt=border).delete()
+    return deleted
@@ -0,0 +1,30 @@
+"""
+Тестовый раннер проекта.
+"""
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+# Кэш в памяти процесса: тестам не нужен запущенный Redis
+TEST_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Стандартный раннер Django с отключенным ограничением частоты запросов
+    и кэшем в памяти процесса.
+
+    Ведра throttling хранятся в Redis и переживают отдельные тесты,
+    поэтому в тестах ограничение включается явно через override_settings.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.THROTTLE_ENABLED = False
+        self._caches = override_settings(CACHES=TEST_CACHES)
+        self._caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._caches.disable()
+        super().teardown_test_environment(**kwargs)
@@ -1,15 +1,91 @@
+import os
+import tempfile
+import threading
+from io import StringIO
+from pathlib import Path
+from smtplib import SMTPServerDisconnected
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.signals import user_login_failed
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.core import mail as django_mail
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, migrations, models
+from django.test import LiveServerTestCase, RequestFactory, TestCase, override_settings
 from django.urls import reverse
 
+import redis
+import ujson
+from celery.exceptions import SoftTimeLimitExceeded
 from rest_framework import status
-from rest_framework.test import APIClient
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+from yaml import Loader
+from yaml import load as load_yaml
 
-from backend.models import Category, Order, Product, ProductInfo, Shop
+from backend import dimensions, hashing, mail, profiling, slow_queries
+from backend.admin import ShopOrderAdmin
+from backend.authentication import CachedTokenAuthentication, local_cache
+from backend.db import ReplicaRouter, pool_stats, replica_reads, use_replica
+from backend.idempotency import idempotent
+from backend.instrumentation import CacheStatsMixin, Stats, _current
+from backend.invoices import build_invoice_messages
+from backend.management.commands.makemigrations_concurrently import (
+    Command,
+    NonAtomicMigrationWriter,
+    find_duplicates,
+    split_operations,
+)
+from backend.metrics import REGISTRY
+from backend.models import (
+    Category,
+    Contact,
+    Order,
+    OrderItem,
+    OutboxMessage,
+    Parameter,
+    Product,
+    ProductInfo,
+    Shop,
+    ShopOrder,
+)
+from backend.outbox import enqueue
+from backend.tasks import (
+    relay_outbox,
+    send_email,
+    send_email_batch,
+    send_invoice_digest,
+    send_invoice_to_admin,
+    send_invoices_to_admin,
+)
+from backend.throttling import TokenBucketThrottle
+from loadtest.runner import Runner, assign_scenarios
+from loadtest.stats import percentile
 
 User = get_user_model()
 
 
+def temp_dir(test):
+    """
+    Временный каталог, удаляемый после теста.
+
+    Returns:
+        str: Путь к каталогу
+    """
+    directory = tempfile.TemporaryDirectory()
+    test.addCleanup(directory.cleanup)
+    return directory.name
+
+
 class UserRegistrationTest(TestCase):
     """Тесты регистрации и авторизации пользователей."""
 
@@ -44,6 +120,58 @@ class UserRegistrationTest(TestCase):
         self.assertEqual(user.first_name, "Иван")
         self.assertFalse(user.is_active)  # Неактивен до подтверждения
 
+    def test_login_rehashes_legacy_password(self):
+        """Пароль со старым хешером перехешируется основным при входе."""
+        user = User.objects.create_user(email="legacy@example.com", is_active=True)
+        user.password = make_password("TestPassword123", hasher="pbkdf2_sha1")
+        user.save()
+
+        response = self.client.post(
+            reverse("backend:user-login"), {"email": "legacy@example.com", "password": "TestPassword123"}
+        )
+
+        self.assertTrue(response.json()["Status"])
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith("pbkdf2_sha256$"))
+        self.assertTrue(user.check_password("TestPassword123"))
+
+    def test_failed_login_sends_signal(self):
+        """Неудачный вход проходит через AUTHENTICATION_BACKENDS и отправляет user_login_failed."""
+        User.objects.create_user(email="test@example.com", password="TestPassword123", is_active=True)
+        failed = []
+
+        def receiver(sender, credentials, **kwargs):
+            failed.append(credentials["username"])
+
+        user_login_failed.connect(receiver)
+        self.addCleanup(user_login_failed.disconnect, receiver)
+
+        response = self.client.post(reverse("backend:user-login"), {"email": "test@example.com", "password": "Wrong1"})
+
+        self.assertFalse(response.json()["Status"])
+        self.assertEqual(failed, ["test@example.com"])
+
+    def test_login_rejected_when_hashing_pool_full(self):
+        """При заполненной очереди хеширования вход в API и в админку получает 503, а не 500."""
+        User.objects.create_user(email="test@example.com", password="TestPassword123", is_active=True)
+        hashing._get_limiter()
+        rejected = REGISTRY.get_sample_value("password_hash_rejected_total", {"pid": str(os.getpid())})
+        with patch("backend.hashing._slots", threading.BoundedSemaphore(1)) as slots:
+            slots.acquire()
+            response = self.client.post(
+                reverse("backend:user-login"), {"email": "test@example.com", "password": "TestPassword123"}
+            )
+            admin_response = self.client.post(
+                "/admin/login/", {"username": "test@example.com", "password": "TestPassword123"}
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(admin_response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(admin_response["Retry-After"], "1")
+        self.assertEqual(
+            REGISTRY.get_sample_value("password_hash_rejected_total", {"pid": str(os.getpid())}), rejected + 2
+        )
+
     def test_user_login(self):
         """Тест входа пользователя."""
         # Создаем активного пользователя
@@ -193,3 +321,966 @@ class YAMLImportTest(TestCase):
 
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
         self.assertEqual(response.json()["Error"], "Только для магазинов")
+
+
+class PartnerOrdersTest(TestCase):
+    """Тесты получения заказов магазином."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.buyer = User.objects.create_user(
+            email="buyer@example.com", password="TestPassword123", type="buyer", is_active=True
+        )
+        self.shop_user = User.objects.create_user(
+            email="shop@example.com", password="TestPassword123", type="shop", is_active=True
+        )
+        self.shop = Shop.objects.create(name="Тестовый магазин", user=self.shop_user)
+        category = Category.objects.create(name="Тестовая категория")
+        product = Product.objects.create(name="Тестовый товар", category=category)
+        self.product_info = ProductInfo.objects.create(
+            product=product, shop=self.shop, external_id=1, quantity=10, price=1000, price_rrc=1200
+        )
+        self.contact = Contact.objects.create(user=self.buyer, city="Москва", street="Тверская", phone="123")
+
+    def login(self, email):
+        response = self.client.post(reverse("backend:user-login"), {"email": email, "password": "TestPassword123"})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {response.json()['Token']}")
+
+    def test_order_item_shop_and_partner_orders(self):
+        """Позиция корзины хранит магазин, а оформленный заказ виден магазину."""
+        self.login("buyer@example.com")
+        self.client.post(
+            reverse("backend:basket"), {"items": f'[{{"product_info": {self.product_info.id}, "quantity": 2}}]'}
+        )
+        basket = Order.objects.get(user=self.buyer, state="basket")
+        self.assertEqual(basket.ordered_items.get().shop_id, self.shop.id)
+
+        response = self.client.post(reverse("backend:order"), {"id": str(basket.id), "contact": self.contact.id})
+        self.assertTrue(response.json()["Status"])
+        self.assertTrue(ShopOrder.objects.filter(order=basket, shop=self.shop, state="new").exists())
+
+        self.login("shop@example.com")
+        response = self.client.get(reverse("backend:partner-orders"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([order["id"] for order in response.json()], [basket.id])
+        self.assertEqual(response.json()[0]["total_sum"], 2000)
+
+    def test_order_split_by_shop(self):
+        """Заказ разбивается на части по магазинам, магазин видит и меняет только свою часть."""
+        other_user = User.objects.create_user(
+            email="other@example.com", password="TestPassword123", type="shop", is_active=True
+        )
+        other_shop = Shop.objects.create(name="Другой магазин", user=other_user)
+        other_info = ProductInfo.objects.create(
+            product=self.product_info.product, shop=other_shop, external_id=2, quantity=5, price=500, price_rrc=600
+        )
+
+        self.login("buyer@example.com")
+        self.client.post(
+            reverse("backend:basket"),
+            {
+                "items": f'[{{"product_info": {self.product_info.id}, "quantity": 1}}, '
+                f'{{"product_info": {other_info.id}, "quantity": 3}}]'
+            },
+        )
+        basket = Order.objects.get(user=self.buyer, state="basket")
+        self.client.post(reverse("backend:order"), {"id": str(basket.id), "contact": self.contact.id})
+
+        other_part = ShopOrder.objects.get(order=basket, shop=other_shop)
+        self.assertEqual((other_part.items_count, other_part.total_sum), (1, 1500))
+
+        self.login("shop@example.com")
+        response = self.client.get(reverse("backend:partner-orders"))
+        items = response.json()[0]["ordered_items"]
+        self.assertEqual([item["product_info"]["id"] for item in items], [self.product_info.id])
+
+        own_part = ShopOrder.objects.get(order=basket, shop=self.shop)
+        response = self.client.post(reverse("backend:partner-orders"), {"id": basket.id, "state": "confirmed"})
+        self.assertTrue(response.json()["Status"])
+
+        self.assertEqual(ShopOrder.objects.get(id=own_part.id).state, "confirmed")
+        self.assertEqual(ShopOrder.objects.get(id=other_part.id).state, "new")
+        self.assertEqual(Order.objects.get(id=basket.id).state, "new")
+
+        # сохранение заказа без смены статуса не перезаписывает статусы частей
+        order = Order.objects.get(id=basket.id)
+        order.save()
+        self.assertEqual(ShopOrder.objects.get(id=own_part.id).state, "confirmed")
+
+        # заказ переходит в статус, когда его достигают все части
+        self.login("other@example.com")
+        self.client.post(reverse("backend:partner-orders"), {"id": basket.id, "state": "confirmed"})
+        self.assertEqual(Order.objects.get(id=basket.id).state, "confirmed")
+
+        # статус меняется только вперед
+        self.login("shop@example.com")
+        self.client.post(reverse("backend:partner-orders"), {"id": basket.id, "state": "delivered"})
+        response = self.client.post(reverse("backend:partner-orders"), {"id": basket.id, "state": "confirmed"})
+        self.assertFalse(response.json()["Status"])
+        self.assertEqual(ShopOrder.objects.get(id=own_part.id).state, "delivered")
+        self.assertEqual(Order.objects.get(id=basket.id).state, "confirmed")
+
+        # смена статуса заказа догоняет отстающие части, но не откатывает ушедшие вперед
+        order = Order.objects.get(id=basket.id)
+        order.state = "sent"
+        order.save()
+        self.assertEqual(ShopOrder.objects.get(id=other_part.id).state, "sent")
+        self.assertEqual(ShopOrder.objects.get(id=own_part.id).state, "delivered")
+
+        # действие админки над частью пересчитывает статус заказа
+        ShopOrderAdmin.set_state(ShopOrder.objects.filter(id=other_part.id), "delivered")
+        self.assertEqual(Order.objects.get(id=basket.id).state, "delivered")
+
+    def test_backfill_shop_orders(self):
+        """Команда заполняет магазин позиций и части существующих заказов, корзины пропускаются."""
+        order = Order.objects.create(user=self.buyer, state="confirmed")
+        basket = Order.objects.create(user=self.buyer, state="basket")
+        for target in (order, basket):
+            OrderItem.objects.create(order=target, product_info=self.product_info, quantity=2)
+        OrderItem.objects.update(shop=None)
+        ShopOrder.objects.all().delete()
+
+        call_command("backfill_shop_orders", batch_size=1, stdout=StringIO())
+
+        self.assertFalse(OrderItem.objects.filter(shop__isnull=True).exists())
+        shop_order = ShopOrder.objects.get()
+        self.assertEqual((shop_order.order_id, shop_order.shop_id), (order.id, self.shop.id))
+        self.assertEqual((shop_order.state, shop_order.items_count, shop_order.total_sum), ("confirmed", 1, 2000))
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class IdempotencyTest(TestCase):
+    """Тесты повторных запросов с ключом идемпотентности."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="buyer@example.com", password="TestPassword123", type="buyer", is_active=True
+        )
+        shop = Shop.objects.create(name="Тестовый магазин")
+        product = Product.objects.create(name="Тестовый товар", category=Category.objects.create(name="Категория"))
+        self.product_info = ProductInfo.objects.create(
+            product=product, shop=shop, external_id=1, quantity=10, price=1000, price_rrc=1200
+        )
+        self.contact = Contact.objects.create(user=self.user, city="Москва", street="Тверская", phone="123")
+
+        response = self.client.post(
+            reverse("backend:user-login"), {"email": "buyer@example.com", "password": "TestPassword123"}
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {response.json()['Token']}")
+
+    def test_checkout_retry_is_replayed(self):
+        """Повтор оформления заказа возвращает исходный ответ без повторных сигналов."""
+        self.client.post(
+            reverse("backend:basket"), {"items": f'[{{"product_info": {self.product_info.id}, "quantity": 1}}]'}
+        )
+        basket = Order.objects.get(user=self.user, state="basket")
+        data = {"id": str(basket.id), "contact": self.contact.id}
+
+        with patch("backend.views.new_order.send") as new_order_send:
+            first = self.client.post(reverse("backend:order"), data, HTTP_IDEMPOTENCY_KEY="checkout-1")
+            retry = self.client.post(reverse("backend:order"), data, HTTP_IDEMPOTENCY_KEY="checkout-1")
+
+        self.assertTrue(first.json()["Status"])
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(new_order_send.call_count, 1)
+
+    def test_key_reuse_with_other_payload(self):
+        """Ключ, использованный с другими параметрами, отклоняется."""
+        url = reverse("backend:basket")
+        self.client.post(url, {"items": "[]"}, HTTP_IDEMPOTENCY_KEY="basket-1")
+        response = self.client.post(url, {"items": "[{}]"}, HTTP_IDEMPOTENCY_KEY="basket-1")
+
+        self.assertEqual(response.status_code, 422)
+
+    def test_drf_response_is_rendered_and_replayed(self):
+        """Response DRF рендерится перед сохранением и воспроизводится при повторе."""
+
+        class View(APIView):
+            @idempotent
+            def post(self, request):
+                return Response({"Status": True})
+
+        factory = APIRequestFactory()
+        responses = []
+        for _ in range(2):
+            request = factory.post("/view", {}, HTTP_IDEMPOTENCY_KEY="drf-1")
+            force_authenticate(request, user=self.user)
+            responses.append(View.as_view()(request))
+
+        self.assertEqual(responses[0].data, {"Status": True})
+        self.assertEqual(ujson.loads(responses[1].content), {"Status": True})
+        self.assertEqual(responses[1]["Idempotent-Replayed"], "true")
+
+    def test_concurrent_request_finished_is_replayed(self):
+        """Если параллельный запрос занял ключ и завершился, возвращается его ответ, а не 409."""
+        url = reverse("backend:basket")
+        first = self.client.post(url, {"items": "[]"}, HTTP_IDEMPOTENCY_KEY="basket-2")
+        original_get = cache.get
+        calls = []
+
+        def get(key, *args, **kwargs):
+            # первое чтение происходит до того, как параллельный запрос сохранил ответ
+            calls.append(key)
+            return None if len(calls) == 1 else original_get(key, *args, **kwargs)
+
+        with patch("backend.idempotency.cache.get", side_effect=get):
+            retry = self.client.post(url, {"items": "[]"}, HTTP_IDEMPOTENCY_KEY="basket-2")
+
+        self.assertEqual(retry.status_code, first.status_code)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+
+    def test_cache_unavailable_runs_view(self):
+        """Недоступный кэш не ломает запрос: он выполняется без дедупликации."""
+        url = reverse("backend:basket")
+        with patch("backend.idempotency.cache.get", side_effect=redis.ConnectionError("down")):
+            response = self.client.post(url, {"items": "[]"}, HTTP_IDEMPOTENCY_KEY="basket-3")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("Idempotent-Replayed", response)
+
+
+class OutboxTest(TestCase):
+    """Тесты записи уведомлений в outbox и их передачи в брокер."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="buyer@example.com", password="TestPassword123", type="buyer", is_active=True
+        )
+        shop_user = User.objects.create_user(
+            email="shop@example.com", password="TestPassword123", type="shop", is_active=True
+        )
+        shop = Shop.objects.create(name="Тестовый магазин", user=shop_user)
+        product = Product.objects.create(name="Тестовый товар", category=Category.objects.create(name="Категория"))
+        self.product_info = ProductInfo.objects.create(
+            product=product, shop=shop, external_id=1, quantity=10, price=1000, price_rrc=1200
+        )
+        self.contact = Contact.objects.create(user=self.user, city="Москва", street="Тверская", phone="123")
+
+        response = self.client.post(
+            reverse("backend:user-login"), {"email": "buyer@example.com", "password": "TestPassword123"}
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {response.json()['Token']}")
+
+    def test_checkout_writes_outbox_once(self):
+        """Оформление заказа пишет уведомления в outbox, накладная ставится один раз."""
+        self.client.post(
+            reverse("backend:basket"), {"items": f'[{{"product_info": {self.product_info.id}, "quantity": 1}}]'}
+        )
+        order = Order.objects.get(user=self.user, state="basket")
+        self.client.post(reverse("backend:order"), {"id": str(order.id), "contact": self.contact.id})
+
+        # сохранение заказа в статусе 'new' (как из админки) не ставит накладную повторно
+        order.refresh_from_db()
+        order.save()
+
+        messages = OutboxMessage.objects.filter(sent_at__isnull=True)
+        self.assertEqual(messages.filter(task="backend.tasks.send_invoice_to_admin").count(), 1)
+        self.assertEqual(messages.filter(task="backend.tasks.send_email").count(), 2)
+
+        with patch("backend.tasks.current_app") as app:
+            self.assertEqual(relay_outbox(), 3)
+
+        # два письма уходят одной задачей send_email_batch
+        self.assertEqual(app.send_task.call_count, 2)
+        self.assertFalse(OutboxMessage.objects.filter(sent_at__isnull=True).exists())
+
+
+class EmailDeliveryTest(TestCase):
+    """Тесты пакетной отправки писем через соединение процесса."""
+
+    def tearDown(self):
+        mail.close_connection()
+
+    @override_settings(EMAIL_RATE_LIMIT=0)
+    def test_batch_reuses_connection(self):
+        """Пачка писем отправляется через одно соединение, которое переиспользуется."""
+        messages = [{"subject": f"Тема {i}", "message": "Текст", "recipient_list": ["a@example.com"]} for i in range(3)]
+
+        self.assertEqual(send_email_batch(messages), 3)
+        connection = mail._connection
+        self.assertTrue(send_email(subject="Тема", message="Текст", recipient_list=["b@example.com"]))
+
+        self.assertIs(mail._connection, connection)
+        self.assertEqual(len(django_mail.outbox), 4)
+
+    def test_soft_time_limit_not_swallowed(self):
+        """Истечение времени задачи не превращается в ошибку отправки."""
+        connection = Mock()
+        connection.send_messages.side_effect = SoftTimeLimitExceeded()
+
+        with patch("backend.mail._get_connection", return_value=connection), self.assertRaises(SoftTimeLimitExceeded):
+            send_email(subject="Тема", message="Текст", recipient_list=["a@example.com"])
+
+
+class InvoiceRenderingTest(TestCase):
+    """Тесты формирования накладных."""
+
+    def setUp(self):
+        buyer = User.objects.create_user(email="buyer@example.com", password="TestPassword123", is_active=True)
+        shop = Shop.objects.create(name="Тестовый магазин")
+        product = Product.objects.create(name="Тестовый товар", category=Category.objects.create(name="Категория"))
+        product_info = ProductInfo.objects.create(
+            product=product, shop=shop, external_id=1, quantity=10, price=1000, price_rrc=1200
+        )
+        self.orders = [Order.objects.create(user=buyer, state="new") for _ in range(3)]
+        for order in self.orders:
+            OrderItem.objects.create(order=order, product_info=product_info, quantity=2)
+
+    def test_invoices_for_many_orders_in_two_queries(self):
+        """Накладные по нескольким заказам формируются фиксированным числом запросов."""
+        with self.assertNumQueries(2):
+            messages = build_invoice_messages([order.id for order in self.orders])
+
+        self.assertEqual(set(messages), {order.id for order in self.orders})
+        html = messages[self.orders[0].id].alternatives[0][0]
+        self.assertIn("2000 руб.", html)
+
+    def test_retry_sends_only_unsent_invoices(self):
+        """После разрыва соединения задача повторяется только для неотправленных накладных."""
+        order_ids = [order.id for order in self.orders]
+        error = mail.SendError(unsent=[None, None], sent=1)
+        error.__cause__ = SMTPServerDisconnected()
+        batches = []
+
+        def send_messages(messages):
+            batches.append([message.subject for message in messages])
+            if len(batches) == 1:
+                raise error
+            return len(messages)
+
+        with patch("backend.tasks.mail.send_messages", side_effect=send_messages), patch(
+            "backend.tasks._retry_countdown", return_value=0
+        ):
+            send_invoices_to_admin.apply(kwargs={"order_ids": order_ids})
+
+        self.assertEqual(len(batches), 2)
+        self.assertEqual(batches[1], batches[0][1:])
+
+    @override_settings(ADMIN_INVOICE_DIGEST=True)
+    def test_digest_collects_pending_invoices(self):
+        """В режиме дайджеста накладные уходят одним письмом с вложениями."""
+        for order in self.orders:
+            enqueue(send_invoice_to_admin, dedup_key=f"invoice:{order.id}", order_id=order.id)
+
+        with patch("backend.tasks.current_app") as app:
+            relay_outbox()
+        app.send_task.assert_not_called()
+
+        self.assertEqual(send_invoice_digest(), 3)
+
+        self.assertEqual(len(django_mail.outbox), 1)
+        self.assertEqual(len(django_mail.outbox[0].attachments), 3)
+        self.assertFalse(OutboxMessage.objects.filter(sent_at__isnull=True).exists())
+
+    @override_settings(ADMIN_INVOICE_DIGEST=True)
+    def test_digest_claims_rows_before_sending(self):
+        """Накладные отмечаются взятыми до отправки, при ошибке отметка снимается."""
+        for order in self.orders:
+            enqueue(send_invoice_to_admin, dedup_key=f"invoice:{order.id}", order_id=order.id)
+        claimed = []
+
+        def send_messages(messages):
+            claimed.append(OutboxMessage.objects.filter(claimed_at__isnull=False).count())
+            raise mail.SendError(messages, 0) from SMTPServerDisconnected()
+
+        with patch("backend.tasks.mail.send_messages", side_effect=send_messages), self.assertRaises(mail.SendError):
+            send_invoice_digest()
+
+        self.assertEqual(claimed, [3])
+        self.assertFalse(OutboxMessage.objects.filter(claimed_at__isnull=False).exists())
+        self.assertEqual(send_invoice_digest(), 3)
+
+
+class ThrottlingTest(TestCase):
+    """Тесты ограничения частоты запросов."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.calls = {}
+
+    def fake_script(self, keys, args):
+        """Упрощенная замена Lua скрипта: ведро без пополнения."""
+        self.calls[keys[0]] = self.calls.get(keys[0], 0) + 1
+        return [1, "0"] if self.calls[keys[0]] <= args[0] else [0, "30"]
+
+    @override_settings(THROTTLE_ENABLED=True)
+    def test_login_endpoint_budget(self):
+        """Endpoint входа ограничен своим лимитом, общий каталог - нет."""
+        url = reverse("backend:user-login")
+        rates = {"ip": "100/min", "user": "100/min", "login": "2/min"}
+
+        with patch("backend.throttling._get_script", return_value=self.fake_script), patch(
+            "rest_framework.settings.api_settings.DEFAULT_THROTTLE_RATES", rates
+        ):
+            statuses = [self.client.post(url, {}).status_code for _ in range(3)]
+            catalog_status = self.client.get(reverse("backend:categories")).status_code
+
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(catalog_status, 200)
+        self.assertIn("throttle:login:ip:127.0.0.1", self.calls)
+
+    @override_settings(THROTTLE_ENABLED=True)
+    def test_forwarded_for_ignored_without_proxies(self):
+        """Без доверенных прокси подмена X-Forwarded-For не дает нового ведра."""
+        url = reverse("backend:user-login")
+        rates = {"ip": "100/min", "user": "100/min", "login": "2/min"}
+
+        with patch("backend.throttling._get_script", return_value=self.fake_script), patch(
+            "rest_framework.settings.api_settings.DEFAULT_THROTTLE_RATES", rates
+        ):
+            statuses = [
+                self.client.post(url, {}, HTTP_X_FORWARDED_FOR=f"10.0.0.{number}").status_code for number in range(3)
+            ]
+
+        self.assertEqual(statuses, [200, 200, 429])
+
+    def test_ident_key_required(self):
+        """Ограничение без get_ident_key - ошибка конфигурации, а не отключенный лимит."""
+        with self.assertRaises(ImproperlyConfigured):
+            TokenBucketThrottle().get_ident_key(None, None)
+
+    @override_settings(THROTTLE_ENABLED=True, THROTTLE_REDIS_URL="redis://127.0.0.1:1/0")
+    def test_redis_unavailable_fails_open(self):
+        """Если Redis недоступен, запросы не блокируются."""
+        with patch("backend.throttling._script", None), patch("backend.throttling._unavailable_until", 0.0):
+            response = self.client.get(reverse("backend:categories"))
+
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class CachedTokenAuthenticationTest(TestCase):
+    """Тесты аутентификации по токену с кэшированием пользователя."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="auth@example.com", password="TestPassword123", is_active=True)
+        self.token = Token.objects.create(user=self.user)
+        self.auth = CachedTokenAuthentication()
+        local_cache.clear()
+
+    def test_cached_user_without_queries(self):
+        """Повторная аутентификация не обращается к БД."""
+        self.auth.authenticate_credentials(self.token.key)
+        local_cache.clear()
+
+        with self.assertNumQueries(0):
+            user, _ = self.auth.authenticate_credentials(self.token.key)
+
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.email, "auth@example.com")
+
+    def test_invalidated_on_deactivation_and_logout(self):
+        """Деактивация пользователя и удаление токена сбрасывают кэш."""
+        self.auth.authenticate_credentials(self.token.key)
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+        self.user.is_active = True
+        self.user.save()
+        self.auth.authenticate_credentials(self.token.key)
+        self.token.delete()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def test_invalidated_again_on_commit(self):
+        """Снимок, закэшированный до фиксации деактивации, сбрасывается после нее."""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+            # параллельный запрос успел прочитать пользователя до фиксации
+            local_cache.set(self.token.key, {"is_active": True})
+
+        self.assertIsNone(local_cache.get(self.token.key))
+
+    def test_password_change_keeps_other_fields(self):
+        """Смена пароля через API сохраняет поля, которых нет в снимке."""
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        date_joined = self.user.date_joined
+
+        response = client.post(reverse("backend:user-details"), {"password": "NewPassword456"})
+
+        self.assertTrue(response.json()["Status"])
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password("NewPassword456"))
+        self.assertEqual(self.user.date_joined, date_joined)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class AsyncViewsTest(TestCase):
+    """Тесты асинхронных версий views для чтения."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email="buyer@example.com", password="TestPassword123", is_active=True)
+        self.token = Token.objects.create(user=self.user)
+
+        shop_user = User.objects.create_user(email="shop@example.com", password="TestPassword123", type="shop")
+        shop = Shop.objects.create(name="Тестовый магазин", user=shop_user)
+        category = Category.objects.create(name="Тестовая категория")
+        product = Product.objects.create(name="Тестовый товар", category=category)
+        product_info = ProductInfo.objects.create(
+            product=product, shop=shop, external_id=1, quantity=10, price=1000, price_rrc=1200
+        )
+        order = Order.objects.create(user=self.user, state="basket")
+        OrderItem.objects.create(order=order, product_info=product_info, quantity=2)
+
+    def test_catalog_matches_sync_views(self):
+        """Асинхронный каталог возвращает то же, что синхронный."""
+        for endpoint in ("categories", "shops", "products"):
+            sync_data = self.client.get(f"/api/v1/{endpoint}").json()
+            async_response = self.client.get(f"/api/v1/async/{endpoint}")
+
+            self.assertEqual(async_response.status_code, status.HTTP_200_OK)
+            self.assertEqual(async_response.json(), sync_data)
+
+    def test_basket_requires_token(self):
+        """Корзина доступна по токену и совпадает с синхронной."""
+        self.assertEqual(self.client.get(reverse("backend:async-basket")).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        response = self.client.get(reverse("backend:async-basket"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), self.client.get(reverse("backend:basket")).json())
+        self.assertEqual(response.json()[0]["total_sum"], 2000)
+
+
+class GunicornConfigTest(TestCase):
+    """Тесты подбора числа worker'ов gunicorn."""
+
+    def test_worker_count_limited_by_cpu_and_memory(self):
+        """Worker'ов 2 * ядра + 1, но не больше, чем помещается в память."""
+        from netology_pd_diplom.gunicorn_conf import WORKER_MEMORY, worker_count
+
+        self.assertEqual(worker_count(4), 9)
+        self.assertEqual(worker_count(4, memory=3 * WORKER_MEMORY), 3)
+        self.assertEqual(worker_count(1, memory=WORKER_MEMORY // 2), 1)
+
+
+class DatabaseConnectionTest(TestCase):
+    """Тесты статистики соединений с БД."""
+
+    def test_pool_stats_without_pool(self):
+        """Без пула возвращается состояние постоянного соединения."""
+        User.objects.exists()
+
+        stats = pool_stats()
+
+        self.assertFalse(stats["pool"])
+        self.assertTrue(stats["connected"])
+
+    def test_pool_metrics(self):
+        """Состояние соединений отдается метриками Prometheus."""
+        User.objects.exists()
+
+        value = REGISTRY.get_sample_value("db_connected", {"alias": "default", "pid": str(os.getpid())})
+
+        self.assertEqual(value, 1)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+@patch("backend.db.replica_aliases", return_value=["replica_1"])
+class ReplicaRoutingTest(TestCase):
+    """Тесты чтения с реплик."""
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.user = User.objects.create_user(email="buyer@example.com", password="TestPassword123", is_active=True)
+        self.token = Token.objects.create(user=self.user)
+
+    def test_reads_go_to_replica_only_when_enabled(self, replicas):
+        """Чтение на реплику только внутри replica_reads() и вне транзакции, запись - всегда в default."""
+        self.assertIsNone(self.router.db_for_read(Product))
+        with replica_reads():
+            # TestCase выполняется в транзакции
+            self.assertIsNone(self.router.db_for_read(Product))
+            with patch("backend.db.connections", {"default": SimpleNamespace(in_atomic_block=False)}):
+                self.assertEqual(self.router.db_for_read(Product), "replica_1")
+            self.assertEqual(self.router.db_for_write(Product), "default")
+
+    def test_client_pinned_to_primary_after_write(self, replicas):
+        """После изменения корзины клиент читает с основной базы."""
+        request = RequestFactory().get("/api/v1/products", HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self.assertTrue(use_replica(request))
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        client.post(reverse("backend:basket"), {"items": "[]"})
+
+        self.assertFalse(use_replica(request))
+
+
+class InstrumentationTest(TestCase):
+    """Тесты измерения запросов."""
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=1.0)
+    def test_sampled_request_reports_sql_serialization_and_render(self):
+        """Измеренный запрос получает Server-Timing и запись в лог."""
+        Category.objects.create(name="Тестовая категория")
+
+        with self.assertLogs("backend.instrumentation", "INFO") as logs:
+            response = APIClient().get(reverse("backend:categories"))
+
+        self.assertIn("queries", response["Server-Timing"])
+        record = ujson.loads(logs.records[-1].getMessage())
+        self.assertEqual(record["view"], "backend:categories")
+        self.assertEqual(record["sql_count"], 2)
+        self.assertGreater(record["serialization_ms"], 0)
+        self.assertGreater(record["render_ms"], 0)
+        self.assertIn("serialization;dur=", response["Server-Timing"])
+
+    def test_not_sampled_request_untouched(self):
+        """Без выборки заголовок не добавляется."""
+        response = APIClient().get(reverse("backend:categories"))
+
+        self.assertNotIn("Server-Timing", response)
+
+    def test_cache_hits_and_misses(self):
+        """Попадания и промахи кэша считаются для текущих счетчиков."""
+
+        class Cache(CacheStatsMixin, LocMemCache):
+            pass
+
+        cache = Cache("instrumentation-test", {})
+        cache.set("a", 1)
+        stats = Stats()
+        token = _current.set(stats)
+        try:
+            cache.get("a")
+            cache.get("b")
+            cache.get_many(["a", "b"])
+        finally:
+            _current.reset(token)
+
+        self.assertEqual((stats.cache_hits, stats.cache_misses), (2, 2))
+
+
+class MetricsTest(TestCase):
+    """Тесты метрик Prometheus."""
+
+    def test_metrics_endpoint_counts_requests(self):
+        """Запросы к API учитываются по имени view."""
+        client = APIClient()
+        client.get(reverse("backend:categories"))
+
+        response = client.get(reverse("metrics"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        sample = 'http_requests_total{method="GET",status="200",view="backend:categories"}'
+        self.assertIn(sample, response.content.decode())
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics_token_required(self):
+        """С внешнего адреса метрики доступны только по токену."""
+        client = APIClient(REMOTE_ADDR="203.0.113.5")
+
+        self.assertEqual(client.get(reverse("metrics")).status_code, status.HTTP_403_FORBIDDEN)
+        client.credentials(HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(client.get(reverse("metrics")).status_code, status.HTTP_200_OK)
+
+    def test_metrics_closed_without_token(self):
+        """Без METRICS_TOKEN метрики доступны только из разрешенных сетей."""
+        self.assertEqual(
+            APIClient(REMOTE_ADDR="203.0.113.5").get(reverse("metrics")).status_code, status.HTTP_403_FORBIDDEN
+        )
+        with override_settings(METRICS_ALLOWED_NETWORKS=["203.0.113.0/24"]):
+            self.assertEqual(
+                APIClient(REMOTE_ADDR="203.0.113.5").get(reverse("metrics")).status_code, status.HTTP_200_OK
+            )
+
+    def test_email_failure_counted(self):
+        """Окончательная ошибка отправки письма учитывается в метрике, а не печатается."""
+
+        def fail(messages):
+            raise mail.SendError(messages, 0) from ValueError("bad address")
+
+        labels = {"kind": "email", "retrying": "false"}
+        before = REGISTRY.get_sample_value("email_failures_total", labels) or 0
+        with patch("backend.mail.send_messages", side_effect=fail), self.assertLogs("backend.tasks", "ERROR"):
+            self.assertFalse(send_email(subject="Тема", message="Текст", recipient_list=["a@example.com"]))
+
+        self.assertEqual(REGISTRY.get_sample_value("email_failures_total", labels), before + 1)
+
+
+class ProfilingTest(TestCase):
+    """Тесты профилирования запросов."""
+
+    def setUp(self):
+        self.profiles_dir = temp_dir(self)
+        profiling._toggle = (None, 0.0)
+
+    def tearDown(self):
+        profiling.disable()
+        profiling._toggle = (None, 0.0)
+
+    def test_signed_header_profiles_request(self):
+        """Запрос с подписанным X-Profile профилируется, с неверным - нет."""
+        client = APIClient()
+
+        with override_settings(PROFILING_DIR=self.profiles_dir, PROFILING_INTERVAL_MS=1):
+            response = client.get(reverse("backend:categories"), HTTP_X_PROFILE=profiling.make_token())
+            unsigned = client.get(reverse("backend:categories"), HTTP_X_PROFILE="profile:forged")
+
+        self.assertIn("X-Profile-Samples", response)
+        self.assertNotIn("X-Profile-Samples", unsigned)
+        self.assertTrue((Path(self.profiles_dir) / "backend_categories.folded").is_file())
+
+    @override_settings(PROFILING_MAX_PER_MINUTE=0)
+    def test_overhead_cap(self):
+        """Сверх лимита запросы не профилируются."""
+        response = APIClient().get(reverse("backend:categories"), HTTP_X_PROFILE=profiling.make_token())
+
+        self.assertNotIn("X-Profile-Samples", response)
+
+    def test_admin_toggle_staff_only(self):
+        """Включить профилирование view может только staff пользователь."""
+        data = {"action": "enable", "view_name": "backend:categories", "rate": "1", "minutes": "5"}
+        user = User.objects.create_user(email="staff@example.com", password="Pass12345!", is_active=True)
+        self.client.force_login(user)
+        self.client.post(reverse("profiling"), data)
+        self.assertIsNone(profiling.get_toggle())
+
+        user.is_staff = True
+        user.save()
+        self.client.post(reverse("profiling"), data)
+        profiling._toggle = (None, 0.0)
+
+        with override_settings(PROFILING_DIR=self.profiles_dir):
+            response = APIClient().get(reverse("backend:categories"))
+        self.assertIn("X-Profile-Samples", response)
+
+
+class SyntheticDataTest(TestCase):
+    """Тесты генератора синтетических данных."""
+
+    def test_generate_database_and_yaml(self):
+        """Данные загружаются в БД, прайсы YAML совпадают для одного seed."""
+        options = {"shops": 2, "categories": 3, "products": 50, "users": 5, "orders": 20, "stdout": StringIO()}
+        feeds = temp_dir(self)
+        call_command("generate_synthetic_data", yaml_dir=feeds, **options)
+
+        self.assertEqual(Shop.objects.count(), 2)
+        self.assertEqual(Product.objects.count(), 50)
+        self.assertEqual(Order.objects.exclude(state="basket").count(), 20)
+        items = OrderItem.objects.exclude(order__state="basket").count()
+        self.assertEqual(sum(ShopOrder.objects.values_list("items_count", flat=True)), items)
+        feed = Path(feeds) / "shop_1_0.yaml"
+        goods = load_yaml(feed.read_text(), Loader=Loader)["goods"]
+        shop = Shop.objects.get(name__startswith="Синтетический магазин 0")
+        self.assertEqual(len(goods), ProductInfo.objects.filter(shop=shop).count())
+
+        again = temp_dir(self)
+        call_command("generate_synthetic_data", yaml_dir=again, no_db=True, **options)
+        self.assertEqual(
+            load_yaml((Path(again) / "shop_1_0.yaml").read_text(), Loader=Loader)["goods"][0]["parameters"],
+            goods[0]["parameters"],
+        )
+
+
+class LoadTestScenarioTest(LiveServerTestCase):
+    """Тесты сценариев нагрузочного теста против запущенного сервера."""
+
+    def test_percentile_and_mix(self):
+        """Процентили по ближайшему рангу и распределение пользователей по сценариям."""
+        values = list(range(1, 101))
+
+        self.assertEqual((percentile(values, 50), percentile(values, 99)), (50, 99))
+        self.assertEqual(assign_scenarios(10, {"buyer": 0.9, "partner": 0.1}).count("partner"), 1)
+
+    def test_buyer_and_partner_flows(self):
+        """Сценарии покупателя и магазина выполняются без ошибок."""
+        call_command(
+            "generate_synthetic_data", shops=1, categories=2, products=20, users=2, orders=5, stdout=StringIO()
+        )
+        options = {
+            "url": f"{self.live_server_url}/api/v1",
+            "users": 2,
+            "duration": 60,
+            "iterations": 2,
+            "ramp_up": 0,
+            "mix": "buyer=1,partner=1",
+            "think": 0,
+            "rate": None,
+            "timeout": 10,
+            "password": "Pass12345!",
+            "buyer_email": "synthetic-buyer{n}-s1@example.com",
+            "buyer_accounts": 2,
+            "partner_email": "synthetic-shop{n}-s1@example.com",
+            "partner_accounts": 1,
+            "feed_url": None,
+        }
+
+        summary = Runner(options).run().summary()
+
+        self.assertEqual(summary["POST /order"]["requests"], 2)
+        self.assertEqual(summary["GET /partner/orders"]["requests"], 2)
+        self.assertEqual(summary["ИТОГО"]["error_rate"], 0)
+
+
+class SlowQueryTest(TestCase):
+    """Тесты записи медленных запросов."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="buyer@example.com", password="TestPassword123", is_active=True)
+        Order.objects.create(user=self.user, state="basket")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @override_settings(SLOW_QUERY_MS=1e-9, SLOW_QUERY_EXPLAIN_PER_MINUTE=100)
+    def test_slow_query_logged_with_origin_and_plan(self):
+        """Медленный запрос пишется с view, местом вызова и планом."""
+        with self.assertLogs("backend.slow_queries", "WARNING") as logs:
+            self.client.get(reverse("backend:basket"))
+
+        records = [ujson.loads(record.getMessage()) for record in logs.records]
+        basket = [record for record in records if "backend_order" in record["sql"]][0]
+        self.assertEqual(basket["origin"], "view backend:basket")
+        self.assertTrue(basket["call_site"].startswith("backend/views.py"))
+        self.assertIn("backend_order", basket["plan"])
+
+    def test_locking_select_not_analyzed(self):
+        """SELECT ... FOR UPDATE не выполняется повторно через EXPLAIN ANALYZE."""
+        with patch("backend.slow_queries.explain_prefix", return_value="EXPLAIN") as prefix:
+            slow_queries.explain(connection, "SELECT id FROM backend_order", [])
+            slow_queries.explain(connection, "SELECT id FROM backend_order FOR UPDATE SKIP LOCKED", [])
+
+        self.assertEqual([call.kwargs["analyze"] for call in prefix.call_args_list], [True, False])
+
+    def test_explain_hot_paths(self):
+        """Команда выводит планы всех запросов горячего пути."""
+        output = StringIO()
+
+        call_command("explain_hot_paths", path=["basket"], stdout=output)
+
+        self.assertIn(f"basket({{'user_id': {self.user.id}}}): 2 запросов", output.getvalue())
+        self.assertIn("backend_order", output.getvalue().split("\n", 3)[3])
+
+
+class CatalogIndexesTest(TestCase):
+    """Тесты индексов и уникальных ограничений каталога."""
+
+    def test_indexes_created(self):
+        """Индексы горячих поисков есть в базе."""
+        with connection.cursor() as cursor:
+            names = {
+                name
+                for model in (Product, Parameter, Order, ProductInfo)
+                for name in connection.introspection.get_constraints(cursor, model._meta.db_table)
+            }
+
+        for name in ("unique_product_name_category", "order_user_state_idx", "product_info_shop_external_idx"):
+            self.assertIn(name, names)
+        category = Category.objects.create(name="Смартфоны")
+        Product.objects.create(name="Телефон", category=category)
+        Parameter.objects.create(name="Цвет")
+        with self.assertRaises(IntegrityError):
+            Parameter.objects.create(name="Цвет")
+
+    def test_concurrent_migration_operations(self):
+        """Индексы существующих таблиц выносятся в конкурентную миграцию, индексы новых таблиц - нет."""
+        operations = [
+            migrations.CreateModel("Report", fields=[("id", models.AutoField(primary_key=True))]),
+            migrations.AddIndex("report", models.Index(fields=["id"], name="report_idx")),
+            migrations.AddIndex("order", models.Index(fields=["user", "state"], name="order_user_state_idx")),
+            migrations.AddConstraint(
+                "parameter", models.UniqueConstraint(fields=["name"], name="unique_parameter_name")
+            ),
+        ]
+
+        regular, concurrent = split_operations(operations)
+
+        self.assertEqual(regular, operations[:2])
+        self.assertIsInstance(concurrent[0], AddIndexConcurrently)
+        self.assertIn("CREATE UNIQUE INDEX CONCURRENTLY", concurrent[1].database_operations[0].sql[0])
+        self.assertEqual(concurrent[1].state_operations, operations[3:])
+
+    def test_concurrent_migration_non_atomic_and_duplicates(self):
+        """Конкурентная миграция записывается с atomic = False, дубликаты останавливают команду."""
+        category = Category.objects.create(name="Смартфоны")
+        for name in ("Телефон", "Телефон", "Чехол"):
+            Product.objects.create(name=name, category=Category.objects.create(name=f"{name} {category.id}"))
+        constraint = models.UniqueConstraint(fields=["name"], name="unique_product_name")
+        _, concurrent = split_operations([migrations.AddConstraint("product", constraint)])
+        migration = Command.concurrent_migration([SimpleNamespace(name="0001_initial")], None, concurrent, None)
+
+        source = NonAtomicMigrationWriter(migration).as_string()
+        _, duplicates = find_duplicates(concurrent[0])
+
+        self.assertTrue(NonAtomicMigrationWriter.is_non_atomic(source))
+        self.assertEqual(duplicates, [{"name": "Телефон", "rows": 2}])
+        with self.assertRaisesMessage(CommandError, "unique_product_name: name='Телефон' (2 строк)"):
+            Command.check_duplicates(concurrent)
+
+    def test_bench_indexes(self):
+        """Бенчмарк замеряет все поиски, для которых есть данные."""
+        user = User.objects.create_user(email="buyer@example.com", password="TestPassword123", is_active=True)
+        Order.objects.create(user=user, state="basket")
+        output = StringIO()
+
+        call_command("bench_indexes", count=10, stdout=output)
+
+        self.assertIn("basket", output.getvalue())
+        self.assertIn("product: нет данных, пропущен", output.getvalue())
+
+
+class DimensionCacheTest(TestCase):
+    """Тесты кэша справочников."""
+
+    def setUp(self):
+        for dimension in dimensions.DIMENSIONS.values():
+            dimension.invalidate()
+        self.category = Category.objects.create(name="Смартфоны")
+        self.parameter = Parameter.objects.create(name="Цвет")
+
+    def test_lookups_cached_and_invalidated(self):
+        """Повторный поиск без запросов, изменение записи сбрасывает кэш."""
+        self.assertEqual(dimensions.categories.label(self.category.id), "Смартфоны")
+        self.assertEqual(dimensions.parameters.id_for("Цвет"), self.parameter.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(dimensions.categories.label(self.category.id), "Смартфоны")
+            self.assertEqual(dimensions.parameters.get_or_create_id("Цвет"), self.parameter.id)
+
+        self.category.name = "Телефоны"
+        self.category.save()
+        self.assertEqual(dimensions.categories.label(self.category.id), "Телефоны")
+
+        # сообщение о новой версии из Redis
+        dimensions.parameters.apply_version(dimensions.parameters.version + 1)
+        with self.assertNumQueries(1):
+            self.assertEqual(dimensions.parameters.label(self.parameter.id), "Цвет")
+
+    def test_shop_state_resets_active_shops(self):
+        """Отключение магазина убирает его из активных без ожидания TTL."""
+        user = User.objects.create_user(email="shop@example.com", password="TestPassword123", type="shop")
+        shop = Shop.objects.create(name="Магазин", user=user)
+        self.assertIn(shop.id, dimensions.shops.ids(state=True))
+        client = APIClient()
+        client.force_authenticate(user)
+
+        client.post(reverse("backend:partner-state"), {"state": "false"})
+
+        self.assertNotIn(shop.id, dimensions.shops.ids(state=True))
+
+
+class AdminTest(TestCase):
+    """Тесты админки."""
+
+    def test_user_changelist(self):
+        """Пользователи доступны в админке."""
+        admin_user = User.objects.create_superuser(email="admin@example.com", password="TestPassword123")
+        self.client.force_login(admin_user)
+
+        response = self.client.get("/admin/backend/user/")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertContains(response, "admin@example.com")
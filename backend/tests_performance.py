@@ -0,0 +1,321 @@
+"""
+Тесты производительности: бюджеты SQL запросов и сравнение времени с базовой линией.
+
+Данные генерируются один раз на класс (``generate_catalog``, ``generate_orders``),
+объем умножается на ``PERF_SCALE``. Бюджеты запросов не зависят от объема:
+превышение означает N+1.
+
+Время импорта и сериализации сравнивается с backend/perf_baseline.json:
+тест падает, если операция медленнее базовой больше чем в ``PERF_TOLERANCE`` раз.
+Замеры времени зависят от машины, поэтому по умолчанию пропускаются: их включает
+``PERF_TIMING=True`` (или ``PERF_UPDATE_BASELINE``/``PERF_REPORT``).
+``PERF_UPDATE_BASELINE=True`` перезаписывает базовую линию текущими значениями,
+``PERF_REPORT=<файл>`` сохраняет отчет сравнения в JSON.
+
+Usage:
+    python manage.py test backend.tests_performance
+    PERF_TIMING=True python manage.py test backend.tests_performance --tag perf
+    PERF_SCALE=5 PERF_REPORT=perf.json python manage.py test backend.tests_performance --tag perf
+"""
+
+import random
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings, tag
+from django.urls import reverse
+
+import ujson
+from decouple import config
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from yaml import dump
+
+from backend import querysets
+from backend.models import (
+    Category,
+    Contact,
+    Order,
+    OrderItem,
+    Parameter,
+    Product,
+    ProductInfo,
+    ProductParameter,
+    Shop,
+    ShopOrder,
+)
+from backend.serializers import OrderSerializer, ProductInfoSerializer
+from backend.tasks import do_import
+
+User = get_user_model()
+
+SCALE = config("PERF_SCALE", default=1.0, cast=float)
+TOLERANCE = config("PERF_TOLERANCE", default=3.0, cast=float)
+UPDATE_BASELINE = config("PERF_UPDATE_BASELINE", default=False, cast=bool)
+REPORT = config("PERF_REPORT", default="")
+# Сравнение времени с базовой линией (TimingRegressionTest)
+TIMING = config("PERF_TIMING", default=UPDATE_BASELINE or bool(REPORT), cast=bool)
+BASELINE = Path(__file__).with_name("perf_baseline.json")
+
+# Число SQL запросов на endpoint при любом объеме данных
+QUERY_BUDGETS = {
+    "categories": 2,
+    "shops": 2,
+    "products": 2,
+    "basket": 5,
+    "orders": 5,
+    "partner_orders": 4,
+    "partner_export": 4,
+}
+
+# Число SQL запросов на страницу списка админки (сессия и пользователь включены)
+ADMIN_QUERY_BUDGETS = {
+    "shop": 5,
+    "category": 5,
+    "product": 5,
+    "productinfo": 6,
+    "parameter": 5,
+    "order": 6,
+    "shoporder": 7,
+    "contact": 6,
+    "user": 5,
+}
+
+
+def generate_catalog(shops=3, products=1000, parameters=20, parameters_per_product=5, categories=10, seed=0):
+    """
+    Каталог: магазины, категории, товары с предложениями магазинов и параметрами.
+
+    Каждый товар предлагается всеми магазинами, поэтому предложений
+    ``shops * products``, значений параметров - ``shops * products * parameters_per_product``.
+
+    Returns:
+        list: Созданные магазины
+    """
+    rnd = random.Random(seed)
+    shop_list = []
+    for number in range(shops):
+        user = User.objects.create_user(
+            email=f"perf-shop{number}@example.com", password="Pass12345!", type="shop", is_active=True
+        )
+        shop_list.append(Shop.objects.create(name=f"Магазин {number}", user=user))
+
+    category_list = Category.objects.bulk_create(Category(name=f"Категория {number}") for number in range(categories))
+    for category in category_list:
+        category.shops.set(shop_list)
+    parameter_list = Parameter.objects.bulk_create(Parameter(name=f"Параметр {number}") for number in range(parameters))
+    product_list = Product.objects.bulk_create(
+        Product(name=f"Товар {number}", category=category_list[number % categories]) for number in range(products)
+    )
+    infos = ProductInfo.objects.bulk_create(
+        ProductInfo(
+            product=product,
+            shop=shop,
+            external_id=number,
+            model=f"model-{number}",
+            price=rnd.randint(100, 100000),
+            price_rrc=rnd.randint(100, 100000),
+            quantity=rnd.randint(1, 100),
+        )
+        for shop in shop_list
+        for number, product in enumerate(product_list)
+    )
+    ProductParameter.objects.bulk_create(
+        ProductParameter(product_info=info, parameter=parameter, value=str(rnd.randint(1, 1000)))
+        for info in infos
+        for parameter in rnd.sample(parameter_list, parameters_per_product)
+    )
+    return shop_list
+
+
+def generate_orders(user, count=100, items_per_order=5, seed=0):
+    """
+    Оформленные заказы пользователя и корзина со случайными предложениями каталога.
+
+    Returns:
+        list: Созданные заказы, первый - корзина
+    """
+    rnd = random.Random(seed)
+    infos = list(ProductInfo.objects.only("id", "shop_id", "price"))
+    contact = Contact.objects.create(user=user, city="Москва", street="Тверская", phone="+79990000000")
+    orders = Order.objects.bulk_create(
+        Order(user=user, state="basket" if number == 0 else "new", contact=None if number == 0 else contact)
+        for number in range(count + 1)
+    )
+    items = [
+        OrderItem(order=order, product_info=info, shop_id=info.shop_id, quantity=rnd.randint(1, 5))
+        for order in orders
+        for info in rnd.sample(infos, items_per_order)
+    ]
+    OrderItem.objects.bulk_create(items)
+    for order in orders[1:]:
+        ShopOrder.sync_for_order(order.id)
+    return orders
+
+
+def scaled(value):
+    return max(1, int(value * SCALE))
+
+
+def measure(func, repeat=3):
+    """
+    Лучшее время из ``repeat`` запусков, миллисекунды.
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return min(timings)
+
+
+class QueryBudgetTest(TestCase):
+    """Число SQL запросов на endpoint не растет с объемом данных."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.shops = generate_catalog(products=scaled(1000))
+        cls.buyer = User.objects.create_user(email="perf-buyer@example.com", password="Pass12345!", is_active=True)
+        generate_orders(cls.buyer, count=scaled(100))
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=user).key}")
+        return client
+
+    def assertBudget(self, name, client, url):
+        # первый запрос заполняет кэш аутентификации и справочников
+        client.get(url)
+        with self.assertNumQueries(QUERY_BUDGETS[name]):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_catalog(self):
+        """Категории, магазины и поиск товаров."""
+        client = APIClient()
+        self.assertBudget("categories", client, reverse("backend:categories"))
+        self.assertBudget("shops", client, "/api/v1/shops")
+        response = self.assertBudget("products", client, f"/api/v1/products?shop_id={self.shops[0].id}")
+        self.assertEqual(len(response.json()), scaled(1000))
+
+    def test_buyer(self):
+        """Корзина и заказы покупателя."""
+        client = self.client_for(self.buyer)
+        self.assertBudget("basket", client, reverse("backend:basket"))
+        response = self.assertBudget("orders", client, reverse("backend:order"))
+        self.assertEqual(len(response.json()), scaled(100))
+
+    def test_partner(self):
+        """Заказы и выгрузка товаров магазина."""
+        client = self.client_for(self.shops[0].user)
+        self.assertBudget("partner_orders", client, reverse("backend:partner-orders"))
+        self.assertBudget("partner_export", client, reverse("backend:partner-export"))
+
+
+class AdminChangelistBudgetTest(TestCase):
+    """Число SQL запросов страницы списка админки не зависит от числа строк."""
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_catalog(products=scaled(100))
+        cls.buyer = User.objects.create_user(email="perf-buyer@example.com", password="Pass12345!", is_active=True)
+        generate_orders(cls.buyer, count=scaled(100))
+        cls.admin = User.objects.create_superuser(email="perf-admin@example.com", password="Pass12345!")
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_changelists(self):
+        """Списки с вычисляемыми колонками."""
+        for name, budget in ADMIN_QUERY_BUDGETS.items():
+            with self.subTest(name), self.assertNumQueries(budget):
+                response = self.client.get(reverse(f"admin:backend_{name}_changelist"))
+            self.assertEqual(response.status_code, 200)
+
+    @override_settings(ADMIN_COUNT_CACHE_TTL=60)
+    def test_cached_count(self):
+        """С ADMIN_COUNT_CACHE_TTL число строк списка берется из кэша."""
+        url = reverse("admin:backend_product_changelist")
+        self.client.get(url)
+        with self.assertNumQueries(ADMIN_QUERY_BUDGETS["product"] - 1):
+            response = self.client.get(url)
+        self.assertContains(response, f"{scaled(100)} Список продуктов")
+
+
+@tag("perf")
+@skipUnless(TIMING, "замеры времени включаются PERF_TIMING=True")
+class TimingRegressionTest(TestCase):
+    """Время импорта и сериализации не хуже базовой линии."""
+
+    results = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_catalog(shops=1, products=scaled(1000))
+        cls.buyer = User.objects.create_user(email="perf-buyer@example.com", password="Pass12345!", is_active=True)
+        generate_orders(cls.buyer, count=scaled(100))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        baseline = ujson.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+        if UPDATE_BASELINE:
+            BASELINE.write_text(ujson.dumps({**baseline, **cls.results}, indent=2, sort_keys=True) + "\n")
+        if REPORT:
+            report = {
+                name: {"ms": value, "baseline_ms": baseline.get(name), "ratio": value / baseline[name]}
+                for name, value in cls.results.items()
+                if name in baseline
+            }
+            Path(REPORT).write_text(ujson.dumps(report, indent=2, sort_keys=True, ensure_ascii=False))
+
+    def assertNotSlower(self, name, func):
+        value = round(measure(func), 2)
+        self.results[name] = value
+        baseline = ujson.loads(BASELINE.read_text()).get(name) if BASELINE.exists() else None
+        if baseline is None or UPDATE_BASELINE:
+            return
+        self.assertLessEqual(
+            value, baseline * TOLERANCE * SCALE, f"{name}: {value} мс, базовая линия {baseline} мс (x{TOLERANCE})"
+        )
+
+    def test_serialization(self):
+        """Сериализация товаров и заказов."""
+        self.assertNotSlower(
+            "serialize_products", lambda: ProductInfoSerializer(querysets.product_infos(), many=True).data
+        )
+        self.assertNotSlower(
+            "serialize_orders", lambda: OrderSerializer(querysets.orders(self.buyer.id), many=True).data
+        )
+
+    def test_import(self):
+        """Импорт прайса из YAML."""
+        shop_user = User.objects.create_user(email="perf-import@example.com", password="Pass12345!", type="shop")
+        data = {
+            "shop": "Импорт",
+            "categories": [{"id": category.id, "name": category.name} for category in Category.objects.all()],
+            "goods": [
+                {
+                    "id": number,
+                    "category": Category.objects.first().id,
+                    "model": f"model-{number}",
+                    "name": f"Импортированный товар {number}",
+                    "price": 1000,
+                    "price_rrc": 1200,
+                    "quantity": 10,
+                    "parameters": {f"Параметр {parameter}": str(parameter) for parameter in range(5)},
+                }
+                for number in range(scaled(200))
+            ],
+        }
+        response = SimpleNamespace(content=dump(data, allow_unicode=True).encode())
+
+        with patch("backend.tasks.get", return_value=response), patch("backend.tasks.send_email"):
+            self.assertNotSlower("import_products", lambda: do_import("http://example.com/price.yaml", shop_user.id))
+
+        self.assertEqual(ProductInfo.objects.filter(shop__name="Импорт").count(), scaled(200))
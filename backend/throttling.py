@@ -0,0 +1,176 @@
+"""
+Ограничение частоты запросов к API (throttling) на Redis.
+
+Используется алгоритм token bucket: у каждого клиента есть «ведро»
+на ``N`` запросов, которое равномерно пополняется за период из ставки
+DRF вида ``"N/period"``. Проверка и списание выполняются одним Lua скриптом
+в Redis, поэтому они атомарны и выполняются за O(1) независимо от числа
+запросов клиента. Время берется с сервера Redis, так что ведро общее
+для всех процессов и узлов.
+
+IP адрес клиента берется из ``REMOTE_ADDR``; заголовок X-Forwarded-For
+учитывается только при ``THROTTLE_NUM_PROXIES`` > 0 (число доверенных прокси
+перед приложением), иначе клиент подделал бы его и обошел лимит по IP.
+
+Если Redis недоступен, запросы пропускаются (fail open), а повторная
+попытка обращения к Redis делается не раньше чем через ``REDIS_RETRY_AFTER`` секунд.
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+import redis
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle, SimpleRateThrottle
+
+logger = logging.getLogger(__name__)
+
+# KEYS[1] - ключ ведра; ARGV[1] - емкость ведра; ARGV[2] - пополнение, токенов в секунду.
+# Возвращает {1, 0} если запрос разрешен, иначе {0, секунд до следующего токена}.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = (1 - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(wait)}
+"""
+
+# Пауза перед повторным обращением к недоступному Redis, секунды
+REDIS_RETRY_AFTER = 5
+
+_script = None
+_unavailable_until = 0.0
+
+
+def _get_script():
+    """
+    Зарегистрированный в клиенте Redis скрипт token bucket (один на процесс).
+    """
+    global _script
+
+    if _script is None:
+        client = redis.Redis.from_url(settings.THROTTLE_REDIS_URL, socket_timeout=0.2, socket_connect_timeout=0.2)
+        _script = client.register_script(TOKEN_BUCKET_SCRIPT)
+    return _script
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Базовый класс ограничения частоты запросов по token bucket.
+
+    Наследники задают ``scope`` (ключ ставки в DEFAULT_THROTTLE_RATES)
+    и ``get_ident_key`` (кого ограничивать: пользователя, IP и т.п.).
+    """
+
+    scope = None
+    parse_rate = SimpleRateThrottle.parse_rate
+
+    def __init__(self):
+        self.wait_time = None
+
+    def get_scope(self, view):
+        """
+        Ключ ставки для запроса.
+        """
+        return self.scope
+
+    def get_ident_key(self, request, view):
+        """
+        Идентификатор клиента в пределах области ограничения (None - не ограничивать).
+
+        Наследник обязан определить, кого считать клиентом: иначе ограничение
+        молча не работало бы.
+        """
+        raise ImproperlyConfigured(f"{type(self).__name__} должен определить get_ident_key()")
+
+    def allow_request(self, request, view):
+        if not settings.THROTTLE_ENABLED:
+            return True
+
+        scope = self.get_scope(view)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope) if scope else None
+        ident = self.get_ident_key(request, view)
+        if rate is None or ident is None:
+            return True
+
+        global _unavailable_until
+        if time.monotonic() < _unavailable_until:
+            return True
+
+        capacity, period = self.parse_rate(rate)
+        key = f"throttle:{scope}:{ident}"
+        try:
+            allowed, wait = _get_script()(keys=[key], args=[capacity, capacity / period])
+        except redis.RedisError as error:
+            logger.warning("Throttling недоступен: %s", error)
+            _unavailable_until = time.monotonic() + REDIS_RETRY_AFTER
+            return True
+
+        self.wait_time = float(wait)
+        return bool(allowed)
+
+    def wait(self):
+        return self.wait_time
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    """
+    Ограничение анонимных запросов по IP адресу.
+    """
+
+    scope = "ip"
+
+    def get_ident_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return self.get_ident(request)
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """
+    Ограничение запросов авторизованного пользователя.
+    """
+
+    scope = "user"
+
+    def get_ident_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return None
+
+
+class EndpointTokenBucketThrottle(TokenBucketThrottle):
+    """
+    Отдельный лимит для конкретного endpoint.
+
+    Применяется к view с атрибутом ``throttle_scope``; клиент определяется
+    по пользователю, а для анонимных запросов - по IP адресу.
+    """
+
+    def get_scope(self, view):
+        return getattr(view, "throttle_scope", None)
+
+    def get_ident_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return f"user:{request.user.pk}"
+        return f"ip:{self.get_ident(request)}"
@@ -7,6 +7,7 @@ API endpoints для backend приложения.
 - /categories, /shops, /products - публичные endpoints для просмотра каталога
 - /basket - управление корзиной
 - /order - управление заказами
+- /async/* - асинхронные версии endpoints для чтения (при запуске под ASGI)
 """
 
 from django.urls import path, re_path
@@ -16,6 +17,7 @@ from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 from rest_framework import permissions
 
+from backend import async_views
 from backend.views import (
     AccountDetails,
     BasketView,
@@ -72,4 +74,10 @@ urlpatterns = [
     # Работа с заказами
     path("basket", BasketView.as_view(), name="basket"),  # Корзина
     path("order", OrderView.as_view(), name="order"),  # Заказы
+    # Асинхронные endpoints для чтения
+    path("async/categories", async_views.CategoryView.as_view(), name="async-categories"),
+    path("async/shops", async_views.ShopView.as_view(), name="async-shops"),
+    path("async/products", async_views.ProductInfoView.as_view(), name="async-products"),
+    path("async/basket", async_views.BasketView.as_view(), name="async-basket"),
+    path("async/order", async_views.OrderView.as_view(), name="async-order"),
 ]
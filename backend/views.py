@@ -2,8 +2,8 @@ from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
 from django.core.validators import URLValidator
-from django.db import IntegrityError
-from django.db.models import F, Q, Sum
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 from django.http import HttpResponse, JsonResponse
 
 from rest_framework.authtoken.models import Token
@@ -14,7 +14,12 @@ from setuptools._distutils.util import strtobool
 from ujson import loads as load_json
 from yaml import dump
 
+from backend import dimensions, querysets
+from backend.db import ReplicaReadMixin
+from backend.idempotency import idempotent
 from backend.models import (
+    ORDER_STATES,
+    SHOP_ORDER_STATES,
     Category,
     ConfirmEmailToken,
     Contact,
@@ -22,6 +27,9 @@ from backend.models import (
     OrderItem,
     ProductInfo,
     Shop,
+    ShopOrder,
+    User,
+    is_allowed_transition,
 )
 from backend.serializers import (
     CategorySerializer,
@@ -29,11 +37,11 @@ from backend.serializers import (
     OrderItemSerializer,
     OrderSerializer,
     ProductInfoSerializer,
+    ShopOrderSerializer,
     ShopSerializer,
     UserSerializer,
 )
-from backend.signals import new_order, new_user_registered
-from backend.tasks import send_invoice_to_admin
+from backend.signals import new_order, new_user_registered, shop_order_updated
 
 
 class RegisterAccount(APIView):
@@ -41,11 +49,12 @@ class RegisterAccount(APIView):
     Для регистрации покупателей
     """
 
+    throttle_scope = "register"
+
     # Регистрация методом POST
     def post(self, request, *args, **kwargs):
         # проверяем обязательные аргументы
         if {"first_name", "last_name", "email", "password", "company", "position"}.issubset(request.data):
-
             # проверяем пароль на сложность
 
             try:
@@ -62,11 +71,12 @@ class RegisterAccount(APIView):
                 request.data.update({})
                 user_serializer = UserSerializer(data=request.data)
                 if user_serializer.is_valid():
-                    # сохраняем пользователя
-                    user = user_serializer.save()
-                    user.set_password(request.data["password"])
-                    user.save()
-                    new_user_registered.send(sender=self.__class__, user_id=user.id)
+                    # сохраняем пользователя вместе с письмом подтверждения в outbox
+                    with transaction.atomic():
+                        user = user_serializer.save()
+                        user.set_password(request.data["password"])
+                        user.save()
+                        new_user_registered.send(sender=self.__class__, user_id=user.id)
                     return JsonResponse({"Status": True})
                 else:
                     return JsonResponse({"Status": False, "Errors": user_serializer.errors})
@@ -114,6 +124,8 @@ class AccountDetails(APIView):
     def post(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
             return JsonResponse({"Status": False, "Error": "Log in required"}, status=403)
+        # request.user - кэшированный снимок без пароля, для изменения загружаем пользователя из БД
+        user = User.objects.get(pk=request.user.pk)
         # проверяем обязательные аргументы
 
         if "password" in request.data:
@@ -127,10 +139,10 @@ class AccountDetails(APIView):
                     error_array.append(item)
                 return JsonResponse({"Status": False, "Errors": {"password": error_array}})
             else:
-                request.user.set_password(request.data["password"])
+                user.set_password(request.data["password"])
 
         # проверяем остальные данные
-        user_serializer = UserSerializer(request.user, data=request.data, partial=True)
+        user_serializer = UserSerializer(user, data=request.data, partial=True)
         if user_serializer.is_valid():
             user_serializer.save()
             return JsonResponse({"Status": True})
@@ -143,6 +155,8 @@ class LoginAccount(APIView):
     Класс для авторизации пользователей
     """
 
+    throttle_scope = "login"
+
     # Авторизация методом POST
     def post(self, request, *args, **kwargs):
         if {"email", "password"}.issubset(request.data):
@@ -159,47 +173,31 @@ class LoginAccount(APIView):
         return JsonResponse({"Status": False, "Errors": "Не указаны все необходимые аргументы"})
 
 
-class CategoryView(ListAPIView):
+class CategoryView(ReplicaReadMixin, ListAPIView):
     """
     Класс для просмотра категорий
     """
 
-    queryset = Category.objects.all()
+    queryset = querysets.categories()
     serializer_class = CategorySerializer
 
 
-class ShopView(ListAPIView):
+class ShopView(ReplicaReadMixin, ListAPIView):
     """
     Класс для просмотра списка магазинов
     """
 
-    queryset = Shop.objects.filter(state=True)
+    queryset = querysets.shops()
     serializer_class = ShopSerializer
 
 
-class ProductInfoView(APIView):
+class ProductInfoView(ReplicaReadMixin, APIView):
     """
     Класс для поиска товаров
     """
 
     def get(self, request, *args, **kwargs):
-        query = Q(shop__state=True)
-        shop_id = request.query_params.get("shop_id")
-        category_id = request.query_params.get("category_id")
-
-        if shop_id:
-            query = query & Q(shop_id=shop_id)
-
-        if category_id:
-            query = query & Q(product__category_id=category_id)
-
-        # фильтруем и отбрасываем дуликаты
-        queryset = (
-            ProductInfo.objects.filter(query)
-            .select_related("shop", "product__category")
-            .prefetch_related("product_parameters__parameter")
-            .distinct()
-        )
+        queryset = querysets.product_infos(request.query_params.get("shop_id"), request.query_params.get("category_id"))
 
         serializer = ProductInfoSerializer(queryset, many=True)
 
@@ -215,20 +213,13 @@ class BasketView(APIView):
     def get(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
             return JsonResponse({"Status": False, "Error": "Log in required"}, status=403)
-        basket = (
-            Order.objects.filter(user_id=request.user.id, state="basket")
-            .prefetch_related(
-                "ordered_items__product_info__product__category",
-                "ordered_items__product_info__product_parameters__parameter",
-            )
-            .annotate(total_sum=Sum(F("ordered_items__quantity") * F("ordered_items__product_info__price")))
-            .distinct()
-        )
+        basket = querysets.basket(request.user.id)
 
         serializer = OrderSerializer(basket, many=True)
         return Response(serializer.data)
 
     # редактировать корзину
+    @idempotent
     def post(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
             return JsonResponse({"Status": False, "Error": "Log in required"}, status=403)
@@ -260,6 +251,7 @@ class BasketView(APIView):
         return JsonResponse({"Status": False, "Errors": "Не указаны все необходимые аргументы"})
 
     # удалить товары из корзины
+    @idempotent
     def delete(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
             return JsonResponse({"Status": False, "Error": "Log in required"}, status=403)
@@ -281,6 +273,7 @@ class BasketView(APIView):
         return JsonResponse({"Status": False, "Errors": "Не указаны все необходимые аргументы"})
 
     # добавить позиции в корзину
+    @idempotent
     def put(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
             return JsonResponse({"Status": False, "Error": "Log in required"}, status=403)
@@ -309,6 +302,8 @@ class PartnerUpdate(APIView):
     Класс для обновления прайса от поставщика.
     """
 
+    throttle_scope = "partner_update"
+
     def post(self, request, *args, **kwargs):
         """
         Обновление прайс-листа партнера.
@@ -344,7 +339,7 @@ class PartnerUpdate(APIView):
         return JsonResponse({"Status": False, "Errors": "Не указаны все необходимые аргументы"})
 
 
-class PartnerExport(APIView):
+class PartnerExport(ReplicaReadMixin, APIView):
     """
     API endpoint для экспорта товаров магазина.
 
@@ -358,6 +353,8 @@ class PartnerExport(APIView):
         User type: 'shop'
     """
 
+    throttle_scope = "partner_export"
+
     def get(self, request, *args, **kwargs):
         """
         Экспорт товаров магазина в YAML.
@@ -386,11 +383,13 @@ class PartnerExport(APIView):
             data["categories"].append({"id": category.id, "name": category.name})
 
         # Получаем товары магазина
-        products = ProductInfo.objects.filter(shop=shop)
+        products = (
+            ProductInfo.objects.filter(shop=shop).select_related("product").prefetch_related("product_parameters")
+        )
         for product_info in products:
             item = {
                 "id": product_info.external_id,
-                "category": product_info.product.category.id,
+                "category": product_info.product.category_id,
                 "model": product_info.model,
                 "name": product_info.product.name,
                 "price": product_info.price,
@@ -401,7 +400,7 @@ class PartnerExport(APIView):
 
             # Добавляем параметры товара
             for param in product_info.product_parameters.all():
-                item["parameters"][param.parameter.name] = param.value
+                item["parameters"][dimensions.parameters.label(param.parameter_id)] = param.value
 
             data["goods"].append(item)
 
@@ -443,6 +442,8 @@ class PartnerState(APIView):
         if state:
             try:
                 Shop.objects.filter(user_id=request.user.id).update(state=strtobool(state))
+                # update() не вызывает post_save
+                dimensions.changed(Shop)
                 return JsonResponse({"Status": True})
             except ValueError as error:
                 return JsonResponse({"Status": False, "Errors": str(error)})
@@ -450,11 +451,15 @@ class PartnerState(APIView):
         return JsonResponse({"Status": False, "Errors": "Не указаны все необходимые аргументы"})
 
 
-class PartnerOrders(APIView):
+class PartnerOrders(ReplicaReadMixin, APIView):
     """
-    Класс для получения заказов поставщиками
+    Класс для получения и обработки заказов поставщиками.
+
+    Магазин работает только со своими частями заказов (ShopOrder)
+    и позициями своего магазина.
     """
 
+    # получить заказы магазина
     def get(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
             return JsonResponse({"Status": False, "Error": "Log in required"}, status=403)
@@ -462,21 +467,43 @@ class PartnerOrders(APIView):
         if request.user.type != "shop":
             return JsonResponse({"Status": False, "Error": "Только для магазинов"}, status=403)
 
-        order = (
-            Order.objects.filter(ordered_items__product_info__shop__user_id=request.user.id)
-            .exclude(state="basket")
-            .prefetch_related(
-                "ordered_items__product_info__product__category",
-                "ordered_items__product_info__product_parameters__parameter",
-            )
-            .select_related("contact")
-            .annotate(total_sum=Sum(F("ordered_items__quantity") * F("ordered_items__product_info__price")))
-            .distinct()
-        )
+        shop_id = Shop.objects.filter(user_id=request.user.id).values_list("id", flat=True).first()
+        shop_orders = querysets.shop_orders(shop_id)
 
-        serializer = OrderSerializer(order, many=True)
+        serializer = ShopOrderSerializer(shop_orders, many=True)
         return Response(serializer.data)
 
+    # изменить статус своей части заказа
+    def post(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({"Status": False, "Error": "Log in required"}, status=403)
+
+        if request.user.type != "shop":
+            return JsonResponse({"Status": False, "Error": "Только для магазинов"}, status=403)
+
+        if {"id", "state"}.issubset(request.data):
+            if str(request.data["id"]).isdigit() and request.data["state"] in SHOP_ORDER_STATES:
+                # id - номер заказа; магазин меняет статус только своей части
+                shop_orders = ShopOrder.objects.filter(
+                    order_id=request.data["id"], shop__user_id=request.user.id, state__in=ORDER_STATES
+                )
+                shop_order = shop_orders.values_list("id", "state").first()
+                if shop_order is None:
+                    return JsonResponse({"Status": False, "Errors": "Заказ не найден"})
+                shop_order_id, current = shop_order
+                if not is_allowed_transition(current, request.data["state"]):
+                    return JsonResponse(
+                        {"Status": False, "Errors": f"Недопустимая смена статуса: {current} -> {request.data['state']}"}
+                    )
+                # условие на текущий статус: параллельная смена статуса не перезаписывается
+                if shop_orders.filter(state=current).update(state=request.data["state"]):
+                    ShopOrder.rollup(request.data["id"])
+                    shop_order_updated.send(sender=self.__class__, shop_order_id=shop_order_id)
+                    return JsonResponse({"Status": True})
+                return JsonResponse({"Status": False, "Errors": "Статус заказа изменился, повторите запрос"})
+
+        return JsonResponse({"Status": False, "Errors": "Не указаны все необходимые аргументы"})
+
 
 class ContactView(APIView):
     """
@@ -558,22 +585,13 @@ class OrderView(APIView):
     def get(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
             return JsonResponse({"Status": False, "Error": "Log in required"}, status=403)
-        order = (
-            Order.objects.filter(user_id=request.user.id)
-            .exclude(state="basket")
-            .prefetch_related(
-                "ordered_items__product_info__product__category",
-                "ordered_items__product_info__product_parameters__parameter",
-            )
-            .select_related("contact")
-            .annotate(total_sum=Sum(F("ordered_items__quantity") * F("ordered_items__product_info__price")))
-            .distinct()
-        )
+        order = querysets.orders(request.user.id)
 
         serializer = OrderSerializer(order, many=True)
         return Response(serializer.data)
 
     # разместить заказ из корзины
+    @idempotent
     def post(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
             return JsonResponse({"Status": False, "Error": "Log in required"}, status=403)
@@ -581,18 +599,20 @@ class OrderView(APIView):
         if {"id", "contact"}.issubset(request.data):
             if request.data["id"].isdigit():
                 try:
-                    is_updated = Order.objects.filter(user_id=request.user.id, id=request.data["id"]).update(
-                        contact_id=request.data["contact"], state="new"
-                    )
+                    # оформляется только корзина: повторный запрос не создает заказ заново
+                    # уведомления и накладная пишутся в outbox в той же транзакции
+                    with transaction.atomic():
+                        is_updated = Order.objects.filter(
+                            user_id=request.user.id, id=request.data["id"], state="basket"
+                        ).update(contact_id=request.data["contact"], state="new")
+                        if is_updated:
+                            ShopOrder.sync_for_order(request.data["id"])
+                            new_order.send(sender=self.__class__, user_id=request.user.id, order_id=request.data["id"])
                 except IntegrityError as error:
                     print(error)
                     return JsonResponse({"Status": False, "Errors": "Неправильно указаны аргументы"})
                 else:
                     if is_updated:
-                        new_order.send(sender=self.__class__, user_id=request.user.id, order_id=request.data["id"])
-
-                        # Отправляем накладную администратору
-                        send_invoice_to_admin.delay(request.data["id"])
                         return JsonResponse({"Status": True})
 
         return JsonResponse({"Status": False, "Errors": "Не указаны все необходимые аргументы"})
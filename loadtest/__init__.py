@@ -0,0 +1,13 @@
+"""
+Нагрузочное тестирование API по сценариям покупателя и магазина.
+
+Сценарии (loadtest/scenarios.py) выполняются виртуальными пользователями
+против запущенного сервера; по каждому endpoint считаются запросы в секунду,
+процентили задержек и доля ошибок (loadtest/stats.py).
+
+Учетные записи берутся из данных ``generate_synthetic_data``: покупатели
+``synthetic-buyer<N>-s<seed>@example.com`` и магазины ``synthetic-shop<N>-s<seed>@example.com``.
+
+Usage:
+    python -m loadtest --url http://localhost:8000/api/v1 --users 50 --duration 60
+"""
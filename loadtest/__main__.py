@@ -0,0 +1,65 @@
+"""
+Командная строка нагрузочного теста.
+
+Usage:
+    python -m loadtest [--url URL] [--users 20] [--duration 60] [--iterations N] [--ramp-up 10]
+        [--mix buyer=9,partner=1] [--think 1] [--rate R] [--feed-url URL]
+        [--json report.json] [--max-error-rate 0.01]
+
+Example:
+    python manage.py generate_synthetic_data --shops 20 --products 10000 --users 1000 --orders 10000
+    python -m loadtest --users 100 --duration 120 --json before.json
+"""
+
+import argparse
+import sys
+
+import ujson
+
+from loadtest.runner import Runner
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m loadtest", description="Нагрузочный тест API магазина")
+    parser.add_argument("--url", default="http://localhost:8000/api/v1", help="Адрес API")
+    parser.add_argument("--users", type=int, default=20, help="Количество виртуальных пользователей")
+    parser.add_argument("--duration", type=float, default=60, help="Длительность после разгона, секунды")
+    parser.add_argument("--iterations", type=int, default=None, help="Максимум итераций на пользователя")
+    parser.add_argument("--ramp-up", type=float, default=10, help="Время запуска всех пользователей, секунды")
+    parser.add_argument("--mix", default="buyer=9,partner=1", help="Доли сценариев")
+    parser.add_argument("--think", type=float, default=1.0, help="Средняя пауза между итерациями, секунды")
+    parser.add_argument("--rate", type=float, default=None, help="Открытая модель: итераций в секунду на всех")
+    parser.add_argument("--timeout", type=float, default=30, help="Таймаут запроса, секунды")
+    parser.add_argument("--password", default="Pass12345!", help="Пароль учетных записей")
+    parser.add_argument(
+        "--buyer-email", default="synthetic-buyer{n}-s1@example.com", help="Шаблон email покупателя, {n} - номер"
+    )
+    parser.add_argument("--buyer-accounts", type=int, default=1000, help="Количество учетных записей покупателей")
+    parser.add_argument(
+        "--partner-email", default="synthetic-shop{n}-s1@example.com", help="Шаблон email магазина, {n} - номер"
+    )
+    parser.add_argument("--partner-accounts", type=int, default=20, help="Количество учетных записей магазинов")
+    parser.add_argument("--feed-url", default=None, help="URL прайса YAML для /partner/update")
+    parser.add_argument("--update-share", type=float, default=0.1, help="Доля итераций магазина с загрузкой прайса")
+    parser.add_argument("--json", default=None, help="Файл для отчета в JSON")
+    parser.add_argument("--max-error-rate", type=float, default=None, help="Код возврата 1 при большей доле ошибок")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = vars(parse_args(argv))
+    stats = Runner(options).run()
+
+    print(stats.table())
+    summary = stats.summary()
+    if options["json"]:
+        with open(options["json"], "w", encoding="utf-8") as report:
+            ujson.dump({"options": options, "elapsed": stats.elapsed, "endpoints": summary}, report, indent=2)
+
+    if options["max_error_rate"] is not None and summary["ИТОГО"]["error_rate"] > options["max_error_rate"]:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""
+HTTP клиент виртуального пользователя с записью результатов запросов.
+"""
+
+import re
+import time
+import uuid
+
+import requests
+
+# id в пути не создают отдельный endpoint в отчете
+_ID = re.compile(r"/\d+(?=/|$)")
+
+
+class ApiClient:
+    """
+    Сессия requests с токеном пользователя.
+
+    Ответ считается ошибкой при статусе >= 400, при сетевой ошибке
+    и при ``"Status": false`` в JSON ответе API.
+    """
+
+    def __init__(self, base_url, stats, timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.stats = stats
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.token = None
+
+    def request(self, method, path, idempotent=False, **kwargs):
+        """
+        Запрос к API.
+
+        Args:
+            method (str): HTTP метод
+            path (str): Путь относительно адреса API, например ``/basket``
+            idempotent (bool): Передать новый заголовок Idempotency-Key
+
+        Returns:
+            Ответ в виде dict/list или None при ошибке
+        """
+        headers = kwargs.pop("headers", {})
+        if self.token:
+            headers["Authorization"] = f"Token {self.token}"
+        if idempotent:
+            headers["Idempotency-Key"] = uuid.uuid4().hex
+
+        endpoint = f"{method} {_ID.sub('/{id}', path.split('?')[0])}"
+        started = time.perf_counter()
+        try:
+            response = self.session.request(
+                method, self.base_url + path, headers=headers, timeout=self.timeout, **kwargs
+            )
+        except requests.RequestException:
+            self.stats.record(endpoint, time.perf_counter() - started, ok=False)
+            return None
+        latency = time.perf_counter() - started
+
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+        ok = response.status_code < 400 and not (isinstance(data, dict) and data.get("Status") is False)
+        self.stats.record(endpoint, latency, ok, throttled=response.status_code == 429)
+        if not ok:
+            return None
+        return data if data is not None else response.content
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def login(self, email, password):
+        """
+        Авторизация и сохранение токена.
+
+        Returns:
+            bool: Удалось ли авторизоваться
+        """
+        data = self.post("/user/login", data={"email": email, "password": password})
+        self.token = data["Token"] if data else None
+        return self.token is not None
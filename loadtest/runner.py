@@ -0,0 +1,145 @@
+"""
+Запуск виртуальных пользователей.
+
+Закрытая модель (по умолчанию): ``users`` пользователей выполняют итерации
+сценариев подряд с паузой ``think`` секунд (экспоненциальное распределение).
+Открытая модель (``rate``): итерации начинаются с заданной частотой
+на всех пользователей вместе, ``users`` ограничивает число одновременных итераций.
+``iterations`` ограничивает число итераций каждого пользователя.
+"""
+
+import random
+import threading
+import time
+
+from loadtest.client import ApiClient
+from loadtest.scenarios import SCENARIOS
+from loadtest.stats import Stats
+
+
+def parse_mix(value):
+    """
+    Доли сценариев из строки ``buyer=9,partner=1``.
+
+    Returns:
+        dict: Имя сценария -> доля от 0 до 1
+    """
+    weights = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Неизвестный сценарий: {name}")
+        weights[name] = float(weight or 1)
+    total = sum(weights.values())
+    return {name: weight / total for name, weight in weights.items()}
+
+
+def assign_scenarios(users, mix):
+    """
+    Сценарий каждого виртуального пользователя по долям ``mix``.
+
+    Returns:
+        list: Имена сценариев по номеру пользователя
+    """
+    kinds = []
+    for number in range(users):
+        point = (number + 0.5) / users
+        cumulative = 0.0
+        for name, share in mix.items():
+            cumulative += share
+            if point < cumulative:
+                break
+        kinds.append(name)
+    return kinds
+
+
+class Pacer:
+    """
+    Общее расписание начала итераций для открытой модели нагрузки.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate
+        self.next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self, deadline):
+        """
+        Ожидание следующего слота.
+
+        Returns:
+            bool: False, если слот позже окончания теста
+        """
+        with self._lock:
+            slot = max(self.next_slot, time.monotonic())
+            self.next_slot = slot + self.interval
+        if slot >= deadline:
+            return False
+        time.sleep(max(0.0, slot - time.monotonic()))
+        return True
+
+
+class Runner:
+    """
+    Нагрузочный тест.
+
+    Args:
+        options (dict): Параметры командной строки (loadtest/__main__.py)
+    """
+
+    def __init__(self, options):
+        self.options = options
+        self.stats = Stats()
+        self.pacer = Pacer(options["rate"]) if options.get("rate") else None
+
+    def run(self):
+        """
+        Запуск пользователей и ожидание окончания теста.
+
+        Returns:
+            Stats: Результаты
+        """
+        options = self.options
+        users = options["users"]
+        kinds = assign_scenarios(users, parse_mix(options["mix"]))
+        deadline = time.monotonic() + options["ramp_up"] + options["duration"]
+        counters = {name: 0 for name in SCENARIOS}
+
+        threads = []
+        for number, kind in enumerate(kinds):
+            account = counters[kind] % options[f"{kind}_accounts"]
+            counters[kind] += 1
+            email = options[f"{kind}_email"].format(n=account)
+            thread = threading.Thread(target=self.user, args=(kind, email, deadline), daemon=True)
+            thread.start()
+            threads.append(thread)
+            if number < users - 1:
+                time.sleep(options["ramp_up"] / users)
+
+        for thread in threads:
+            thread.join()
+        self.stats.stop()
+        return self.stats
+
+    def user(self, kind, email, deadline):
+        """
+        Цикл одного виртуального пользователя до окончания теста.
+        """
+        options = self.options
+        client = ApiClient(options["url"], self.stats, timeout=options["timeout"])
+        scenario = SCENARIOS[kind](client, email, options["password"], options)
+        if not scenario.setup():
+            return
+
+        rnd = random.Random(email)
+        think = options["think"]
+        iterations = options.get("iterations")
+        while time.monotonic() < deadline and iterations != 0:
+            if self.pacer and not self.pacer.wait(deadline):
+                return
+            scenario.iteration()
+            if iterations:
+                iterations -= 1
+            if think and not self.pacer:
+                time.sleep(min(rnd.expovariate(1 / think), max(0.0, deadline - time.monotonic())))
@@ -0,0 +1,102 @@
+"""
+Сценарии виртуальных пользователей.
+
+Сценарий авторизуется один раз в ``setup`` и затем многократно выполняет
+``iteration`` - один проход пользовательского пути.
+"""
+
+import random
+
+import ujson
+
+
+class Scenario:
+    """
+    Базовый сценарий.
+
+    Args:
+        client (ApiClient): Клиент виртуального пользователя
+        email (str): Email учетной записи
+        password (str): Пароль
+        options (dict): Параметры запуска
+    """
+
+    name = None
+
+    def __init__(self, client, email, password, options):
+        self.client = client
+        self.email = email
+        self.password = password
+        self.options = options
+        self.rnd = random.Random(email)
+
+    def setup(self):
+        """
+        Подготовка: авторизация.
+
+        Returns:
+            bool: Можно ли выполнять итерации
+        """
+        return self.client.login(self.email, self.password)
+
+    def iteration(self):
+        """
+        Один проход пользовательского пути; по умолчанию - просмотр каталога.
+        """
+        self.client.get("/categories")
+        self.client.get("/shops")
+
+
+class BuyerScenario(Scenario):
+    """
+    Покупатель: поиск товаров в категории, добавление в корзину, оформление заказа.
+    """
+
+    name = "buyer"
+
+    def setup(self):
+        if not super().setup():
+            return False
+        self.categories = [category["id"] for category in (self.client.get("/categories") or {}).get("results", [])]
+        contacts = self.client.get("/user/contact") or []
+        if not contacts:
+            self.client.post("/user/contact", data={"city": "Москва", "street": "Тверская", "phone": "+79990000000"})
+            contacts = self.client.get("/user/contact") or []
+        self.contact = contacts[0]["id"] if contacts else None
+        return bool(self.categories) and self.contact is not None
+
+    def iteration(self):
+        category = self.rnd.choice(self.categories)
+        products = self.client.get(f"/products?category_id={category}")
+        products = [product for product in products or [] if product["quantity"] > 0]
+        if not products:
+            return
+
+        chosen = self.rnd.sample(products, min(len(products), self.rnd.randint(1, 3)))
+        items = [{"product_info": product["id"], "quantity": 1} for product in chosen]
+        if self.client.post("/basket", data={"items": ujson.dumps(items)}, idempotent=True) is None:
+            return
+
+        basket = self.client.get("/basket")
+        if not basket:
+            return
+        self.client.post("/order", data={"id": str(basket[0]["id"]), "contact": self.contact}, idempotent=True)
+        self.client.get("/order")
+
+
+class PartnerScenario(Scenario):
+    """
+    Магазин: загрузка прайса (если задан ``--feed-url``), просмотр заказов, выгрузка товаров.
+    """
+
+    name = "partner"
+
+    def iteration(self):
+        feed_url = self.options.get("feed_url")
+        if feed_url and self.rnd.random() < self.options.get("update_share", 0.1):
+            self.client.post("/partner/update", data={"url": feed_url})
+        self.client.get("/partner/orders")
+        self.client.get("/partner/export")
+
+
+SCENARIOS = {scenario.name: scenario for scenario in (BuyerScenario, PartnerScenario)}
@@ -0,0 +1,107 @@
+"""
+Сбор и вывод результатов нагрузочного теста.
+"""
+
+import threading
+import time
+from collections import defaultdict
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(values, percent):
+    """
+    Процентиль по методу ближайшего ранга.
+
+    Args:
+        values (list): Отсортированные значения
+        percent (float): Процентиль от 0 до 100
+
+    Returns:
+        float: Значение процентиля или 0 для пустого списка
+    """
+    if not values:
+        return 0.0
+    rank = max(1, -(-len(values) * percent // 100))
+    return values[int(rank) - 1]
+
+
+class Stats:
+    """
+    Задержки и ошибки запросов по endpoint, потокобезопасно.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.throttled = defaultdict(int)
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def record(self, endpoint, latency, ok, throttled=False):
+        """
+        Запись результата запроса.
+
+        Args:
+            endpoint (str): Метод и путь, например ``GET /products``
+            latency (float): Задержка, секунды
+            ok (bool): Успешный ответ
+            throttled (bool): Ответ 429
+        """
+        with self._lock:
+            self.latencies[endpoint].append(latency)
+            if not ok:
+                self.errors[endpoint] += 1
+            if throttled:
+                self.throttled[endpoint] += 1
+
+    def stop(self):
+        self.finished = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    def summary(self):
+        """
+        Итоги по каждому endpoint и по всем запросам.
+
+        Returns:
+            dict: endpoint -> requests, rps, error_rate, throttled и процентили в мс
+        """
+        with self._lock:
+            groups = {endpoint: sorted(values) for endpoint, values in self.latencies.items()}
+            errors = dict(self.errors)
+            throttled = dict(self.throttled)
+        groups["ИТОГО"] = sorted(value for values in groups.values() for value in values)
+        errors["ИТОГО"] = sum(errors.values())
+        throttled["ИТОГО"] = sum(throttled.values())
+
+        elapsed = self.elapsed
+        result = {}
+        for endpoint, values in groups.items():
+            count = len(values)
+            row = {
+                "requests": count,
+                "rps": round(count / elapsed, 2) if elapsed else 0.0,
+                "error_rate": round(errors.get(endpoint, 0) / count, 4) if count else 0.0,
+                "throttled": throttled.get(endpoint, 0),
+            }
+            for percent in PERCENTILES:
+                row[f"p{percent}_ms"] = round(percentile(values, percent) * 1000, 1)
+            row["max_ms"] = round(values[-1] * 1000, 1) if values else 0.0
+            result[endpoint] = row
+        return result
+
+    def table(self):
+        """
+        Итоги в виде текстовой таблицы.
+        """
+        columns = ["requests", "rps", "error_rate", "throttled"] + [f"p{p}_ms" for p in PERCENTILES] + ["max_ms"]
+        summary = self.summary()
+        width = max(len(endpoint) for endpoint in summary)
+        lines = [f"{'endpoint':<{width}} " + " ".join(f"{column:>10}" for column in columns)]
+        for endpoint, row in summary.items():
+            lines.append(f"{endpoint:<{width}} " + " ".join(f"{row[column]:>10}" for column in columns))
+        return "\n".join(lines)
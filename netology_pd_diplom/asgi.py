@@ -0,0 +1,18 @@
+"""
+ASGI config for netology_pd_diplom project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+# Указываем Django какой файл настроек использовать
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "netology_pd_diplom.settings")
+
+# Создаем ASGI приложение для веб-сервера (uvicorn)
+application = get_asgi_application()
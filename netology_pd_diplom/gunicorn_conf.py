@@ -0,0 +1,131 @@
+"""
+Конфигурация gunicorn для production запуска.
+
+Usage:
+    gunicorn -c python:netology_pd_diplom.gunicorn_conf
+
+Число worker'ов и потоков подбирается по числу доступных ядер и памяти
+контейнера (cgroup), его можно задать явно через ``WEB_CONCURRENCY`` и ``WEB_THREADS``.
+По умолчанию используются gthread worker'ы с WSGI приложением;
+``WEB_ASGI=True`` запускает ASGI приложение на uvicorn worker'ах.
+
+Приложение загружается до fork (preload), worker'ы перезапускаются после
+``WEB_MAX_REQUESTS`` запросов (со случайным разбросом, чтобы не все сразу).
+Плавный перезапуск без потери запросов: ``kill -HUP <pid мастера>``.
+"""
+
+import os
+
+from decouple import config
+
+# Память на один worker с загруженным Django, байты
+WORKER_MEMORY = config("WEB_WORKER_MEMORY_MB", default=256, cast=int) * 1024 * 1024
+
+
+def cpu_count():
+    """
+    Число ядер, доступных процессу (с учетом affinity и квоты cgroup).
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as cpu_max:
+            quota, period = cpu_max.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def memory_limit():
+    """
+    Доступная память: лимит cgroup контейнера или вся память узла, байты.
+    """
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as limit_file:
+                value = limit_file.read().strip()
+        except OSError:
+            continue
+        # "max" или огромное число в cgroup v1 - лимита нет
+        if value.isdigit() and int(value) < 1 << 60:
+            return int(value)
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def worker_count(cpus, memory=None):
+    """
+    Число worker'ов: 2 * ядра + 1, но не больше, чем помещается в память.
+
+    Args:
+        cpus (int): Число ядер
+        memory (int): Доступная память, байты
+
+    Returns:
+        int: Число worker'ов
+    """
+    workers = 2 * cpus + 1
+    if memory:
+        workers = min(workers, memory // WORKER_MEMORY)
+    return max(1, workers)
+
+
+asgi = config("WEB_ASGI", default=False, cast=bool)
+
+wsgi_app = "netology_pd_diplom.asgi:application" if asgi else "netology_pd_diplom.wsgi:application"
+bind = config("WEB_BIND", default="0.0.0.0:8000")
+
+workers = config("WEB_CONCURRENCY", default=0, cast=int) or worker_count(cpu_count(), memory_limit())
+if asgi:
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    # потоки покрывают ожидание БД и Redis внутри запроса
+    worker_class = "gthread"
+    threads = config("WEB_THREADS", default=4, cast=int)
+
+preload_app = True
+max_requests = config("WEB_MAX_REQUESTS", default=2000, cast=int)
+max_requests_jitter = max_requests // 10
+timeout = config("WEB_TIMEOUT", default=60, cast=int)
+graceful_timeout = config("WEB_GRACEFUL_TIMEOUT", default=30, cast=int)
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+
+
+def pre_fork(server, worker):
+    """
+    Закрываем соединения с БД, открытые при загрузке приложения в мастере,
+    чтобы worker'ы не унаследовали общий сокет.
+    """
+    from django.db import connections
+
+    connections.close_all()
+
+
+def on_starting(server):
+    """
+    Очищаем каталог метрик Prometheus от файлов прошлого запуска.
+    """
+    metrics_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if metrics_dir:
+        os.makedirs(metrics_dir, exist_ok=True)
+        for name in os.listdir(metrics_dir):
+            os.remove(os.path.join(metrics_dir, name))
+
+
+def child_exit(server, worker):
+    """
+    Метрики завершившегося worker'а больше не учитываются в gauge.
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
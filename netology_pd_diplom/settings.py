@@ -13,7 +13,10 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 import os
 from pathlib import Path
 
-from decouple import config
+from django.conf import global_settings
+
+from decouple import Csv, config
+from kombu import Queue
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -46,11 +49,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "backend.metrics.MetricsMiddleware",
+    "backend.instrumentation.InstrumentationMiddleware",
+    "backend.slow_queries.SlowQueryMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "backend.db.ReplicaPinMiddleware",
+    "backend.hashing.HashingBusyMiddleware",
+    "backend.profiling.ProfilingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -74,6 +83,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "netology_pd_diplom.wsgi.application"
+ASGI_APPLICATION = "netology_pd_diplom.asgi.application"
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
@@ -81,28 +91,64 @@ WSGI_APPLICATION = "netology_pd_diplom.wsgi.application"
 # Для работы с Docker - читаем настройки из переменных окружения
 if os.environ.get("DATABASE_URL"):
     # Для Docker
-    DATABASES = {
-        "default": {
-            "ENGINE": "django.db.backends.postgresql",
-            "NAME": config("POSTGRES_DB"),
-            "USER": config("POSTGRES_USER"),
-            "PASSWORD": config("POSTGRES_PASSWORD"),
-            "HOST": "db",
-            "PORT": "5432",
-        }
+    DB_CONNECTION = {
+        "NAME": config("POSTGRES_DB"),
+        "USER": config("POSTGRES_USER"),
+        "PASSWORD": config("POSTGRES_PASSWORD"),
+        "HOST": "db",
+        "PORT": "5432",
     }
 else:
     # Для локальной разработки
-    DATABASES = {
-        "default": {
-            "ENGINE": "django.db.backends.postgresql",
-            "NAME": config("DB_NAME"),
-            "USER": config("DB_USER"),
-            "PASSWORD": config("DB_PASSWORD"),
-            "HOST": config("DB_HOST", default="localhost"),
-            "PORT": config("DB_PORT", default="5432"),
-        }
+    DB_CONNECTION = {
+        "NAME": config("DB_NAME"),
+        "USER": config("DB_USER"),
+        "PASSWORD": config("DB_PASSWORD"),
+        "HOST": config("DB_HOST", default="localhost"),
+        "PORT": config("DB_PORT", default="5432"),
+    }
+
+# Пул соединений psycopg 3 в каждом процессе (web и Celery). Без пула соединение
+# сохраняется между запросами на CONN_MAX_AGE секунд и проверяется перед повторным использованием.
+DB_POOL = config("DB_POOL", default=False, cast=bool)
+DB_POOL_MIN_SIZE = config("DB_POOL_MIN_SIZE", default=2, cast=int)
+DB_POOL_MAX_SIZE = config("DB_POOL_MAX_SIZE", default=10, cast=int)
+# Сколько ждать свободное соединение из пула, секунды
+DB_POOL_TIMEOUT = config("DB_POOL_TIMEOUT", default=10, cast=int)
+DB_CONN_MAX_AGE = config("DB_CONN_MAX_AGE", default=60, cast=int)
+# Под ASGI каждый запрос выполняется в своем потоке sync_to_async, и сохраненные
+# соединения этих потоков не закрываются: без пула соединение закрывается после запроса.
+WEB_ASGI = config("WEB_ASGI", default=False, cast=bool)
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.postgresql",
+        **DB_CONNECTION,
+        # с пулом соединения возвращаются в пул после запроса
+        "CONN_MAX_AGE": 0 if DB_POOL or WEB_ASGI else DB_CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": not DB_POOL,
+        "OPTIONS": (
+            {"pool": {"min_size": DB_POOL_MIN_SIZE, "max_size": DB_POOL_MAX_SIZE, "timeout": DB_POOL_TIMEOUT}}
+            if DB_POOL
+            else {}
+        ),
+    }
+}
+
+# Реплики только для чтения: "host[:port]" через запятую, те же имя базы и учетные данные.
+# В тестах реплики указывают на тестовую основную базу (MIRROR).
+DB_REPLICA_HOSTS = config("DB_REPLICA_HOSTS", default="", cast=Csv())
+for number, replica_host in enumerate(DB_REPLICA_HOSTS, 1):
+    replica_host, _, replica_port = replica_host.partition(":")
+    DATABASES[f"replica_{number}"] = {
+        **DATABASES["default"],
+        "HOST": replica_host,
+        "PORT": replica_port or DB_CONNECTION["PORT"],
+        "TEST": {"MIRROR": "default"},
     }
+DATABASE_ROUTERS = ["backend.db.ReplicaRouter"]
+# Сколько секунд после изменения данных клиент читает с основной базы
+DB_REPLICA_PIN_SECONDS = config("DB_REPLICA_PIN_SECONDS", default=5, cast=int)
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -122,6 +168,17 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Хеширование паролей: основной хешер (остальные нужны для проверки старых хешей,
+# при входе они перехешируются основным) и ограничение параллельности backend/hashing.py
+PASSWORD_HASHER = config("PASSWORD_HASHER", default="django.contrib.auth.hashers.PBKDF2PasswordHasher")
+PASSWORD_HASHERS = [PASSWORD_HASHER] + [
+    hasher for hasher in global_settings.PASSWORD_HASHERS if hasher != PASSWORD_HASHER
+]
+# 0 - по числу ядер
+PASSWORD_HASH_WORKERS = config("PASSWORD_HASH_WORKERS", default=0, cast=int)
+PASSWORD_HASH_QUEUE_SIZE = config("PASSWORD_HASH_QUEUE_SIZE", default=32, cast=int)
+PASSWORD_HASH_WAIT_TIMEOUT = config("PASSWORD_HASH_WAIT_TIMEOUT", default=5, cast=float)  # секунды
+
 # Internationalization
 # https://docs.djangoproject.com/en/2.2/topics/i18n/
 
@@ -155,9 +212,24 @@ SERVER_EMAIL = EMAIL_HOST_USER
 
 EMAIL_TIMEOUT = 30
 
+# Пул SMTP соединений и пакетная отправка писем (backend.mail)
+EMAIL_POOL_MAX_IDLE = config("EMAIL_POOL_MAX_IDLE", default=60, cast=int)  # секунды простоя до переоткрытия
+EMAIL_RATE_LIMIT = config("EMAIL_RATE_LIMIT", default=10, cast=float)  # писем в секунду на процесс, 0 - без лимита
+EMAIL_BATCH_SIZE = config("EMAIL_BATCH_SIZE", default=50, cast=int)  # писем в одной задаче send_email_batch
+EMAIL_RETRY_BACKOFF = config("EMAIL_RETRY_BACKOFF", default=10, cast=int)  # первая задержка повтора, секунды
+EMAIL_RETRY_BACKOFF_MAX = config("EMAIL_RETRY_BACKOFF_MAX", default=600, cast=int)
+
 # Email администратора для получения накладных
 ADMIN_EMAIL = config("ADMIN_EMAIL", default=EMAIL_HOST_USER)
 
+# Режим дайджеста: накладные копятся и отправляются одной сводкой раз в окно
+ADMIN_INVOICE_DIGEST = config("ADMIN_INVOICE_DIGEST", default=False, cast=bool)
+ADMIN_INVOICE_DIGEST_WINDOW = config("ADMIN_INVOICE_DIGEST_WINDOW", default=60 * 60, cast=int)  # секунды
+ADMIN_INVOICE_DIGEST_MAX_ORDERS = config("ADMIN_INVOICE_DIGEST_MAX_ORDERS", default=200, cast=int)
+
+# Кэширование COUNT(*) списков заказов и товаров в админке, секунды; 0 - без кэша
+ADMIN_COUNT_CACHE_TTL = config("ADMIN_COUNT_CACHE_TTL", default=0, cast=int)
+
 REST_FRAMEWORK = {
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 40,
@@ -165,11 +237,78 @@ REST_FRAMEWORK = {
         "rest_framework.renderers.JSONRenderer",
         "rest_framework.renderers.BrowsableAPIRenderer",
     ),
-    "DEFAULT_AUTHENTICATION_CLASSES": ("rest_framework.authentication.TokenAuthentication",),
+    "DEFAULT_AUTHENTICATION_CLASSES": ("backend.authentication.CachedTokenAuthentication",),
+    # Ограничение частоты запросов: token bucket в Redis (backend/throttling.py)
+    # Число доверенных прокси перед приложением: 0 - IP клиента только из REMOTE_ADDR,
+    # N - N-й адрес с конца X-Forwarded-For (заголовок дописывает каждый прокси)
+    "NUM_PROXIES": config("THROTTLE_NUM_PROXIES", default=0, cast=int),
+    "DEFAULT_THROTTLE_CLASSES": (
+        "backend.throttling.IPTokenBucketThrottle",
+        "backend.throttling.UserTokenBucketThrottle",
+        "backend.throttling.EndpointTokenBucketThrottle",
+    ),
+    "DEFAULT_THROTTLE_RATES": {
+        "ip": config("THROTTLE_RATE_IP", default="120/min"),
+        "user": config("THROTTLE_RATE_USER", default="600/min"),
+        # отдельные лимиты endpoint-ов (throttle_scope во view)
+        "login": config("THROTTLE_RATE_LOGIN", default="10/min"),
+        "register": config("THROTTLE_RATE_REGISTER", default="5/min"),
+        "partner_update": config("THROTTLE_RATE_PARTNER_UPDATE", default="5/hour"),
+        "partner_export": config("THROTTLE_RATE_PARTNER_EXPORT", default="30/hour"),
+    },
 }
 
+TEST_RUNNER = "backend.test_runner.TestRunner"
+
+# Кэш пользователя по токену (backend/authentication.py), секунды и число записей
+AUTH_TOKEN_CACHE_TTL = config("AUTH_TOKEN_CACHE_TTL", default=5 * 60, cast=int)
+AUTH_TOKEN_LOCAL_TTL = config("AUTH_TOKEN_LOCAL_TTL", default=5, cast=int)
+AUTH_TOKEN_LOCAL_MAXSIZE = config("AUTH_TOKEN_LOCAL_MAXSIZE", default=10000, cast=int)
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Измерение запросов и задач (backend/instrumentation.py): доля измеряемых от 0 до 1.
+# Счетчики SQL, кэша и времени пишутся в лог backend.instrumentation и в заголовок Server-Timing.
+INSTRUMENTATION_SAMPLE_RATE = config("INSTRUMENTATION_SAMPLE_RATE", default=0.0, cast=float)
+INSTRUMENTATION_TASK_SAMPLE_RATE = config("INSTRUMENTATION_TASK_SAMPLE_RATE", default=0.0, cast=float)
+INSTRUMENTATION_SERVER_TIMING = config("INSTRUMENTATION_SERVER_TIMING", default=True, cast=bool)
+
+# Медленные SQL запросы (backend/slow_queries.py): порог в мс (0 - выключено)
+# и число планов EXPLAIN ANALYZE в минуту на процесс
+SLOW_QUERY_MS = config("SLOW_QUERY_MS", default=0, cast=int)
+SLOW_QUERY_EXPLAIN_PER_MINUTE = config("SLOW_QUERY_EXPLAIN_PER_MINUTE", default=2, cast=int)
+
+# Метрики Prometheus (backend/metrics.py): /metrics доступен по токену (заголовок
+# "Authorization: Bearer <токен>") или с адресов из METRICS_ALLOWED_NETWORKS;
+# "0.0.0.0/0,::/0" открывает метрики всем. Порт HTTP сервера метрик Celery worker (0 - выключен)
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+METRICS_ALLOWED_NETWORKS = config("METRICS_ALLOWED_NETWORKS", default="127.0.0.0/8,::1/128", cast=Csv())
+CELERY_METRICS_PORT = config("CELERY_METRICS_PORT", default=0, cast=int)
+
+# Профилирование запросов (backend/profiling.py): каталог свернутых стеков,
+# интервал семплирования и ограничения нагрузки на процесс
+PROFILING_DIR = config("PROFILING_DIR", default=str(BASE_DIR / "profiles"))
+PROFILING_INTERVAL_MS = config("PROFILING_INTERVAL_MS", default=5, cast=int)
+PROFILING_MAX_SECONDS = config("PROFILING_MAX_SECONDS", default=10, cast=int)
+PROFILING_MAX_CONCURRENT = config("PROFILING_MAX_CONCURRENT", default=1, cast=int)
+PROFILING_MAX_PER_MINUTE = config("PROFILING_MAX_PER_MINUTE", default=10, cast=int)
+PROFILING_TOKEN_MAX_AGE = config("PROFILING_TOKEN_MAX_AGE", default=60 * 60, cast=int)
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {"plain": {"format": "%(message)s"}},
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+        "metrics": {"class": "logging.StreamHandler", "formatter": "plain"},
+    },
+    "loggers": {
+        "backend.instrumentation": {"handlers": ["metrics"], "level": "INFO", "propagate": False},
+        "backend.slow_queries": {"handlers": ["metrics"], "level": "INFO", "propagate": False},
+        "backend": {"handlers": ["console"], "level": "INFO"},
+    },
+}
+
 # Настройки Celery
 # Для Docker используем переменные окружения
 if os.environ.get("REDIS_URL"):
@@ -184,3 +323,82 @@ CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = TIME_ZONE
+
+# Очереди Celery: уведомления не ждут за долгими импортами каталога.
+# Каждую очередь обслуживает свой worker со своей concurrency (см. docker-compose.yml)
+CELERY_TASK_DEFAULT_QUEUE = "default"
+CELERY_TASK_QUEUES = (
+    Queue("notifications"),  # письма и накладные: короткие задачи, чувствительны к задержке
+    Queue("imports"),  # импорт прайсов: долгие задачи
+    Queue("default"),  # служебные задачи (outbox)
+)
+CELERY_TASK_ROUTES = {
+    "backend.tasks.send_email": {"queue": "notifications"},
+    "backend.tasks.send_email_batch": {"queue": "notifications"},
+    "backend.tasks.send_invoice_to_admin": {"queue": "notifications"},
+    "backend.tasks.send_invoices_to_admin": {"queue": "notifications"},
+    "backend.tasks.send_invoice_digest": {"queue": "notifications"},
+    "backend.tasks.do_import": {"queue": "imports"},
+    "backend.tasks.relay_outbox": {"queue": "default"},
+    "backend.tasks.purge_outbox": {"queue": "default"},
+}
+
+# Ограничения времени выполнения (секунды) и подтверждение после выполнения для импорта
+CELERY_TASK_SOFT_TIME_LIMIT = 60
+CELERY_TASK_TIME_LIMIT = 90
+CELERY_TASK_ANNOTATIONS = {
+    "backend.tasks.do_import": {
+        "soft_time_limit": config("IMPORT_SOFT_TIME_LIMIT", default=25 * 60, cast=int),
+        "time_limit": config("IMPORT_TIME_LIMIT", default=30 * 60, cast=int),
+        "acks_late": True,
+    },
+    "backend.tasks.send_invoice_digest": {"soft_time_limit": 5 * 60, "time_limit": 6 * 60},
+}
+
+# Worker берет из очереди по одной задаче на процесс: долгая задача не задерживает
+# уже полученные короткие. Для worker уведомлений переопределяется --prefetch-multiplier
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+# Transactional outbox: задачи пишутся в БД и передаются в брокер задачей relay_outbox
+OUTBOX_BATCH_SIZE = config("OUTBOX_BATCH_SIZE", default=500, cast=int)
+OUTBOX_RELAY_INTERVAL = config("OUTBOX_RELAY_INTERVAL", default=2.0, cast=float)  # секунды
+OUTBOX_RETENTION_DAYS = config("OUTBOX_RETENTION_DAYS", default=7, cast=int)
+
+# Периодические задачи (celery beat)
+CELERY_BEAT_SCHEDULE = {
+    "relay-outbox": {
+        "task": "backend.tasks.relay_outbox",
+        "schedule": OUTBOX_RELAY_INTERVAL,
+    },
+    "send-invoice-digest": {
+        "task": "backend.tasks.send_invoice_digest",
+        "schedule": ADMIN_INVOICE_DIGEST_WINDOW,
+    },
+    "purge-outbox": {
+        "task": "backend.tasks.purge_outbox",
+        "schedule": 60 * 60,
+    },
+}
+
+# Кэш Django на Redis (отдельная база Redis, не пересекается с брокером Celery)
+CACHES = {
+    "default": {
+        # RedisCache с подсчетом попаданий и промахов (backend/instrumentation.py)
+        "BACKEND": "backend.instrumentation.InstrumentedRedisCache",
+        "LOCATION": config("CACHE_URL", default=CELERY_BROKER_URL.rsplit("/", 1)[0] + "/1"),
+    }
+}
+
+# Кэш справочников (категории, параметры, магазины) в памяти процесса (backend/dimensions.py)
+DIMENSION_CACHE_MAXSIZE = config("DIMENSION_CACHE_MAXSIZE", default=10000, cast=int)  # записей на справочник
+DIMENSION_CACHE_TTL = config("DIMENSION_CACHE_TTL", default=300, cast=int)  # секунды
+# Redis для рассылки версий справочников (pub/sub); пустое значение - только TTL
+DIMENSION_CACHE_REDIS_URL = config("DIMENSION_CACHE_REDIS_URL", default=CACHES["default"]["LOCATION"])
+
+# Идемпотентность оформления заказа и изменения корзины (заголовок Idempotency-Key)
+IDEMPOTENCY_TTL = config("IDEMPOTENCY_TTL", default=24 * 60 * 60, cast=int)  # хранение ответа, секунды
+IDEMPOTENCY_LOCK_TIMEOUT = config("IDEMPOTENCY_LOCK_TIMEOUT", default=60, cast=int)  # блокировка повтора, секунды
+
+# Redis для throttling (отдельная база Redis); THROTTLE_ENABLED=False отключает ограничения
+THROTTLE_ENABLED = config("THROTTLE_ENABLED", default=True, cast=bool)
+THROTTLE_REDIS_URL = config("THROTTLE_REDIS_URL", default=CELERY_BROKER_URL.rsplit("/", 1)[0] + "/2")
@@ -17,7 +17,8 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import include, path
 
-from backend.admin_views import import_products_view
+from backend.admin_views import import_products_view, profiling_view
+from backend.metrics import metrics_view
 
 # Настройка заголовков админки
 admin.site.site_header = "Администрирование магазина"
@@ -26,6 +27,8 @@ admin.site.index_title = "Панель управления"
 
 urlpatterns = [
     path("admin/import-products/", import_products_view, name="import_products"),
+    path("admin/profiling/", profiling_view, name="profiling"),
     path("admin/", admin.site.urls),
     path("api/v1/", include("backend.urls", namespace="backend")),
+    path("metrics", metrics_view, name="metrics"),
 ]